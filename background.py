@@ -0,0 +1,214 @@
+import itertools
+import queue
+import sqlite3
+import sys
+import threading
+
+from crawl_engine import ConcurrentCrawler, CrawlResult
+from crawler import BibleInfo
+from database import DB
+
+
+# 대기열 우선순위: 숫자가 작을수록 먼저 처리한다
+MISS_PRIORITY = 0  # 사용자가 뽑았지만 db에 없던 장
+WARM_AHEAD_PRIORITY = 1  # 다음에 뽑힐 것 같아 미리 가져오는 장
+STOP_PRIORITY = 2  # 스레드를 멈추라는 신호
+
+
+class BackgroundFetcher:
+    """
+    요청받은 장을 백그라운드 스레드에서 가져와 db에 저장하는 크롤러
+    대기열의 크기를 제한해서 밀린 작업이 끝없이 쌓이지 않게 하고, 미리 가져오는 장보다 뽑힌 장을 먼저 처리한다
+    스레드마다 자기 db 연결을 만들어 쓰므로 메인 스레드의 연결을 건드리지 않는다
+    메인 스레드가 표준 출력에 말씀을 쓰는 동안에도 돌아가므로 스레드는 표준 출력에 아무것도 쓰지 않는다
+    """
+
+    def __init__(self, crawler, db_name='bible.db', max_pending=8, workers=1, rate=None):
+        """
+        인스턴스 속성 정의
+        :param crawler: 본문을 가져올 BibleCrawler
+        :param db_name: 가져온 장을 저장할 db 파일 이름
+        :param max_pending: 대기열에 쌓아 둘 수 있는 최대 작업 수
+        :param workers: 작업을 처리할 스레드 수
+        :param rate: 사이트에 보낼 초당 최대 요청 수, None이면 제한하지 않는다
+        """
+        self.__engine = ConcurrentCrawler(crawler, max_workers=workers, rate=rate)
+        self.__db_name = db_name
+        self.__jobs = queue.PriorityQueue(maxsize=max_pending)  # (우선순위, 순번, CrawlJob, 성경책 이름)
+        self.__sequence = itertools.count()  # 우선순위가 같은 작업은 넣은 순서대로 처리한다
+        self.__results = queue.Queue()  # 메인 스레드가 가져갈 CrawlResult
+        self.__pending = set()  # 대기 중이거나 처리 중인 CrawlJob
+        self.__failed = set()  # 가져오지 못한 CrawlJob, 미리 가져올 장에서 뺀다
+        self.__lock = threading.Lock()
+        self.__finished = threading.Condition(self.__lock)  # 작업이 pending에서 빠질 때마다 알린다
+        self.__threads = []
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def engine(self):
+        return self.__engine
+
+    @property
+    def db_name(self):
+        return self.__db_name
+
+    @property
+    def max_pending(self):
+        return self.__jobs.maxsize
+
+    @property
+    def pending(self):
+        with self.__lock:
+            return set(self.__pending)
+
+    @property
+    def failed(self):
+        with self.__lock:
+            return set(self.__failed)
+
+    # --- 스레드 관리 함수 --- #
+
+    def start(self):
+        """
+        작업을 처리할 스레드를 띄운다
+        :return: 자기 자신
+        """
+        for _ in range(self.engine.max_workers):
+            thread = threading.Thread(target=self.run_worker, daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+        return self
+
+    def stop(self):
+        """
+        아직 시작하지 않은 작업은 버리고, 처리 중인 작업이 끝나면 스레드를 멈춘다
+        :return: None
+        """
+        while True:
+            try:
+                _, _, job, _ = self.__jobs.get_nowait()
+            except queue.Empty:
+                break
+            with self.__finished:
+                self.__pending.discard(job)
+                self.__finished.notify_all()
+            self.__jobs.task_done()
+
+        for _ in self.__threads:
+            self.__jobs.put((STOP_PRIORITY, next(self.__sequence), None, None))
+        for thread in self.__threads:
+            thread.join()
+        self.__threads.clear()
+        return None
+
+    def join(self):
+        """
+        대기열의 작업이 모두 끝날 때까지 기다린다
+        :return: None
+        """
+        self.__jobs.join()
+        return None
+
+    def wait(self, job, timeout=None):
+        """
+        대기 중이거나 처리 중인 작업 하나가 끝날 때까지 기다린다
+        :param job: CrawlJob 네임드튜플
+        :param timeout: 최대로 기다릴 시간(초), None이면 끝날 때까지 기다린다
+        :return: 작업이 끝났다면 True, timeout이 지났다면 False
+        """
+        with self.__finished:
+            return self.__finished.wait_for(lambda: job not in self.__pending, timeout)
+
+    # --- 작업 함수 --- #
+
+    def submit(self, job, books_name, priority=MISS_PRIORITY):
+        """
+        장 하나를 가져오는 작업을 대기열에 넣는다
+        :param job: CrawlJob 네임드튜플
+        :param books_name: 성경책 이름
+        :param priority: MISS_PRIORITY 또는 WARM_AHEAD_PRIORITY
+        :return: 대기열에 있거나 넣었다면 True, 대기열이 가득 찼다면 False
+        """
+        with self.__lock:
+            if job in self.__pending:
+                return True
+            try:
+                self.__jobs.put_nowait((priority, next(self.__sequence), job, books_name))
+
+            # 예외처리: 대기열이 가득 찬 경우 작업을 버린다, 같은 장은 다음에 뽑힐 때 다시 요청된다
+            except queue.Full:
+                return False
+
+            self.__pending.add(job)
+            return True
+
+    def run_worker(self):
+        """
+        스레드 하나가 대기열의 작업을 꺼내 db에서 찾거나 크롤링해서 db에 저장한다
+        :return: None
+        """
+        db = DB()
+        db.db_name = self.db_name
+        try:
+            while True:
+                _, _, job, books_name = self.__jobs.get()
+                if job is None:
+                    self.__jobs.task_done()
+                    break
+
+                try:
+                    self.__results.put(CrawlResult(job=job, bible_info=self.fetch(db, job, books_name), error=None))
+
+                # 예외처리: 작업 하나가 실패해도 스레드는 다음 작업을 계속 처리한다
+                except Exception as e:
+                    with self.__lock:
+                        self.__failed.add(job)
+                    self.__results.put(CrawlResult(job=job, bible_info=None, error=e))
+
+                finally:
+                    with self.__finished:
+                        self.__pending.discard(job)
+                        self.__finished.notify_all()
+                    self.__jobs.task_done()
+        finally:
+            if db.conn:
+                db.conn.close()
+
+    def fetch(self, db, job, books_name):
+        """
+        다른 프로세스가 이미 저장한 장은 db에서 읽고, 없다면 크롤링해서 db에 저장한다
+        :param db: 이 스레드가 쓰는 DB 인스턴스
+        :return: 본문 정보 네임드튜플로 구성된 리스트, 저장에 실패하면 sqlite3.Error를 낸다
+        """
+        try:
+            rows = db.query_from_db('bible_info_chapter', (job.book_pk, job.chapter)).fetchall()
+        except sqlite3.Error as e:
+            print(e, file=sys.stderr)
+            rows = []
+        if rows:
+            return [BibleInfo(*row, bible_pk=job.book_pk) for row in rows]
+
+        bible_info = self.engine.fetch(job, books_name)
+        if bible_info:
+            error = db.insert_bible_info_batch_into_db([bible_info], quiet=True)
+            # 예외처리: 저장에 실패한 장은 가져오지 못한 장으로 처리한다
+            if error:
+                raise error
+        return bible_info
+
+    def results(self):
+        """
+        끝난 작업의 결과를 기다리지 않고 모두 꺼낸다
+        :return: CrawlResult 네임드튜플 리스트
+        """
+        results = []
+        while True:
+            try:
+                results.append(self.__results.get_nowait())
+            except queue.Empty:
+                return results
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import timeit
+import tracemalloc
+from typing import Callable, NamedTuple
+
+from crawler import PARSERS, BibleCrawler
+from transport import ReplayTransport
+
+
+# 벤치마크에 쓸 fixture 디렉터리
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 측정할 본문 페이지: (구약성경/신약성경, 성경책 pk, 장, 성경책 이름)
+READ_PAGES = ((1, 101, 1, '창세'), (2, 147, 1, '마태'))
+
+
+# --- 자료구조 --- #
+
+class BenchmarkCase(NamedTuple):
+    """
+    측정할 추출 함수 하나를 정의하는 네임드튜플
+    """
+    name: str  # 함수 이름과 성경 ex: chapters_from_list_contents[m=1]
+    parser: str  # 파서 이름
+    pages: int  # 한 번 호출할 때 파싱하는 페이지 수, 0이면 파싱된 페이지에서 추출만 한다
+    func: Callable  # 인자 없이 호출할 함수
+
+
+class BenchmarkResult(NamedTuple):
+    """
+    추출 함수 하나의 측정 결과를 담는 네임드튜플
+    """
+    name: str  # 함수 이름과 성경
+    parser: str  # 파서 이름
+    seconds: float  # 호출 한 번에 걸린 시간(초), repeat 가운데 가장 빠른 값
+    pages_per_second: float  # 초당 처리한 페이지 수, 추출만 하는 함수는 None
+    peak_bytes: int  # 호출 한 번에 새로 할당한 메모리의 최대치(바이트)
+
+
+# --- 측정할 함수 만들기 --- #
+
+def list_cases(crawler, bible_num):
+    """
+    목록 페이지의 추출 함수들을 측정 대상으로 만든다
+    :param crawler: fixture를 재생하는 BibleCrawler
+    :param bible_num: 구약성경: 1, 신약성경: 2
+    :return: BenchmarkCase 리스트
+    """
+    def prepared():
+        # 목록 페이지를 요청하도록 성경을 정해 둔다
+        crawler.bible_num = bible_num
+        crawler.commit = False
+        return crawler
+
+    def make_bible_data():
+        # 보관해 둔 목록 페이지를 지워서 매번 파싱하게 한다
+        crawler.list_pages.clear()
+        crawler.list_data.clear()
+        return prepared().make_bible_data()
+
+    suffix = f'[m={bible_num}]'
+    cases = [BenchmarkCase('make_bible_data' + suffix, crawler.parser, 1, make_bible_data)]
+
+    # soup 파서는 목록 페이지를 여러 함수가 나눠서 추출하므로 함수마다 따로 측정한다
+    if crawler.parser == 'soup':
+        def list_page_from_soup():
+            crawler.list_pages.clear()
+            return prepared().list_page_from_soup()
+
+        # 나머지 함수들은 보관해 둔 목록 페이지에서 추출하는 시간만 잰다
+        cases.append(BenchmarkCase('list_page_from_soup' + suffix, crawler.parser, 1, list_page_from_soup))
+        for name in ('list_contents_from_soup', 'book_info_from_list_contents'):
+            cases.append(BenchmarkCase(name + suffix, crawler.parser, 0,
+                                       lambda name=name: getattr(prepared(), name)()))
+        for name in ('pks_from_book_info', 'names_from_book_info', 'chapters_from_list_contents'):
+            cases.append(BenchmarkCase(name + suffix, crawler.parser, 0,
+                                       lambda name=name: list(getattr(prepared(), name)())))
+
+    return cases
+
+
+def read_cases(crawler, bible_num, primary_key, chapter_num, books_name):
+    """
+    본문 페이지의 추출 함수들을 측정 대상으로 만든다
+    :param crawler: fixture를 재생하는 BibleCrawler
+    :return: BenchmarkCase 리스트
+    """
+    payload = {'m': bible_num, 'n': primary_key, 'p': chapter_num}
+    suffix = f'[m={bible_num}]'
+    cases = [BenchmarkCase('fetch_bible_info' + suffix, crawler.parser, 1,
+                           lambda: crawler.fetch_bible_info(bible_num, primary_key, chapter_num, books_name))]
+
+    if crawler.parser == 'soup':
+        def prepared():
+            # 인스턴스 속성으로 payload를 만드는 함수들을 위해 장을 정해 둔다
+            crawler.bible_num = bible_num
+            crawler.primary_key = primary_key
+            crawler.chapter_num = chapter_num
+            crawler.commit = True
+            return crawler
+
+        read_contents = crawler.read_contents_from_soup(payload)
+        cases.extend([
+            BenchmarkCase('read_contents_from_soup' + suffix, crawler.parser, 1,
+                          lambda: crawler.read_contents_from_soup(payload)),
+            BenchmarkCase('paragraphs_from_read_contents' + suffix, crawler.parser, 1,
+                          lambda: list(prepared().paragraphs_from_read_contents())),
+            BenchmarkCase('texts_from_read_contents' + suffix, crawler.parser, 1,
+                          lambda: list(prepared().texts_from_read_contents())),
+            BenchmarkCase('bible_info_from_read_contents' + suffix, crawler.parser, 0,
+                          lambda: list(crawler.bible_info_from_read_contents(
+                              read_contents, primary_key, books_name, chapter_num))),
+        ])
+    else:
+        tree = crawler.tree_from_requests(payload)
+        cases.extend([
+            BenchmarkCase('tree_from_requests' + suffix, crawler.parser, 1,
+                          lambda: crawler.tree_from_requests(payload)),
+            BenchmarkCase('bible_info_from_read_tree' + suffix, crawler.parser, 0,
+                          lambda: list(crawler.bible_info_from_read_tree(
+                              tree, primary_key, books_name, chapter_num))),
+        ])
+
+    return cases
+
+
+def build_cases(fixtures_dir=FIXTURES_DIR, parsers=PARSERS):
+    """
+    파서마다 구약성경과 신약성경의 목록 페이지, 본문 페이지를 측정 대상으로 만든다
+    :param fixtures_dir: 응답 파일이 담긴 디렉터리
+    :param parsers: 측정할 파서 이름들
+    :return: BenchmarkCase 리스트
+    """
+    cases = []
+    for parser in parsers:
+        crawler = BibleCrawler(transport=ReplayTransport(fixtures_dir), parser=parser)
+        for bible_num in (1, 2):
+            cases.extend(list_cases(crawler, bible_num))
+        for read_page in READ_PAGES:
+            cases.extend(read_cases(crawler, *read_page))
+    return cases
+
+
+# --- 측정 함수 --- #
+
+def measure(case, number=20, repeat=3):
+    """
+    함수 하나의 실행 시간과 메모리 할당량을 잰다
+    :param case: BenchmarkCase 네임드튜플
+    :param number: 시간을 잴 때 한 번에 연달아 호출할 횟수
+    :param repeat: number번 호출을 되풀이할 횟수, 가장 빠른 값을 쓴다
+    :return: BenchmarkResult 네임드튜플
+    """
+    # 시간: 메모리 추적이 시간을 늘리지 않도록 먼저 따로 잰다
+    seconds = min(timeit.repeat(case.func, number=number, repeat=repeat)) / number
+
+    # 메모리: 한 번 호출하는 동안 새로 할당한 메모리의 최대치
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        case.func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=case.name,
+        parser=case.parser,
+        seconds=seconds,
+        pages_per_second=case.pages / seconds if case.pages else None,
+        peak_bytes=peak - baseline,
+    )
+
+
+def run_benchmarks(cases, number=20, repeat=3):
+    """
+    모든 측정 대상을 차례로 잰다
+    :return: BenchmarkResult 리스트
+    """
+    return [measure(case, number, repeat) for case in cases]
+
+
+def speedups(results, baseline='soup'):
+    """
+    같은 이름의 함수를 baseline 파서와 비교해 몇 배 빠른지 계산한다
+    :return: (함수 이름, 파서 이름): 배수 딕셔너리
+    """
+    baseline_seconds = {result.name: result.seconds for result in results if result.parser == baseline}
+    return {(result.name, result.parser): baseline_seconds[result.name] / result.seconds
+            for result in results
+            if result.parser != baseline and result.name in baseline_seconds}
+
+
+def line_profile(cases):
+    """
+    line_profiler로 crawler 모듈의 추출 함수들을 줄 단위로 측정해 출력한다
+    :return: 설치되어 있다면: True, 없다면: False
+    """
+    try:
+        from line_profiler import LineProfiler
+    except ImportError:
+        print('line_profiler가 설치되어 있지 않습니다: pip install line-profiler')
+        return False
+
+    profiler = LineProfiler()
+    for name in ('list_page_from_soup', 'chapters_from_list_contents', 'bible_data_from_tree',
+                 'bible_info_from_read_contents', 'bible_info_from_read_tree'):
+        profiler.add_function(getattr(BibleCrawler, name))
+
+    for case in cases:
+        profiler.runcall(case.func)
+    profiler.print_stats()
+    return True
+
+
+# --- 출력 --- #
+
+def format_results(results):
+    """
+    측정 결과를 표 형태의 문자열로 만든다
+    :return: 표 문자열
+    """
+    ratios = speedups(results)
+    lines = [f'{"함수":<40}{"파서":<6}{"ms/회":>10}{"pages/s":>10}{"KiB":>10}{"배속":>8}']
+    for result in results:
+        pages_per_second = f'{result.pages_per_second:.0f}' if result.pages_per_second else '-'
+        ratio = ratios.get((result.name, result.parser))
+        lines.append(f'{result.name:<40}{result.parser:<6}{result.seconds * 1000:>10.3f}'
+                     f'{pages_per_second:>10}{result.peak_bytes / 1024:>10.1f}'
+                     f'{f"{ratio:.1f}x" if ratio else "":>8}')
+    return '\n'.join(lines)
+
+
+def run(argv=None):
+    """
+    명령행 인자에 따라 벤치마크를 실행한다
+    :param argv: 명령행 인자 리스트, None이면 sys.argv를 사용한다
+    :return: BenchmarkResult 리스트
+    """
+    parser = argparse.ArgumentParser(description='저장된 페이지로 파서의 추출 함수들을 측정합니다')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='응답 파일이 담긴 디렉터리')
+    parser.add_argument('--parser', choices=PARSERS, nargs='+', default=list(PARSERS), help='측정할 파서')
+    parser.add_argument('--number', type=int, default=20, help='한 번에 연달아 호출할 횟수')
+    parser.add_argument('--repeat', type=int, default=3, help='number번 호출을 되풀이할 횟수')
+    parser.add_argument('--json', action='store_true', help='결과를 한 줄에 하나씩 JSON으로 출력합니다')
+    parser.add_argument('--line-profile', action='store_true', help='line_profiler로 줄 단위 시간도 출력합니다')
+    args = parser.parse_args(argv)
+
+    cases = build_cases(args.fixtures, args.parser)
+    results = run_benchmarks(cases, args.number, args.repeat)
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result._asdict(), ensure_ascii=False))
+    else:
+        print(format_results(results))
+
+    if args.line_profile:
+        line_profile(cases)
+
+    return results
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,220 @@
+import json
+import os
+import sqlite3
+from datetime import date
+
+from crawler import BibleData
+
+
+# 성경책 pk: 구약성경은 101~146, 신약성경은 147~173
+# 성경 구분을 모르는 성경책(ex: db에서만 읽은 성경책)에만 쓰는 기준값
+OLD_TESTAMENT_LAST_PK = 146
+BOOKS_COUNT = 73
+
+# 함께 배포하는 성경책 목록 스냅숏과 그 파일 형식의 버전
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bible_catalog.json')
+SNAPSHOT_VERSION = 1
+
+
+class BookCatalog:
+    """
+    73권 성경책의 pk와 이름, 장 수를 한 번 읽어 프로세스가 끝날 때까지 메모리에서 찾아 주는 목록
+    """
+
+    def __init__(self):
+        """
+        인스턴스 속성 정의
+        """
+        self.__books = {}  # 성경책 pk: BibleData 네임드튜플
+        self.__bible_nums = {}  # 성경책 pk: 구약성경 1, 신약성경 2
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def books(self):
+        return self.__books
+
+    @property
+    def bible_nums(self):
+        return self.__bible_nums
+
+    def __contains__(self, bible_pk):
+        return bible_pk in self.books
+
+    def __len__(self):
+        return len(self.books)
+
+    # --- 목록 생성 함수 --- #
+
+    def load(self, db, crawler, snapshot_path=SNAPSHOT_PATH):
+        """
+        db의 bible_data에서 성경책 목록을 읽고, 73권이 다 없다면 스냅숏 파일에서 채운다
+        그래도 없는 성경책이 있다면 두 목록 페이지를 한 번씩만 크롤링한다
+        스냅숏이나 크롤링으로 새로 알게 된 성경책은 db에도 저장한다
+        :param db: 성경책 목록을 읽고 저장할 DB 인스턴스
+        :param crawler: 목록 페이지를 크롤링할 BibleCrawler 인스턴스
+        :param snapshot_path: 스냅숏 파일 경로, None이면 스냅숏을 쓰지 않는다
+        :return: 목록 자기 자신
+        """
+        try:
+            for bible_pk, name, chapters_count in db.query_from_db('bible_data_all'):
+                self.add_book(bible_pk, name, chapters_count)
+
+        # 예외처리: data_table이 없을 경우 스냅숏이나 크롤링한 목록만 쓴다
+        except sqlite3.Error as e:
+            print(e)
+
+        stored_books = set(self.books)
+
+        # db에서 읽은 성경책은 그대로 두고 없는 성경책만 스냅숏이나 크롤링으로 채운다
+        # db에는 성경 구분이 없으므로 스냅숏은 73권이 다 있어도 읽는다
+        if snapshot_path:
+            self.merge(BookCatalog().load_snapshot(snapshot_path))
+        if len(self) < BOOKS_COUNT:
+            self.merge(BookCatalog().crawl(crawler))
+
+        new_books = {pk: self.books[pk] for pk in self.books if pk not in stored_books}
+        if new_books:
+            db.insert_bible_data_into_db(new_books)
+
+        return self
+
+    def crawl(self, crawler):
+        """
+        구약성경과 신약성경의 목록 페이지를 한 번씩 크롤링해 성경책 목록을 채운다
+        :param crawler: 목록 페이지를 크롤링할 BibleCrawler 인스턴스
+        :return: 목록 자기 자신
+        """
+        # payload를 False로 세팅한다
+        crawler.commit = False
+        for bible_num in (1, 2):
+            crawler.bible_num = bible_num
+            bible_data = crawler.make_bible_data()
+            for bible_pk in bible_data:
+                self.add_book(bible_pk, *bible_data[bible_pk], bible_num=bible_num)
+        return self
+
+    def merge(self, other):
+        """
+        다른 목록에서 이 목록에 없는 성경책만 가져온다
+        :param other: BookCatalog 인스턴스
+        :return: None
+        """
+        for bible_pk in other.books:
+            if bible_pk not in self:
+                self.add_book(bible_pk, *other.books[bible_pk], bible_num=other.bible_nums.get(bible_pk))
+            elif bible_pk in other.bible_nums:
+                self.bible_nums.setdefault(bible_pk, other.bible_nums[bible_pk])
+        return None
+
+    def add_book(self, bible_pk, books_name, chapters_count, bible_num=None):
+        """
+        성경책 하나를 목록에 더한다
+        :param bible_num: 구약성경: 1, 신약성경: 2, 모른다면 None
+        :return: None
+        """
+        self.books[int(bible_pk)] = BibleData(books_name=books_name, chapters_count=int(chapters_count))
+        if bible_num:
+            self.bible_nums[int(bible_pk)] = int(bible_num)
+        return None
+
+    # --- 스냅숏 함수 --- #
+
+    def load_snapshot(self, path=SNAPSHOT_PATH):
+        """
+        스냅숏 파일에서 성경책 목록을 읽어 온다
+        :param path: 스냅숏 파일 경로
+        :return: 목록 자기 자신, 파일이 없거나 형식이 다르면 아무것도 더하지 않는다
+        """
+        try:
+            with open(path, encoding='utf-8') as snapshot_file:
+                snapshot = json.load(snapshot_file)
+
+            if snapshot['version'] != SNAPSHOT_VERSION:
+                print(f'스냅숏 버전이 다릅니다: {snapshot["version"]} (지원하는 버전: {SNAPSHOT_VERSION})')
+                return self
+
+            for book in snapshot['books']:
+                self.add_book(book['bible_pk'], book['name'], book['chapters_count'], bible_num=book['bible_num'])
+
+        # 예외처리: 스냅숏 파일이 없거나 깨진 경우
+        except (OSError, ValueError, KeyError) as e:
+            print(e)
+
+        return self
+
+    def save_snapshot(self, path=SNAPSHOT_PATH):
+        """
+        성경책 목록을 스냅숏 파일로 저장한다
+        :param path: 스냅숏 파일 경로
+        :return: 저장한 성경책 수
+        """
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'generated_at': date.today().isoformat(),
+            'books': [{
+                'bible_pk': bible_pk,
+                'bible_num': self.bible_num_of(bible_pk),
+                'name': self.name(bible_pk),
+                'chapters_count': self.chapters_count(bible_pk),
+            } for bible_pk in sorted(self.books)],
+        }
+        with open(path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(snapshot, snapshot_file, ensure_ascii=False, indent=2)
+            snapshot_file.write('\n')
+        return len(snapshot['books'])
+
+    def differences(self, other):
+        """
+        다른 목록과 성경책 이름, 장 수, 성경 구분이 다른 곳을 찾는다
+        :param other: 비교할 BookCatalog 인스턴스
+        :return: 다른 곳을 설명하는 문자열 리스트, 같다면 빈 리스트
+        """
+        messages = []
+        for bible_pk in sorted(set(self.books) | set(other.books)):
+            if bible_pk not in other:
+                messages.append(f'{bible_pk}: 비교할 목록에 없습니다')
+            elif bible_pk not in self:
+                messages.append(f'{bible_pk}: 이 목록에 없습니다')
+            elif (self.books[bible_pk], self.bible_num_of(bible_pk)) != \
+                    (other.books[bible_pk], other.bible_num_of(bible_pk)):
+                messages.append(f'{bible_pk}: {tuple(self.books[bible_pk])} != {tuple(other.books[bible_pk])}')
+        return messages
+
+    # --- 목록 검색 함수 --- #
+
+    def name(self, bible_pk):
+        """
+        성경책 이름을 찾는다
+        :return: 성경책 이름
+        """
+        return self.books[bible_pk].books_name
+
+    def chapters_count(self, bible_pk):
+        """
+        성경책의 장 수를 찾는다
+        :return: 장 수
+        """
+        return self.books[bible_pk].chapters_count
+
+    def bible_num_of(self, bible_pk):
+        """
+        성경책 pk가 속한 성경을 알아낸다
+        :return: 구약성경: 1, 신약성경: 2
+        """
+        if bible_pk in self.bible_nums:
+            return self.bible_nums[bible_pk]
+        return 1 if bible_pk <= OLD_TESTAMENT_LAST_PK else 2
+
+    def pks(self, bible_num=None):
+        """
+        성경에 속한 성경책 pk를 순서대로 꺼낸다
+        :param bible_num: 구약성경: 1, 신약성경: 2, None이면 모든 성경책
+        :return: 성경책 pk 리스트
+        """
+        return [bible_pk for bible_pk in sorted(self.books)
+                if bible_num is None or self.bible_num_of(bible_pk) == bible_num]
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,246 @@
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+from crawler import BibleInfo
+
+
+# 말씀 묶음 파일 형식
+# 헤더 | 성경책 표 | 장 표 | 성경책 이름 blob | 절마다 성경책 pk, 장, 절, 본문 위치 배열 | 본문 blob
+# 숫자는 모두 little-endian이고, 각 구역은 8바이트 경계에서 시작한다
+CORPUS_MAGIC = b'BIBLCORP'
+CORPUS_VERSION = 1
+
+# 매직, 버전, 성경책 수, 장 수, 절 수, 성경책 이름 blob 크기, 본문 blob 크기
+HEADER = struct.Struct('<8sIIIIIQ')
+# 성경책 pk, 이름 시작 위치, 이름 크기
+BOOK = struct.Struct('<HII')
+# 성경책 pk, 장, 첫 절의 verse id, 마지막 절 다음의 verse id
+CHAPTER = struct.Struct('<HHII')
+# 절 번호는 8바이트 고정 길이 UTF-8 문자열로 저장한다
+PARAGRAPH_SIZE = 8
+
+U16 = struct.Struct('<H')
+U64 = struct.Struct('<Q')
+
+
+def aligned(size):
+    """
+    크기를 8바이트 경계에 맞춘다
+    :return: 8의 배수로 올린 크기
+    """
+    return (size + 7) & ~7
+
+
+def little_endian(values):
+    """
+    배열을 little-endian 바이트로 바꾼다
+    :param values: array.array 객체
+    :return: bytes
+    """
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+# --- 내보내기 --- #
+
+def export_corpus(db, path):
+    """
+    db의 말씀 전체를 열 단위 바이너리 파일 하나로 내보낸다
+    :param db: 말씀을 읽을 DB 인스턴스
+    :param path: 저장할 파일 경로
+    :return: 내보낸 절의 수
+    """
+    names = {bible_pk: name for bible_pk, name, _ in db.query_from_db('bible_data_all')}
+
+    book_pks = array('H')
+    chapter_nums = array('H')
+    paragraphs = bytearray()
+    text_offsets = array('Q', [0])
+    texts = bytearray()
+    chapters = []
+
+    # bible_info는 (bible_pk, chapter_num, paragraph_num) 순서로 읽히므로 장 단위로 끊어서 담는다
+    key = None
+    for bible_pk, chapter_num, paragraph_num, text in db.query_from_db('bible_info_all'):
+        if (bible_pk, chapter_num) != key:
+            key = (bible_pk, chapter_num)
+            chapters.append([bible_pk, chapter_num, len(book_pks), len(book_pks)])
+
+        paragraph = str(paragraph_num).encode('utf-8')
+        if len(paragraph) > PARAGRAPH_SIZE:
+            raise ValueError(f'절 번호가 {PARAGRAPH_SIZE}바이트를 넘습니다: {paragraph_num}')
+
+        book_pks.append(bible_pk)
+        chapter_nums.append(chapter_num)
+        paragraphs += paragraph.ljust(PARAGRAPH_SIZE, b'\0')
+        texts += text.encode('utf-8')
+        text_offsets.append(len(texts))
+        chapters[-1][3] = len(book_pks)
+
+    names_blob = bytearray()
+    books = []
+    for bible_pk in sorted(names):
+        encoded = names[bible_pk].encode('utf-8')
+        books.append(BOOK.pack(bible_pk, len(names_blob), len(encoded)))
+        names_blob += encoded
+
+    sections = [
+        HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, len(books), len(chapters), len(book_pks),
+                    len(names_blob), len(texts)),
+        b''.join(books),
+        b''.join(CHAPTER.pack(*chapter) for chapter in chapters),
+        bytes(names_blob),
+        little_endian(book_pks),
+        little_endian(chapter_nums),
+        bytes(paragraphs),
+        little_endian(text_offsets),
+        bytes(texts),
+    ]
+
+    # 다른 프로세스가 읽는 중인 파일을 덮어쓰지 않도록 임시 파일에 쓰고 바꿔치기한다
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as corpus_file:
+        for section in sections:
+            corpus_file.write(section)
+            corpus_file.write(b'\0' * (aligned(len(section)) - len(section)))
+    os.replace(temp_path, path)
+
+    return len(book_pks)
+
+
+# --- 읽기 --- #
+
+class Corpus:
+    """
+    내보낸 말씀 묶음 파일을 메모리 맵으로 열고, 절은 꺼낼 때만 디코딩하는 읽기 전용 색인
+    같은 파일을 연 프로세스들은 운영체제의 페이지 캐시를 함께 쓴다
+    """
+
+    def __init__(self, path):
+        """
+        파일을 메모리 맵으로 열고 헤더와 성경책 표, 장 표만 읽는다
+        :param path: export_corpus로 만든 파일 경로
+        """
+        with open(path, 'rb') as corpus_file:
+            self.__mmap = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, books_count, chapters_count, verse_count, names_size, texts_size = \
+            HEADER.unpack_from(self.__mmap, 0)
+        if magic != CORPUS_MAGIC or version != CORPUS_VERSION:
+            self.__mmap.close()
+            raise ValueError(f'말씀 묶음 파일이 아니거나 버전이 다릅니다: {path}')
+
+        self.__verse_count = verse_count
+
+        # 구역마다 시작 위치를 계산한다
+        position = aligned(HEADER.size)
+        books_start, position = position, position + aligned(BOOK.size * books_count)
+        chapters_start, position = position, position + aligned(CHAPTER.size * chapters_count)
+        names_start, position = position, position + aligned(names_size)
+        self.__book_pks_start, position = position, position + aligned(2 * verse_count)
+        self.__chapter_nums_start, position = position, position + aligned(2 * verse_count)
+        self.__paragraphs_start, position = position, position + aligned(PARAGRAPH_SIZE * verse_count)
+        self.__text_offsets_start, position = position, position + aligned(8 * (verse_count + 1))
+        self.__texts_start = position
+
+        self.__names = {}  # 성경책 pk: 성경책 이름
+        for bible_pk, name_offset, name_size in BOOK.iter_unpack(
+                self.__mmap[books_start:books_start + BOOK.size * books_count]):
+            start = names_start + name_offset
+            self.__names[bible_pk] = self.__mmap[start:start + name_size].decode('utf-8')
+
+        self.__chapters = {}  # (성경책 pk, 장): (start, stop)
+        for bible_pk, chapter_num, start, stop in CHAPTER.iter_unpack(
+                self.__mmap[chapters_start:chapters_start + CHAPTER.size * chapters_count]):
+            self.__chapters[(bible_pk, chapter_num)] = (start, stop)
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def names(self):
+        return self.__names
+
+    @property
+    def chapters(self):
+        return self.__chapters
+
+    def __len__(self):
+        return self.__verse_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        메모리 맵을 닫는다
+        :return: None
+        """
+        self.__mmap.close()
+        return None
+
+    # --- 말씀 검색 함수 --- #
+
+    def has_chapter(self, bible_pk, chapter_num):
+        """
+        장이 묶음에 있는지 확인한다
+        :return: 있다면 True, 없다면 False
+        """
+        return (bible_pk, chapter_num) in self.chapters
+
+    def verse(self, verse_id):
+        """
+        verse id에 해당하는 절을 파일에서 디코딩해 꺼낸다
+        :param verse_id: 0부터 시작하는 절의 위치
+        :return: 본문 정보 네임드튜플
+        """
+        if not 0 <= verse_id < len(self):
+            raise IndexError(verse_id)
+
+        bible_pk = U16.unpack_from(self.__mmap, self.__book_pks_start + 2 * verse_id)[0]
+        chapter_num = U16.unpack_from(self.__mmap, self.__chapter_nums_start + 2 * verse_id)[0]
+        paragraph_start = self.__paragraphs_start + PARAGRAPH_SIZE * verse_id
+        paragraph = self.__mmap[paragraph_start:paragraph_start + PARAGRAPH_SIZE].rstrip(b'\0')
+        text_start = U64.unpack_from(self.__mmap, self.__text_offsets_start + 8 * verse_id)[0]
+        text_stop = U64.unpack_from(self.__mmap, self.__text_offsets_start + 8 * (verse_id + 1))[0]
+
+        return BibleInfo(
+            books_name=self.names.get(bible_pk),
+            chapter_num=chapter_num,
+            paragraph_num=paragraph.decode('utf-8'),
+            texts=self.__mmap[self.__texts_start + text_start:self.__texts_start + text_stop].decode('utf-8'),
+            bible_pk=bible_pk,
+        )
+
+    def chapter(self, bible_pk, chapter_num):
+        """
+        장에 속한 절을 모두 꺼낸다
+        :return: 본문 정보 네임드튜플로 구성된 리스트
+        """
+        start, stop = self.chapters[(bible_pk, chapter_num)]
+        return [self.verse(verse_id) for verse_id in range(start, stop)]
+
+    def random_verse(self, bible_pk=None, chapter_num=None):
+        """
+        장이 주어지면 그 장에서, 없다면 묶음 전체에서 절 하나를 무작위로 뽑는다
+        :return: 본문 정보 네임드튜플, 뽑을 절이 없다면 LookupError
+        """
+        start, stop = self.chapters.get((bible_pk, chapter_num), (0, 0)) if bible_pk else (0, len(self))
+
+        # 예외처리: 묶음에 없거나 말씀이 없는 장, 또는 빈 묶음에서 뽑으려는 경우
+        if start == stop:
+            raise LookupError(f'{bible_pk} {chapter_num}장에 뽑을 말씀이 없습니다' if bible_pk
+                              else '묶음에 뽑을 말씀이 없습니다')
+        return self.verse(random.randrange(start, stop))
+
+
+if __name__ == '__main__':
+    pass
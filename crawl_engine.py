@@ -0,0 +1,299 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+from crawler import BASE_URL, BibleCrawler
+
+
+# --- 자료구조 --- #
+
+class CrawlJob(NamedTuple):
+    """
+    크롤링할 장 하나를 정의하는 네임드튜플
+    """
+    bible_num: int  # 구약성경: 1, 신약성경: 2
+    book_pk: int  # 성경책 pk
+    chapter: int  # 장
+
+
+class CrawlResult(NamedTuple):
+    """
+    크롤링 작업 하나의 결과를 담는 네임드튜플
+    """
+    job: CrawlJob  # 실행한 작업
+    bible_info: list  # 본문 정보 네임드튜플 리스트, 실패했다면 None
+    error: Exception  # 실패했을 때의 예외, 성공했다면 None
+
+
+# --- 요청 속도 제한 --- #
+
+class RateLimiter:
+    """
+    host마다 초당 요청 수를 제한하는 클래스
+    """
+
+    def __init__(self, rate=None):
+        """
+        인스턴스 속성 정의
+        :param rate: host 하나에 보낼 초당 최대 요청 수, None이면 제한하지 않는다
+        """
+        self.__interval = 1 / rate if rate else 0
+        self.__next_times = {}
+        self.__lock = threading.Lock()
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def interval(self):
+        return self.__interval
+
+    # --- 요청 간격 조절 함수 --- #
+
+    def wait(self, host):
+        """
+        host에 다음 요청을 보내도 될 때까지 기다린다
+        :param host: 요청을 보낼 host
+        :return: None
+        """
+        if not self.interval:
+            return None
+
+        # 다음 요청 시각은 lock 안에서 예약하고, 기다리는 건 lock 밖에서 한다
+        with self.__lock:
+            now = time.monotonic()
+            start_time = max(self.__next_times.get(host, now), now)
+            self.__next_times[host] = start_time + self.interval
+
+        delay = start_time - now
+        if delay > 0:
+            time.sleep(delay)
+        return None
+
+
+# --- 동시 크롤러 --- #
+
+class ConcurrentCrawler:
+    """
+    여러 장을 동시에 크롤링하고 결과를 한 스레드에서 db에 쓰는 크롤러
+    """
+
+    def __init__(self, crawler=None, max_workers=4, rate=None):
+        """
+        인스턴스 속성 정의
+        :param crawler: 본문을 가져올 BibleCrawler, 없다면 새로 만든다
+        :param max_workers: 동시에 실행할 작업 수
+        :param rate: host 하나에 보낼 초당 최대 요청 수, None이면 제한하지 않는다
+        """
+        self.__crawler = crawler if crawler else BibleCrawler(pool_size=max_workers)
+        self.__max_workers = max_workers
+        self.__rate_limiter = RateLimiter(rate)
+        self.__host = urlparse(BASE_URL).netloc
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def crawler(self):
+        return self.__crawler
+
+    @property
+    def max_workers(self):
+        return self.__max_workers
+
+    @property
+    def rate_limiter(self):
+        return self.__rate_limiter
+
+    # --- 크롤링 함수 --- #
+
+    def fetch(self, job, books_name):
+        """
+        속도 제한을 지키며 작업 하나의 본문 정보를 가져온다
+        :param job: CrawlJob 네임드튜플
+        :param books_name: 성경책 이름
+        :return: 본문 정보 네임드튜플로 구성된 리스트
+        """
+        self.rate_limiter.wait(self.__host)
+        return self.crawler.fetch_bible_info(job.bible_num, job.book_pk, job.chapter, books_name)
+
+    def crawl(self, jobs, books_names):
+        """
+        작업들을 max_workers개씩 동시에 실행하고 끝나는 순서대로 결과를 돌려준다
+        :param jobs: CrawlJob 네임드튜플의 이터러블
+        :param books_names: 성경책 pk를 성경책 이름에 대응시킨 딕셔너리
+        :return: CrawlResult 네임드튜플을 만드는 제너레이터
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {}
+        try:
+            futures = {executor.submit(self.fetch, job, books_names[job.book_pk]): job for job in jobs}
+
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    yield CrawlResult(job=job, bible_info=future.result(), error=None)
+
+                # 예외처리: 작업 하나가 실패해도 나머지 작업은 계속 진행한다
+                except Exception as e:
+                    yield CrawlResult(job=job, bible_info=None, error=e)
+
+        # 소비자가 중간에 멈췄다면 아직 시작하지 않은 작업은 취소한다
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+
+# --- 작업 장부 실행기 --- #
+
+class LedgerRunner:
+    """
+    db의 crawl_jobs 장부를 따라 작업을 실행하고, 저장할 때마다 장부에 체크포인트를 남기는 실행기
+    중간에 멈췄더라도 다시 실행하면 끝나지 않은 작업부터 이어서 하고,
+    실패한 작업은 backoff * 2^(시도 횟수 - 1)초 뒤에 max_attempts번까지 다시 시도한다
+    """
+
+    def __init__(self, engine, db, max_attempts=5, backoff=30, batch_size=50):
+        """
+        인스턴스 속성 정의
+        :param engine: 작업을 동시에 실행할 ConcurrentCrawler
+        :param db: 장부와 결과를 저장할 DB 인스턴스
+        :param max_attempts: 작업 하나를 시도할 최대 횟수
+        :param backoff: 첫 번째 실패 뒤에 기다릴 시간(초)
+        :param batch_size: 체크포인트 하나에 묶을 장의 수
+        """
+        self.__engine = engine
+        self.__db = db
+        self.__max_attempts = max_attempts
+        self.__backoff = backoff
+        self.__batch_size = batch_size
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def engine(self):
+        return self.__engine
+
+    @property
+    def db(self):
+        return self.__db
+
+    @property
+    def max_attempts(self):
+        return self.__max_attempts
+
+    @property
+    def backoff(self):
+        return self.__backoff
+
+    # --- 실행 함수 --- #
+
+    def run(self, books_names, wait=True):
+        """
+        장부에 실행할 작업이 남지 않을 때까지 작업을 실행한다
+        :param books_names: 성경책 pk를 성경책 이름에 대응시킨 딕셔너리
+        :param wait: 다시 시도할 시각이 아직 오지 않은 작업이 있을 때 기다릴지 여부
+        :return: (저장한 장의 수, 장부에서 failed인 CrawlJob 리스트) 튜플
+        """
+        self.db.create_job_table()
+        self.checked(self.db.fail_exhausted_crawl_jobs(self.max_attempts, time.time()))
+
+        stored_count = 0
+        while True:
+            rows = self.checked(self.db.search_runnable_crawl_jobs_from_db(self.max_attempts, time.time()))
+            jobs = [CrawlJob(*row) for row in rows]
+            if jobs:
+                stored_count += self.run_round(jobs, books_names)
+                continue
+
+            # 실행할 작업이 없다면 가장 먼저 다시 시도할 작업을 기다린다
+            next_attempt_at = self.checked(self.db.search_next_crawl_retry_from_db(self.max_attempts))
+            if next_attempt_at is None or not wait:
+                break
+            time.sleep(max(next_attempt_at - time.time(), 0))
+
+        failed_jobs = [CrawlJob(*row) for row in self.checked(self.db.search_failed_crawl_jobs_from_db())]
+        return stored_count, failed_jobs
+
+    @staticmethod
+    def checked(result):
+        """
+        DB 함수는 실패하면 예외를 리턴하므로, 장부를 읽지 못했다면 실행을 멈추도록 예외를 일으킨다
+        :param result: DB 함수의 리턴값
+        :return: 예외가 아니라면 result 그대로
+        """
+        if isinstance(result, sqlite3.Error):
+            raise result
+        return result
+
+    def record_failure(self, job, error, books_names):
+        """
+        작업 하나의 실패를 장부에 남기고, 시도 횟수에 따라 다시 시도할 시각을 정한다
+        :param job: CrawlJob 네임드튜플
+        :param error: 실패했을 때의 예외
+        :param books_names: 성경책 pk를 성경책 이름에 대응시킨 딕셔너리
+        :return: None
+        """
+        attempts = self.checked(self.db.search_crawl_job_attempts_from_db(job))
+        next_attempt_at = time.time() + self.backoff * 2 ** (attempts - 1)
+        self.checked(self.db.record_crawl_job_failure(job, error, next_attempt_at, time.time()))
+        print(f'{books_names[job.book_pk]} {job.chapter}장 크롤링 실패({attempts}/{self.max_attempts}): {error}')
+        return None
+
+    def checkpoint(self, batch, batch_jobs, books_names):
+        """
+        장들을 bible_info와 장부에 함께 저장하고, 저장하지 못했다면 모든 장을 실패로 남긴다
+        :return: 저장한 장의 수
+        """
+        error = self.db.checkpoint_crawl_jobs(batch, batch_jobs, time.time())
+        if error is None:
+            return len(batch)
+
+        for job in batch_jobs:
+            self.record_failure(job, error, books_names)
+        return 0
+
+    def run_round(self, jobs, books_names):
+        """
+        작업들을 running으로 기록하고 동시에 실행한 뒤, 결과를 장부에 남긴다
+        성공한 장은 batch_size개씩 bible_info와 장부를 트랜잭션 하나로 저장한다
+        :param jobs: CrawlJob 네임드튜플 리스트
+        :param books_names: 성경책 pk를 성경책 이름에 대응시킨 딕셔너리
+        :return: 저장한 장의 수
+        """
+        self.checked(self.db.mark_crawl_jobs_running(jobs, time.time()))
+
+        stored_count = 0
+        batch = []
+        batch_jobs = []
+
+        for result in self.engine.crawl(jobs, books_names):
+            job = result.job
+            if result.error is not None:
+                self.record_failure(job, result.error, books_names)
+                continue
+
+            # 예외처리: 본문이 비어 있다면 저장할 절이 없으므로 done으로 남기지 않고 실패로 기록한다
+            if not result.bible_info:
+                self.record_failure(job, ValueError('본문이 비어 있습니다'), books_names)
+                continue
+
+            batch.append(result.bible_info)
+            batch_jobs.append(job)
+            print(f'{books_names[job.book_pk]} {job.chapter}장 크롤링 완료')
+
+            if len(batch) >= self.__batch_size:
+                stored_count += self.checkpoint(batch, batch_jobs, books_names)
+                batch, batch_jobs = [], []
+
+        # 마지막으로 남은 장들을 저장한다
+        if batch:
+            stored_count += self.checkpoint(batch, batch_jobs, books_names)
+
+        return stored_count
+
+
+if __name__ == '__main__':
+    pass
@@ -1,10 +1,39 @@
 import sqlite3
+import threading
 from typing import NamedTuple
 from urllib.parse import parse_qsl
 
 import re
 from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# 가톨릭 굿뉴스 성경 페이지의 기본 URL
+BASE_URL = 'http://maria.catholic.or.kr/bible/read/bible_'
+
+# 선택할 수 있는 파서
+# soup: BeautifulSoup으로 문서 전체를 렌더링한 뒤 CSS 선택자로 찾는다 (예전 방식)
+# lxml: lxml로 문서를 파싱하고 미리 컴파일한 XPath로 필요한 행만 찾는다
+PARSERS = ('soup', 'lxml')
+
+# 목록 페이지의 '총 00장' 문구와 그 안의 숫자
+CHAPTERS_COUNT_PATTERN = re.compile(r'^\w\s\d+\w$')
+DIGITS_PATTERN = re.compile(r'\d+')
+
+# lxml 파서가 쓰는 XPath: CSS 선택자 '#scrapSend > .register01 > tbody > tr'와
+# '#container > .type3 > #scrapSend > #font_chg > tbody'의 tr에 그대로 대응한다
+LIST_ROWS_XPATH = etree.XPath(
+    '//*[@id="scrapSend"]/*[contains(concat(" ", normalize-space(@class), " "), " register01 ")]/tbody/tr'
+)
+LIST_ANCHORS_XPATH = etree.XPath('.//a[@href]')
+READ_ROWS_XPATH = etree.XPath(
+    '//*[@id="container"]/*[contains(concat(" ", normalize-space(@class), " "), " type3 ")]'
+    '/*[@id="scrapSend"]/*[@id="font_chg"]/tbody/tr'
+)
 
 
 # --- 자료구조 --- #
@@ -25,6 +54,15 @@ class BibleInfo(NamedTuple):
     chapter_num: int  # 장
     paragraph_num: str  # 절
     texts: str  # 본문
+    bible_pk: int = None  # 성경책 pk
+
+
+class ListPage(NamedTuple):
+    """
+    한 번 내려받아 파싱한 성경 목록 페이지를 보관하는 네임드튜플
+    """
+    contents: list  # 성경책 이름과 링크가 담긴 tr 리스트
+    book_info: list  # href 요소가 있는 anchor 리스트
 
 
 # --- 크롤러 --- #
@@ -34,18 +72,115 @@ class BibleCrawler:
     <가톨릭 굿뉴스>의 성경 구절을 무작위로 가져오는 크롤러
     """
 
-    def __init__(self):
+    def __init__(self, pool_size=10, timeout=10, retries=3, backoff=0.5, response_cache=None, transport=None,
+                 parser='soup'):
         """
         인스턴스 속성 정의
+        :param pool_size: 세션이 유지할 커넥션 풀의 크기
+        :param timeout: 요청 하나가 기다릴 최대 시간(초)
+        :param retries: 5xx 응답이나 연결 오류가 났을 때 다시 시도할 횟수
+        :param backoff: 재시도 사이의 대기 시간을 늘리는 계수
+        :param response_cache: 응답을 디스크에 저장할 ResponseCache, None이면 매번 새로 요청한다
+        :param transport: 세션 대신 요청을 보낼 get 메서드를 가진 객체 (ex: ReplayTransport), None이면 세션을 쓴다
+        :param parser: PARSERS 중 하나
         """
+        if parser not in PARSERS:
+            raise ValueError(f'알 수 없는 파서입니다: {parser}')
+
+        self.__pool_size = pool_size
+        self.__timeout = timeout
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__session = None
+        self.__session_lock = threading.Lock()  # 여러 스레드가 처음 요청할 때 세션을 하나만 만들게 한다
+        self.__response_cache = response_cache
+        self.__transport = transport
+        self.__parser = parser
+        self.__revalidate = False
         self.__commit = False
         self.__bible_num = None
         self.__primary_key = None
         self.__chapter_num = None
         self.__bible_data = None
+        self.__list_pages = {}
+        self.__list_data = {}
 
     # --- 네임 맹글링 --- #
 
+    @property
+    def pool_size(self):
+        return self.__pool_size
+
+    @pool_size.setter
+    def pool_size(self, input_size):
+        self.__pool_size = input_size
+
+    @property
+    def timeout(self):
+        return self.__timeout
+
+    @timeout.setter
+    def timeout(self, input_timeout):
+        self.__timeout = input_timeout
+
+    @property
+    def retries(self):
+        return self.__retries
+
+    @retries.setter
+    def retries(self, input_retries):
+        self.__retries = input_retries
+
+    @property
+    def backoff(self):
+        return self.__backoff
+
+    @backoff.setter
+    def backoff(self, input_backoff):
+        self.__backoff = input_backoff
+
+    @property
+    def session(self):
+        return self.__session
+
+    @session.setter
+    def session(self, input_session):
+        self.__session = input_session
+
+    @property
+    def response_cache(self):
+        return self.__response_cache
+
+    @response_cache.setter
+    def response_cache(self, input_cache):
+        self.__response_cache = input_cache
+
+    @property
+    def transport(self):
+        return self.__transport
+
+    @transport.setter
+    def transport(self, input_transport):
+        self.__transport = input_transport
+
+    @property
+    def parser(self):
+        return self.__parser
+
+    @parser.setter
+    def parser(self, input_parser):
+        if input_parser not in PARSERS:
+            raise ValueError(f'알 수 없는 파서입니다: {input_parser}')
+        self.__parser = input_parser
+
+    @property
+    def revalidate(self):
+        return self.__revalidate
+
+    @revalidate.setter
+    def revalidate(self, input_bool):
+        self.__revalidate = input_bool
+
     @property
     def commit(self):
         return self.__commit
@@ -86,8 +221,47 @@ class BibleCrawler:
     def bible_data(self, input_data):
         self.__bible_data = input_data
 
+    @property
+    def list_pages(self):
+        return self.__list_pages
+
+    @property
+    def list_data(self):
+        return self.__list_data
+
     # --- HTML 문서 가져오기 --- #
 
+    def create_session(self):
+        """
+        keep-alive 커넥션 풀과 재시도 정책을 가진 requests 세션을 만든다
+        목록 페이지와 본문 페이지 요청은 모두 이 세션 하나를 함께 쓴다
+        :return: requests.Session 객체
+        """
+        # 5xx 응답과 연결 오류는 backoff 간격을 늘려 가며 retries 번까지 다시 시도한다
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=(500, 502, 503, 504),
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        return self.session
+
+    def shared_session(self):
+        """
+        모든 요청이 함께 쓰는 세션을 꺼낸다: 여러 스레드가 동시에 처음 요청해도 세션은 한 번만 만든다
+        :return: requests.Session 객체
+        """
+        with self.__session_lock:
+            return self.session if self.session else self.create_session()
+
     def make_payload(self):
         """
         조건에 따라 payload 값을 변경하기 위한 함수
@@ -98,76 +272,101 @@ class BibleCrawler:
                                           'n': self.primary_key,
                                           'p': self.chapter_num}
 
-    def requests_from_catholic_goodnews(self):
+    def requests_from_catholic_goodnews(self, payload=None):
         """
         payload 값을 받아 requests 객체를 반환한다
+        :param payload: 요청에 쓸 payload, 없다면 인스턴스 속성으로 만든다
         :return: requests 객체
         """
-        # self.payload를 사용하되 만일 비어 있다면 메서드를 호출한다
-        payload = self.make_payload()
+        # 넘겨받은 payload를 사용하되 만일 비어 있다면 메서드를 호출한다
+        payload = payload if payload else self.make_payload()
 
         # URL 변수들
-        base_url = 'http://maria.catholic.or.kr/bible/read/bible_'
+        base_url = BASE_URL
         url_list = 'list.asp'
         url_read = 'read.asp'
 
         # payload가 성경 값만 담고 있으면 list를, 책과 장 값까지 담고 있으면 read를 반환한다
         result_url = base_url + url_list if len(payload) is 1 else base_url + url_read
 
-        # requests를 이용해 HTML 문서가 담긴 requests 객체를 받아온다
-        return requests.get(result_url, params=payload)
+        # transport가 있다면 그것으로, 없다면 세션을 재사용해 HTML 문서가 담긴 requests 객체를 받아온다
+        if self.transport:
+            session = self.transport
+        else:
+            session = self.shared_session()
+        if self.response_cache is None:
+            return session.get(result_url, params=payload, timeout=self.timeout)
 
-    def soup_from_requests(self):
+        # 응답 캐시가 있다면 TTL 안의 응답은 디스크에서 꺼내고, 지났거나 revalidate라면 조건부 요청으로 재검증한다
+        return self.response_cache.fetch(session, result_url, params=payload, revalidate=self.revalidate,
+                                         timeout=self.timeout)
+
+    def soup_from_requests(self, payload=None):
         """
         리퀘스트 객체에서 soup 객체를 받아온다
+        :param payload: 요청에 쓸 payload, 없다면 인스턴스 속성으로 만든다
         :return: soup 객체
         """
-        # self.requests_obj를 사용하되 만일 비어 있다면 메서드를 호출한다
-        requests_obj = self.requests_from_catholic_goodnews()
+        requests_obj = self.requests_from_catholic_goodnews(payload)
 
         # requests  객체에 text 메소드를 써서 문자열 형태의 HTML 페이지를 꺼낸다
         text = requests_obj.text
         # HTML 문서를 beautifulsoup으로 렌더링해서 soup 객체로 만든다
         return BeautifulSoup(text, 'lxml')
 
+    def tree_from_requests(self, payload=None):
+        """
+        리퀘스트 객체에서 lxml 트리를 받아온다
+        :param payload: 요청에 쓸 payload, 없다면 인스턴스 속성으로 만든다
+        :return: lxml 트리의 최상위 요소
+        """
+        requests_obj = self.requests_from_catholic_goodnews(payload)
+        return lxml_html.document_fromstring(requests_obj.text)
+
     # --- 성경 정보를 결정하기 위한 데이터 크롤링 --- #
 
-    def list_contents_from_soup(self):
+    def list_page_from_soup(self):
         """
-        soup 객체에서 성경책 이름과 링크가 담긴 tr 리스트를 꺼내고
-        구약성경, 신약성경에 따라 다른 인덱스를 제거한다
-        :return: tr 리스트
+        soup 객체에서 성경책 이름과 링크가 담긴 tr 리스트와 anchor 리스트를 꺼내 ListPage로 묶는다
+        같은 bible_num의 목록 페이지는 한 번만 내려받아 파싱하고, 이후에는 보관해 둔 ListPage를 돌려준다
+        :return: ListPage 네임드튜플
         """
-        # self.soup을 사용하되 만일 비어 있다면 메서드를 호출한다
+        # 이미 파싱한 목록 페이지가 있다면 그대로 사용한다
+        if self.bible_num in self.list_pages:
+            return self.list_pages[self.bible_num]
+
         soup = self.soup_from_requests()
 
         # soup 객체에서 성경책 이름과 링크가 담긴 tr 리스트를 꺼낸다
         contents = soup.select('#scrapSend > .register01 > tbody > tr')
 
         # 구약성경이냐 신약성경이냐에 따라 다르게 퍼져 있는 제목 정보를 지운다
-        if self.bible_num is 1:
-            del contents[0], contents[5], contents[21], contents[28]
-        else:
-            del contents[0], contents[4], contents[5], contents[26]
-
-        return contents
-
-    def book_info_from_list_contents(self):
-        """
-        tr 리스트에서 href 요소가 있는 anchor 요소만 꺼낸다
-        :return: href 요소가 있는 anchor 리스트
-        """
-        # self.list_contents를 사용하되 만일 비어 있다면 메서드를 호출한다
-        list_contents = self.list_contents_from_soup()
+        contents = self.remove_title_rows(contents)
 
         # href 요소가 있는 td만 꺼내기 위한 함수
         def has_href(href):
             return href
 
         # contents에서 href만 꺼낸 뒤 우리가 가공할 한 가지 anchor만 추출한다
-        # 여러 번 호출되기 때문에 제너레이터가 아닌 리스트 컴프리헨션으로 만든다
         # ex: <a href="bible_read.asp?m=1&amp;n=101&amp;p=1">창세</a>
-        return [book.find_all(href=has_href)[1] for book in list_contents]
+        book_info = [book.find_all(href=has_href)[1] for book in contents]
+
+        self.list_pages[self.bible_num] = ListPage(contents=contents, book_info=book_info)
+        return self.list_pages[self.bible_num]
+
+    def list_contents_from_soup(self):
+        """
+        ListPage에서 구약성경, 신약성경에 따라 다른 인덱스를 제거한 tr 리스트를 꺼낸다
+        :return: tr 리스트
+        """
+        return self.list_page_from_soup().contents
+
+    def book_info_from_list_contents(self):
+        """
+        ListPage에서 href 요소가 있는 anchor 리스트를 꺼낸다
+        :return: href 요소가 있는 anchor 리스트
+        """
+        return self.list_page_from_soup().book_info
 
     def pks_from_book_info(self):
         """
@@ -211,9 +410,12 @@ class BibleCrawler:
         chapter_lists = []
         for chapter in list_contents:
             # 정규표현식으로 <td> 요소들 가운데서 '총 00장' 문구만 꺼낸다
-            raw_td = chapter.find(string=re.compile(r'^\w\s\d+\w$'))
+            raw_td = chapter.find(string=CHAPTERS_COUNT_PATTERN)
+            # 예외처리: 목록 페이지의 구조가 바뀌어 '총 00장' 문구가 없는 경우
+            if raw_td is None:
+                raise ValueError(f'장 수를 찾을 수 없는 행입니다: {chapter.get_text(" ", strip=True)}')
             # '총 00장' 문구에서 숫자만 걸러낸다
-            chapter_num = re.search(r'\d+', raw_td)
+            chapter_num = DIGITS_PATTERN.search(raw_td)
             # 숫자를 미리 정의한 리스트에 추가한다
             chapter_lists.append(chapter_num.group())
 
@@ -224,7 +426,11 @@ class BibleCrawler:
         성경 데이터를 수합하는 네임드튜플을 만든다
         :return: 성경 pk와 이름, 장 수의 네임드튜플로 이루어진 딕셔너리
         """
-        # 인스턴스 속성을 가져오거나 속성이 없다면 메서드를 호출한다
+        if self.parser == 'lxml':
+            self.bible_data = self.bible_data_from_tree()
+            return self.bible_data
+
+        # 세 추출 함수는 모두 같은 ListPage를 읽으므로 목록 페이지는 한 번만 내려받는다
         pks = self.pks_from_book_info()
         names = self.names_from_book_info()
         chapters = self.chapters_from_list_contents()
@@ -236,15 +442,61 @@ class BibleCrawler:
         ) for i in zip(pks, list_comp)}
         return self.bible_data
 
+    def remove_title_rows(self, contents):
+        """
+        구약성경이냐 신약성경이냐에 따라 다르게 퍼져 있는 제목 행을 지운다
+        :param contents: 목록 페이지의 tr 리스트
+        :return: 성경책 행만 남은 tr 리스트
+        """
+        if self.bible_num == 1:
+            del contents[0], contents[5], contents[21], contents[28]
+        else:
+            del contents[0], contents[4], contents[5], contents[26]
+        return contents
+
+    def bible_data_from_tree(self):
+        """
+        lxml 파서로 목록 페이지에서 성경 데이터를 한 번에 꺼낸다
+        같은 bible_num의 목록 페이지는 한 번만 내려받아 파싱한다
+        :return: 성경 pk와 이름, 장 수의 네임드튜플로 이루어진 딕셔너리
+        """
+        if self.bible_num in self.list_data:
+            return self.list_data[self.bible_num]
+
+        tree = self.tree_from_requests()
+        contents = self.remove_title_rows(LIST_ROWS_XPATH(tree))
+
+        bible_data = {}
+        for row in contents:
+            # 두 번째 anchor가 성경책 이름과 링크를 가진다
+            # ex: <a href="bible_read.asp?m=1&amp;n=101&amp;p=1">창세</a>
+            anchor = LIST_ANCHORS_XPATH(row)[1]
+            primary_key = parse_qsl(anchor.get('href'))[1][1]
+
+            # '총 00장' 문구에서 숫자만 걸러낸다
+            raw_td = next((text for text in row.itertext() if CHAPTERS_COUNT_PATTERN.search(text)), None)
+            # 예외처리: 목록 페이지의 구조가 바뀌어 '총 00장' 문구가 없는 경우
+            if raw_td is None:
+                raise ValueError(f'장 수를 찾을 수 없는 행입니다: {" ".join(row.text_content().split())}')
+            chapters_count = DIGITS_PATTERN.search(raw_td).group()
+
+            bible_data[int(primary_key)] = BibleData(
+                books_name=anchor.text_content(),
+                chapters_count=chapters_count,
+            )
+
+        self.list_data[self.bible_num] = bible_data
+        return bible_data
+
     # --- 성경 정보가 결정된 이후 본문 크롤링 --- #
 
-    def read_contents_from_soup(self):
+    def read_contents_from_soup(self, payload=None):
         """
         soup 객체에서 성경 본문과 절 정보가 담긴 <tbody> 요소를 꺼낸다
+        :param payload: 요청에 쓸 payload, 없다면 인스턴스 속성으로 만든다
         :return: 성경 본문과 절 정보가 담긴 <tbody> 요소
         """
-        # self.soup을 사용하되 만일 비어 있다면 메서드를 호출한다
-        soup = self.soup_from_requests()
+        soup = self.soup_from_requests(payload)
 
         return soup.select_one('#container > .type3 > #scrapSend > #font_chg > tbody')
 
@@ -276,42 +528,122 @@ class BibleCrawler:
         # ex: 다윗의 자손이시며 아브라함의 자손이신 예수 그리스도의 족보. ...
         return (i.text.strip() for i in raw_texts)
 
+    def bible_info_from_read_contents(self, read_contents, primary_key, books_name, chapter_num):
+        """
+        read_contents의 <tr> 요소를 한 번만 순회하며 절과 본문을 함께 꺼낸다
+        :param read_contents: 성경 본문과 절 정보가 담긴 <tbody> 요소
+        :param primary_key: 성경책 pk
+        :param books_name: 성경책 이름
+        :param chapter_num: 장
+        :return: 본문 정보 네임드튜플을 만드는 제너레이터
+        """
+        for row in read_contents.find_all('tr', recursive=False):
+            raw_paragraph = row.find('td', attrs={'class': 'num_color'})
+            raw_text = row.find('td', attrs={'class': 'tt'})
+
+            # 절이나 본문이 없는 행은 건너뛴다
+            if raw_paragraph is None or raw_text is None:
+                continue
+
+            # 절 번호가 비어 있는 행은 성경 제목이므로 건너뛴다
+            paragraph_num = raw_paragraph.text.strip()
+            if paragraph_num == '':
+                continue
+
+            yield BibleInfo(
+                books_name=books_name,
+                chapter_num=chapter_num,
+                paragraph_num=paragraph_num,
+                texts=raw_text.text.strip(),
+                bible_pk=primary_key,
+            )
+
+    def bible_info_from_read_tree(self, tree, primary_key, books_name, chapter_num):
+        """
+        lxml 파서로 본문 페이지의 <tr> 요소를 한 번만 순회하며 절과 본문을 함께 꺼낸다
+        :param tree: 본문 페이지의 lxml 트리
+        :param primary_key: 성경책 pk
+        :param books_name: 성경책 이름
+        :param chapter_num: 장
+        :return: 본문 정보 네임드튜플을 만드는 제너레이터
+        """
+        for row in READ_ROWS_XPATH(tree):
+            cells = {}
+            for cell in row.iterchildren('td'):
+                for class_name in (cell.get('class') or '').split():
+                    cells.setdefault(class_name, cell)
+
+            raw_paragraph = cells.get('num_color')
+            raw_text = cells.get('tt')
+
+            # 절이나 본문이 없는 행은 건너뛴다
+            if raw_paragraph is None or raw_text is None:
+                continue
+
+            # 절 번호가 비어 있는 행은 성경 제목이므로 건너뛴다
+            paragraph_num = raw_paragraph.text_content().strip()
+            if paragraph_num == '':
+                continue
+
+            yield BibleInfo(
+                books_name=books_name,
+                chapter_num=chapter_num,
+                paragraph_num=paragraph_num,
+                texts=raw_text.text_content().strip(),
+                bible_pk=primary_key,
+            )
+
+    def bible_info_from_payload(self, payload, primary_key, books_name, chapter_num):
+        """
+        본문 페이지를 한 번만 내려받아 선택한 파서로 본문 정보를 꺼낸다
+        :param payload: 요청에 쓸 payload, 없다면 인스턴스 속성으로 만든다
+        :return: 본문 정보 네임드튜플로 구성된 리스트
+        """
+        if self.parser == 'lxml':
+            tree = self.tree_from_requests(payload)
+            return list(self.bible_info_from_read_tree(tree, primary_key, books_name, chapter_num))
+
+        read_contents = self.read_contents_from_soup(payload)
+        return list(self.bible_info_from_read_contents(read_contents, primary_key, books_name, chapter_num))
+
     def make_bible_info(self, conn):
         """
         본문 정보가 담긴 자료구조를 생성한다
         :return: 본문 정보 네임드튜플로 구성된 리스트
         """
         # sql 명령문: bible_data 테이블에서 입력한 primary_key 값에 해당하는 name을 출력하라
-        sql_command = """ SELECT name FROM bible_data WHERE bible_pk=%d """ % self.primary_key
+        sql_command = """ SELECT name FROM bible_data WHERE bible_pk = ?; """
 
         # 커서를 꺼내 db를 검색한다
         cursor = conn.cursor()
         try:
-            data = cursor.execute(sql_command)
+            data = cursor.execute(sql_command, (self.primary_key,))
             books_name = [book for book in data][0][0]
 
+        # 예외처리: db에 해당 성경책이 없을 경우
+        except IndexError:
+            books_name = self.bible_data[self.primary_key].books_name
+
         # 예외처리: data_table이 없을 경우
         except sqlite3.Error as e:
             print(e)
             books_name = self.bible_data[self.primary_key].books_name
 
-        # paragraphs와 texts를 호출한다
-        paragraphs = self.paragraphs_from_read_contents()
-        texts = self.texts_from_read_contents()
-
-        # paragraphs와 texts를 병렬 순회하며 성경 제목이 담긴 요소를 제거한다
-        strip_comp = ((i[0], i[1]) for i in zip(paragraphs, texts) if i[0] is not '')
-
-        # 성경 제목이 제거된 제너레이터에 성경책 이름과 장 숫자를 첨가해 새로운 제너레이터를 만든다
-        result_comp = ((books_name, self.chapter_num, i[0], i[1]) for i in strip_comp)
+        # 본문 페이지는 한 번만 내려받아 파싱한다
+        return self.bible_info_from_payload(None, self.primary_key, books_name, self.chapter_num)
 
-        # 최종 제너레이터를 순회하며 네임드튜플에 담는다
-        return [BibleInfo(
-            books_name=i[0],
-            chapter_num=i[1],
-            paragraph_num=i[2],
-            texts=i[3],
-        ) for i in result_comp]
+    def fetch_bible_info(self, bible_num, primary_key, chapter_num, books_name):
+        """
+        인스턴스 속성을 건드리지 않고 넘겨받은 장의 본문 정보를 가져온다
+        여러 스레드에서 동시에 호출할 수 있다
+        :param bible_num: 구약성경: 1, 신약성경: 2
+        :param primary_key: 성경책 pk
+        :param chapter_num: 장
+        :param books_name: 성경책 이름
+        :return: 본문 정보 네임드튜플로 구성된 리스트
+        """
+        payload = {'m': bible_num, 'n': primary_key, 'p': chapter_num}
+        return self.bible_info_from_payload(payload, primary_key, books_name, chapter_num)
 
 
 if __name__ == '__main__':
@@ -1,29 +1,188 @@
 import sqlite3
 
 
+# bible.db 스키마 버전: PRAGMA user_version에 기록한다
+SCHEMA_VERSION = 1
+
+# trigram 토크나이저가 색인으로 찾을 수 있는 검색어의 최소 글자 수, 더 짧으면 LIKE로 찾는다
+SEARCH_MIN_LENGTH = 3
+
+# bible_info는 rowid가 없으므로 전문 검색 테이블의 rowid는 bible_fts_rows에서 (성경책 pk, 장, 절)로 찾는다
+# 절 번호는 '1'과 '1ㄱ'처럼 숫자로 바꾸면 겹치는 경우가 있어 계산하지 않고 따로 발급한다
+FTS_ROWID = '''(SELECT fts_rowid FROM bible_fts_rows WHERE bible_pk = {row}.bible_pk
+                AND chapter_num = {row}.chapter_num AND paragraph_num = {row}.paragraph_num)'''
+
+# 크롤링 작업 장부의 상태
+# pending: 아직 실행하지 않음, running: 실행 중(멈췄다면 다시 실행한다), done: 저장 완료, failed: 실패
+CRAWL_JOB_STATUSES = ('pending', 'running', 'done', 'failed')
+
+
 class DB:
     """
     database를 다루는 클래스
     """
 
-    def __init__(self):
+    def __init__(self, statement_cache_size=64):
+        """
+        인스턴스 속성 정의
+        :param statement_cache_size: connection이 컴파일해 둘 sql 명령문의 수
+        """
         self.__db_name = 'bible.db'
         self.__conn = None
+        self.__statement_cache_size = statement_cache_size
+        self.__saved_pragmas = None  # 대량 적재 모드를 켜기 전의 (journal_mode, synchronous)
         self.__create_table_commands = {
+            # bible_pk가 rowid이므로 성경책 하나는 한 row만 가진다
             'bible_data': """ CREATE TABLE IF NOT EXISTS bible_data (
-                              id INTEGER PRIMARY KEY,
-                              bible_pk INTEGER NOT NULL,
+                              bible_pk INTEGER PRIMARY KEY,
                               name TEXT NOT NULL,
                               chapter_count INTEGER NOT NULL
                               ); """,
+            # (bible_pk, chapter_num, paragraph_num) 순서로 row가 정렬되어 저장되므로
+            # 장 단위 검색은 이 기본키 하나로 끝난다 (covering index 역할)
             'bible_info': """ CREATE TABLE IF NOT EXISTS bible_info (
-                              id INTEGER PRIMARY KEY,
-                              name TEXT NOT NULL,
+                              bible_pk INTEGER NOT NULL,
                               chapter_num INTEGER NOT NULL,
                               paragraph_num INTEGER NOT NULL,
                               texts TEXT NOT NULL,
-                              FOREIGN KEY (name) REFERENCES bible_data (name)
-                              ); """
+                              PRIMARY KEY (bible_pk, chapter_num, paragraph_num),
+                              FOREIGN KEY (bible_pk) REFERENCES bible_data (bible_pk)
+                              ) WITHOUT ROWID; """,
+            # 전문 검색 테이블의 rowid 대응표: bible_info와 같은 열 선언을 써서 절 번호가 같은 값으로 비교된다
+            'bible_fts_rows': """ CREATE TABLE IF NOT EXISTS bible_fts_rows (
+                                  fts_rowid INTEGER PRIMARY KEY,
+                                  bible_pk INTEGER NOT NULL,
+                                  chapter_num INTEGER NOT NULL,
+                                  paragraph_num INTEGER NOT NULL,
+                                  UNIQUE (bible_pk, chapter_num, paragraph_num)
+                                  ); """,
+            # 말씀 전문 검색 테이블: 한국어는 띄어쓰기 단위로 끊으면 조사 때문에 찾지 못하므로 trigram으로 색인한다
+            'bible_fts': """ CREATE VIRTUAL TABLE IF NOT EXISTS bible_fts USING fts5(
+                             texts,
+                             bible_pk UNINDEXED,
+                             chapter_num UNINDEXED,
+                             paragraph_num UNINDEXED,
+                             tokenize = 'trigram'
+                             ); """,
+            # bible_info가 바뀌면 전문 검색 테이블도 대응표의 rowid로 한 row씩 따라 바뀐다
+            'bible_fts_triggers': f"""
+                CREATE TRIGGER IF NOT EXISTS bible_info_fts_insert AFTER INSERT ON bible_info BEGIN
+                    INSERT INTO bible_fts_rows(bible_pk, chapter_num, paragraph_num)
+                    VALUES (new.bible_pk, new.chapter_num, new.paragraph_num);
+                    INSERT INTO bible_fts(rowid, texts, bible_pk, chapter_num, paragraph_num)
+                    VALUES ({FTS_ROWID.format(row='new')}, new.texts, new.bible_pk, new.chapter_num, new.paragraph_num);
+                END;
+                CREATE TRIGGER IF NOT EXISTS bible_info_fts_update AFTER UPDATE OF texts ON bible_info BEGIN
+                    UPDATE bible_fts SET texts = new.texts WHERE rowid = {FTS_ROWID.format(row='old')};
+                END;
+                CREATE TRIGGER IF NOT EXISTS bible_info_fts_delete AFTER DELETE ON bible_info BEGIN
+                    DELETE FROM bible_fts WHERE rowid = {FTS_ROWID.format(row='old')};
+                    DELETE FROM bible_fts_rows WHERE bible_pk = old.bible_pk
+                    AND chapter_num = old.chapter_num AND paragraph_num = old.paragraph_num;
+                END; """,
+            # 크롤링 작업 장부: 장마다 한 row, 시각은 모두 unix time(초)
+            # 다시 시도할 작업은 (status, next_attempt_at) 색인으로 찾는다
+            'crawl_jobs': f"""
+                CREATE TABLE IF NOT EXISTS crawl_jobs (
+                bible_pk INTEGER NOT NULL,
+                chapter_num INTEGER NOT NULL,
+                bible_num INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN {CRAWL_JOB_STATUSES}),
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (bible_pk, chapter_num)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS crawl_jobs_status ON crawl_jobs (status, next_attempt_at); """,
+            # 장마다 정규화한 본문의 sha256: 다시 크롤링한 장이 바뀌었는지 해시 비교 한 번으로 알아낸다
+            'chapter_hashes': """ CREATE TABLE IF NOT EXISTS chapter_hashes (
+                                  bible_pk INTEGER NOT NULL,
+                                  chapter_num INTEGER NOT NULL,
+                                  content_hash TEXT NOT NULL,
+                                  checked_at REAL NOT NULL,
+                                  changed_at REAL NOT NULL,
+                                  PRIMARY KEY (bible_pk, chapter_num)
+                                  ) WITHOUT ROWID; """,
+        }
+        # 검색 명령문: 값은 모두 ?로 바인딩하므로 명령문 문자열이 바뀌지 않고,
+        # sqlite3의 statement cache가 한 번 컴파일한 명령문을 다시 쓴다
+        self.__sql_commands = {
+            'bible_data_chapter_count': """ SELECT chapter_count FROM bible_data WHERE bible_pk = ?; """,
+            'bible_info_chapter': """ SELECT bible_data.name, chapter_num, paragraph_num, texts
+                                      FROM bible_info
+                                      INNER JOIN bible_data ON bible_data.bible_pk = bible_info.bible_pk
+                                      WHERE bible_info.bible_pk = ? AND chapter_num = ?; """,
+            'bible_data_all': """ SELECT bible_pk, name, chapter_count FROM bible_data ORDER BY bible_pk; """,
+            'bible_info_all': """ SELECT bible_pk, chapter_num, paragraph_num, texts FROM bible_info
+                                  ORDER BY bible_pk, chapter_num, paragraph_num; """,
+            'chapter_verse_counts': """ SELECT bible_pk, chapter_num, COUNT(*) FROM bible_info
+                                        GROUP BY bible_pk, chapter_num; """,
+            'stored_books': """ SELECT bible_pk FROM bible_data; """,
+            'stored_chapters': """ SELECT DISTINCT bible_pk, chapter_num FROM bible_info; """,
+            'search_table_exists': """ SELECT name FROM sqlite_master
+                                      WHERE type='table' AND name='bible_fts_rows'; """,
+            'crawl_jobs_table_exists': """ SELECT name FROM sqlite_master
+                                          WHERE type='table' AND name='crawl_jobs'; """,
+            'bible_info_upsert': """ INSERT INTO bible_info(bible_pk, chapter_num, paragraph_num, texts) VALUES(?,?,?,?)
+                                    ON CONFLICT(bible_pk, chapter_num, paragraph_num)
+                                    DO UPDATE SET texts = excluded.texts; """,
+            'chapter_hashes_table_exists': """ SELECT name FROM sqlite_master
+                                              WHERE type='table' AND name='chapter_hashes'; """,
+            'chapter_hashes_all': """ SELECT bible_pk, chapter_num, content_hash FROM chapter_hashes; """,
+            'chapter_hashes_upsert': """ INSERT INTO chapter_hashes(bible_pk, chapter_num, content_hash,
+                                                                    checked_at, changed_at)
+                                        VALUES(?,?,?,?,?)
+                                        ON CONFLICT(bible_pk, chapter_num) DO UPDATE SET
+                                        changed_at = CASE WHEN content_hash = excluded.content_hash
+                                                     THEN changed_at ELSE excluded.changed_at END,
+                                        content_hash = excluded.content_hash,
+                                        checked_at = excluded.checked_at; """,
+            'bible_info_delete_chapter': """ DELETE FROM bible_info WHERE bible_pk = ? AND chapter_num = ?; """,
+            'crawl_jobs_enqueue': """ INSERT OR IGNORE INTO crawl_jobs(bible_num, bible_pk, chapter_num,
+                                                                      created_at, updated_at)
+                                     VALUES(?,?,?,?,?); """,
+            'crawl_jobs_requeue_missing': """ UPDATE crawl_jobs SET status = 'pending', attempts = 0,
+                                             next_attempt_at = 0, updated_at = ?
+                                             WHERE bible_pk = ? AND chapter_num = ? AND status = 'done'
+                                             AND NOT EXISTS (SELECT 1 FROM bible_info
+                                                             WHERE bible_info.bible_pk = crawl_jobs.bible_pk
+                                                             AND bible_info.chapter_num = crawl_jobs.chapter_num); """,
+            'crawl_jobs_runnable': """ SELECT bible_num, bible_pk, chapter_num FROM crawl_jobs
+                                      WHERE status = 'pending'
+                                      OR (status = 'running' AND attempts < ?)
+                                      OR (status = 'failed' AND attempts < ? AND next_attempt_at <= ?)
+                                      ORDER BY bible_pk, chapter_num; """,
+            'crawl_jobs_next_retry': """ SELECT MIN(next_attempt_at) FROM crawl_jobs
+                                        WHERE status = 'failed' AND attempts < ?; """,
+            'crawl_jobs_failed': """ SELECT bible_num, bible_pk, chapter_num FROM crawl_jobs
+                                    WHERE status = 'failed' ORDER BY bible_pk, chapter_num; """,
+            'crawl_jobs_counts': """ SELECT status, COUNT(*) FROM crawl_jobs GROUP BY status; """,
+            'crawl_jobs_attempts': """ SELECT attempts FROM crawl_jobs WHERE bible_pk = ? AND chapter_num = ?; """,
+            'crawl_jobs_running': """ UPDATE crawl_jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+                                     WHERE bible_pk = ? AND chapter_num = ?; """,
+            'crawl_jobs_done': """ UPDATE crawl_jobs SET status = 'done', last_error = NULL, updated_at = ?
+                                  WHERE bible_pk = ? AND chapter_num = ?; """,
+            'crawl_jobs_failure': """ UPDATE crawl_jobs SET status = 'failed', last_error = ?, next_attempt_at = ?,
+                                     updated_at = ?
+                                     WHERE bible_pk = ? AND chapter_num = ?; """,
+            'crawl_jobs_exhaust_running': """ UPDATE crawl_jobs SET status = 'failed', updated_at = ?,
+                                             last_error = COALESCE(last_error, 'interrupted')
+                                             WHERE status = 'running' AND attempts >= ?; """,
+            'crawl_jobs_reset_failed': """ UPDATE crawl_jobs SET status = 'pending', attempts = 0, next_attempt_at = 0,
+                                          updated_at = ?
+                                          WHERE status = 'failed'; """,
+            'search_verses_fts': """ SELECT bible_data.name, bible_fts.chapter_num, bible_fts.paragraph_num,
+                                           bible_fts.texts, bible_fts.bible_pk
+                                    FROM bible_fts
+                                    LEFT JOIN bible_data ON bible_data.bible_pk = bible_fts.bible_pk
+                                    WHERE bible_fts MATCH ? ORDER BY rank LIMIT ?; """,
+            'search_verses_like': """ SELECT bible_data.name, chapter_num, paragraph_num, texts, bible_info.bible_pk
+                                     FROM bible_info
+                                     LEFT JOIN bible_data ON bible_data.bible_pk = bible_info.bible_pk
+                                     WHERE texts LIKE ? ESCAPE '\\'
+                                     ORDER BY bible_info.bible_pk, chapter_num, paragraph_num LIMIT ?; """,
         }
 
     # --- 네임 맹글링 --- #
@@ -44,10 +203,22 @@ class DB:
     def conn(self, input_connection):
         self.__conn = input_connection
 
+    @property
+    def statement_cache_size(self):
+        return self.__statement_cache_size
+
+    @statement_cache_size.setter
+    def statement_cache_size(self, input_size):
+        self.__statement_cache_size = input_size
+
     @property
     def create_table_commands(self):
         return self.__create_table_commands
 
+    @property
+    def sql_commands(self):
+        return self.__sql_commands
+
     # --- db 및 테이블 생성 함수 ---#
 
     def create_db_connection(self):
@@ -55,9 +226,19 @@ class DB:
         database 생성 및 연결 함수
         :return: sqlite3.Connection 객체
         """
-        self.conn = sqlite3.connect(self.db_name)
+        self.conn = sqlite3.connect(self.db_name, cached_statements=self.statement_cache_size)
         return self.conn
 
+    def query_from_db(self, command_name, parameters=()):
+        """
+        sql_commands에 등록된 명령문에 값을 바인딩해 실행하는 함수
+        :param command_name: sql_commands의 키
+        :param parameters: 명령문의 ?에 바인딩할 값들
+        :return: sqlite3.Cursor 객체
+        """
+        conn = self.conn if self.conn else self.create_db_connection()
+        return conn.execute(self.sql_commands[command_name], parameters)
+
     def search_data_table(self):
         """
         db에 테이블이 존재하는지 테스트
@@ -72,8 +253,13 @@ class DB:
         result = cursor.execute(""" SELECT name FROM sqlite_master WHERE type='table'; """)
         table_list = [table for table in result]
 
-        # 삼항자 연산: 테이블이 있을 경우가 더 많을 테니 None을 우선함
-        return None if len(table_list) is not 0 else self.create_data_table()
+        # 테이블이 없다면 새로 만든다
+        if len(table_list) == 0:
+            return self.create_data_table()
+
+        # 테이블이 예전 스키마라면 새 스키마로 옮긴다
+        schema_version = cursor.execute(""" PRAGMA user_version; """).fetchone()[0]
+        return None if schema_version >= SCHEMA_VERSION else self.migrate_data_table()
 
     def create_data_table(self):
         """
@@ -89,12 +275,124 @@ class DB:
         print('DB table을 생성합니다...')
         cursor.execute(self.create_table_commands['bible_data'])
         cursor.execute(self.create_table_commands['bible_info'])
+        cursor.execute(f""" PRAGMA user_version = {SCHEMA_VERSION}; """)
         print('DB table 생성 완료')
 
         # commit
         conn.commit()
         return None
 
+    def migrate_data_table(self):
+        """
+        예전 스키마(name으로 연결되고 중복 row가 쌓이던 테이블)를 새 스키마로 옮기는 함수
+        중복된 bible_data와 bible_info row는 처음 들어간 것 하나만 남긴다
+        bible_data에 없는 성경책 이름의 bible_info row는 성경책 pk를 알 수 없어 옮기지 않고 그 수를 알린다
+        :return: None, 실패하면 sqlite3.Error
+        """
+        # sqlite3 connection 객체 생성
+        conn = self.conn if self.conn else self.create_db_connection()
+        # cursor 객체 가져오기
+        cursor = conn.cursor()
+
+        # 테이블 이전: 전체를 트랜잭션 하나로 묶어 중간에 실패하면 예전 테이블이 그대로 남는다
+        print('DB table을 새 스키마로 옮깁니다...')
+        try:
+            dropped = cursor.execute(""" SELECT COUNT(*) FROM bible_info
+                                        WHERE name NOT IN (SELECT name FROM bible_data); """).fetchone()[0]
+            cursor.executescript(f""" BEGIN;
+                ALTER TABLE bible_data RENAME TO bible_data_old;
+                ALTER TABLE bible_info RENAME TO bible_info_old;
+                {self.create_table_commands['bible_data']}
+                {self.create_table_commands['bible_info']}
+                INSERT OR IGNORE INTO bible_data(bible_pk, name, chapter_count)
+                    SELECT bible_pk, name, chapter_count FROM bible_data_old ORDER BY id;
+                INSERT OR IGNORE INTO bible_info(bible_pk, chapter_num, paragraph_num, texts)
+                    SELECT bible_data.bible_pk, chapter_num, paragraph_num, texts
+                    FROM bible_info_old
+                    INNER JOIN bible_data ON bible_data.name = bible_info_old.name
+                    ORDER BY bible_info_old.id;
+                DROP TABLE bible_info_old;
+                DROP TABLE bible_data_old;
+                PRAGMA user_version = {SCHEMA_VERSION};
+                COMMIT; """)
+
+        # 예외처리: 이전에 실패했을 경우 예전 테이블을 그대로 둔다
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+        if dropped:
+            print(f'성경책 이름을 bible_data에서 찾을 수 없는 bible_info {dropped}개는 옮기지 않았습니다')
+        print('DB table 이전 완료')
+        return None
+
+    def create_search_table(self):
+        """
+        말씀 전문 검색 테이블과 동기화 트리거를 만들고 이미 저장된 말씀을 색인한다
+        처음 검색할 때 한 번만 만들어지고, rowid를 계산하던 예전 색인이 있다면 지우고 다시 만든다
+        :return: None, 실패하면 sqlite3.Error
+        """
+        # sqlite3 connection 객체 생성
+        conn = self.conn if self.conn else self.create_db_connection()
+        # cursor 객체 가져오기
+        cursor = conn.cursor()
+
+        # 테이블 생성과 색인을 트랜잭션 하나로 묶어 중간에 실패하면 아무것도 남지 않는다
+        print('말씀 검색 색인을 만듭니다...')
+        try:
+            cursor.executescript(f""" BEGIN;
+                DROP TRIGGER IF EXISTS bible_info_fts_insert;
+                DROP TRIGGER IF EXISTS bible_info_fts_update;
+                DROP TRIGGER IF EXISTS bible_info_fts_delete;
+                DROP TABLE IF EXISTS bible_fts;
+                DROP TABLE IF EXISTS bible_fts_rows;
+                {self.create_table_commands['bible_fts_rows']}
+                {self.create_table_commands['bible_fts']}
+                {self.create_table_commands['bible_fts_triggers']}
+                INSERT INTO bible_fts_rows(bible_pk, chapter_num, paragraph_num)
+                    SELECT bible_pk, chapter_num, paragraph_num FROM bible_info;
+                INSERT INTO bible_fts(rowid, texts, bible_pk, chapter_num, paragraph_num)
+                    SELECT bible_fts_rows.fts_rowid, texts, bible_pk, chapter_num, paragraph_num
+                    FROM bible_info JOIN bible_fts_rows USING (bible_pk, chapter_num, paragraph_num);
+                COMMIT; """)
+
+        # 예외처리: sqlite가 fts5를 지원하지 않는 등 색인을 만들지 못한 경우
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+        print('말씀 검색 색인 완료')
+        return None
+
+    def create_job_table(self):
+        """
+        크롤링 작업 장부 테이블이 없다면 만든다
+        bulk 크롤링을 처음 실행할 때 한 번만 만들어진다
+        :return: None
+        """
+        # sqlite3 connection 객체 생성
+        conn = self.conn if self.conn else self.create_db_connection()
+        if conn.execute(self.sql_commands['crawl_jobs_table_exists']).fetchone() is None:
+            conn.executescript(f""" BEGIN;
+                {self.create_table_commands['crawl_jobs']}
+                COMMIT; """)
+        return None
+
+    def create_hash_table(self):
+        """
+        장마다 본문 해시를 기록할 테이블이 없다면 만든다
+        처음 refresh할 때 한 번만 만들어진다
+        :return: None
+        """
+        # sqlite3 connection 객체 생성
+        conn = self.conn if self.conn else self.create_db_connection()
+        if conn.execute(self.sql_commands['chapter_hashes_table_exists']).fetchone() is None:
+            conn.execute(self.create_table_commands['chapter_hashes'])
+            conn.commit()
+        return None
+
     # --- 데이터 삽입 함수 --- #
 
     def insert_bible_data_into_db(self, bible_data):
@@ -104,18 +402,20 @@ class DB:
         :return: None
         """
         # sql 명령문: bible_data 테이블에 해당하는 값을 넣어라
-        sql_command = """ INSERT INTO bible_data(bible_pk, name, chapter_count) VALUES(?,?,?) """
+        # 이미 있는 성경책이라면 새 row를 만들지 않고 값을 갱신한다
+        sql_command = """ INSERT INTO bible_data(bible_pk, name, chapter_count) VALUES(?,?,?)
+                          ON CONFLICT(bible_pk) DO UPDATE SET name = excluded.name,
+                                                              chapter_count = excluded.chapter_count """
         # db에 넣을 값: bible_data에서 db에 넣을 수 있는 튜플 형태로 재변환
         data_comp = ((book, bible_data[book].books_name, bible_data[book].chapters_count) for book in bible_data)
 
-        # 커서를 꺼내 data_comp를 순회하며 db에 정보를 넣는다
+        # 커서를 꺼내 data_comp를 한 번에 db에 넣는다
         conn = self.conn if self.conn else self.create_db_connection()
         cursor = conn.cursor()
         try:
             print('\nbible_data를 DB에 추가합니다...\n')
-            for data in data_comp:
-                cursor.execute(sql_command, data)
-                print(f'bible_data({data[1]}) 추가 완료')
+            cursor.executemany(sql_command, data_comp)
+            print(f'bible_data {cursor.rowcount}개 추가 완료')
             # commit
             conn.commit()
             return None
@@ -131,17 +431,17 @@ class DB:
         :return: None
         """
         # sql 명령문: bible_info 테이블에 해당하는 값을 넣어라
-        sql_command = """ INSERT INTO bible_info(name, chapter_num, paragraph_num, texts) VALUES(?,?,?,?) """
+        # 이미 있는 절이라면 새 row를 만들지 않고 본문을 갱신한다
+        sql_command = self.sql_commands['bible_info_upsert']
         # db에 넣을 값: bible_info에서 db에 넣을 수 있는 튜플 형태로 재변환
-        info_comp = ((info.books_name, info.chapter_num, info.paragraph_num, info.texts) for info in bible_info)
+        info_comp = ((info.bible_pk, info.chapter_num, info.paragraph_num, info.texts) for info in bible_info)
 
-        # 커서를 꺼내 info_comp를 순회하며 db에 정보를 넣는다
+        # 커서를 꺼내 info_comp를 한 번에 db에 넣는다
         conn = self.conn if self.conn else self.create_db_connection()
         cursor = conn.cursor()
         try:
             print('bible_info를 DB에 추가합니다...\n')
-            for info in info_comp:
-                cursor.execute(sql_command, info)
+            cursor.executemany(sql_command, info_comp)
             print(f'bible_info 추가 완료\n\n')
             # commit
             conn.commit()
@@ -151,6 +451,239 @@ class DB:
             print(e)
             return e
 
+    def insert_bible_info_batch_into_db(self, bible_info_batch, quiet=False):
+        """
+        여러 장의 bible_info를 트랜잭션 하나로 db 안에 넣는 함수
+        :param bible_info_batch: 크롤러가 생성한 bible_info 리스트의 이터러블
+        :param quiet: True라면 결과를 출력하지 않고 리턴값으로만 알린다
+        :return: None
+        """
+        # sql 명령문: bible_info 테이블에 해당하는 값을 넣어라
+        # 이미 있는 절이라면 새 row를 만들지 않고 본문을 갱신한다
+        sql_command = self.sql_commands['bible_info_upsert']
+        # db에 넣을 값: 여러 장의 bible_info를 펼쳐 db에 넣을 수 있는 튜플 형태로 재변환
+        info_comp = ((info.bible_pk, info.chapter_num, info.paragraph_num, info.texts)
+                     for bible_info in bible_info_batch for info in bible_info)
+
+        # 커서를 꺼내 info_comp를 한 번에 db에 넣고, 한 번만 commit한다
+        conn = self.conn if self.conn else self.create_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(sql_command, info_comp)
+            conn.commit()
+            if not quiet:
+                print(f'bible_info {cursor.rowcount}개 추가 완료\n')
+            return None
+        # 예외처리: data_table이 없거나 삽입에 실패했을 경우 배치 전체를 되돌린다
+        except sqlite3.Error as e:
+            conn.rollback()
+            if not quiet:
+                print(e)
+            return e
+
+    # --- 크롤링 작업 장부 함수 --- #
+
+    def enqueue_crawl_jobs(self, jobs, now):
+        """
+        장부에 없는 작업만 pending으로 더한다: 이미 있는 작업의 상태와 시도 횟수는 그대로 둔다
+        단, done인데 bible_info에 그 장이 없는 작업은 pending으로 되돌린다
+        :param jobs: CrawlJob 네임드튜플의 이터러블
+        :param now: 지금 시각(unix time)
+        :return: 새로 더하거나 되돌린 작업의 수
+        """
+        self.create_job_table()
+        jobs = list(jobs)
+        conn = self.conn if self.conn else self.create_db_connection()
+        try:
+            enqueued = conn.executemany(self.sql_commands['crawl_jobs_enqueue'],
+                                        ((*job, now, now) for job in jobs)).rowcount
+            requeued = conn.executemany(self.sql_commands['crawl_jobs_requeue_missing'],
+                                        ((now, job.book_pk, job.chapter) for job in jobs)).rowcount
+            conn.commit()
+            return enqueued + requeued
+
+        # 예외처리: 삽입에 실패했을 경우
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+    def mark_crawl_jobs_running(self, jobs, now):
+        """
+        작업들을 running으로 바꾸고 시도 횟수를 하나씩 늘린다
+        :param jobs: CrawlJob 네임드튜플의 이터러블
+        :param now: 지금 시각(unix time)
+        :return: None
+        """
+        conn = self.conn if self.conn else self.create_db_connection()
+        try:
+            conn.executemany(self.sql_commands['crawl_jobs_running'],
+                             ((now, job.book_pk, job.chapter) for job in jobs))
+            conn.commit()
+            return None
+
+        # 예외처리: 장부 테이블이 없을 경우
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+    def checkpoint_crawl_jobs(self, bible_info_batch, jobs, now):
+        """
+        크롤링한 장들의 bible_info를 넣고 그 작업들을 done으로 바꾸는 일을 트랜잭션 하나로 묶는다
+        중간에 멈춰도 저장된 장과 done인 작업이 어긋나지 않는다
+        :param bible_info_batch: 크롤러가 생성한 bible_info 리스트의 이터러블
+        :param jobs: 저장한 장들의 CrawlJob 네임드튜플 리스트
+        :param now: 지금 시각(unix time)
+        :return: None
+        """
+        info_comp = ((info.bible_pk, info.chapter_num, info.paragraph_num, info.texts)
+                     for bible_info in bible_info_batch for info in bible_info)
+
+        conn = self.conn if self.conn else self.create_db_connection()
+        try:
+            conn.executemany(self.sql_commands['bible_info_upsert'], info_comp)
+            conn.executemany(self.sql_commands['crawl_jobs_done'], ((now, job.book_pk, job.chapter) for job in jobs))
+            conn.commit()
+            print(f'{len(jobs)}개 장 저장 완료\n')
+            return None
+
+        # 예외처리: 삽입에 실패했을 경우 bible_info와 장부를 함께 되돌린다
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+    def record_crawl_job_failure(self, job, error, next_attempt_at, now):
+        """
+        작업을 failed로 바꾸고 실패 이유와 다시 시도할 시각을 남긴다
+        :param job: CrawlJob 네임드튜플
+        :param error: 실패했을 때의 예외
+        :param next_attempt_at: 다시 시도해도 되는 시각(unix time)
+        :param now: 지금 시각(unix time)
+        :return: None
+        """
+        conn = self.conn if self.conn else self.create_db_connection()
+        try:
+            conn.execute(self.sql_commands['crawl_jobs_failure'],
+                         (repr(error), next_attempt_at, now, job.book_pk, job.chapter))
+            conn.commit()
+            return None
+
+        # 예외처리: 장부 테이블이 없을 경우
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+    def fail_exhausted_crawl_jobs(self, max_attempts, now):
+        """
+        마지막 시도 중에 멈춰 running으로 남은 작업을 failed로 바꾼다
+        :param max_attempts: 작업 하나를 시도할 최대 횟수
+        :param now: 지금 시각(unix time)
+        :return: 바꾼 작업의 수
+        """
+        conn = self.conn if self.conn else self.create_db_connection()
+        try:
+            cursor = conn.execute(self.sql_commands['crawl_jobs_exhaust_running'], (now, max_attempts))
+            conn.commit()
+            return cursor.rowcount
+
+        # 예외처리: 장부 테이블이 없을 경우
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+    def reset_failed_crawl_jobs(self, now):
+        """
+        실패한 작업을 모두 pending으로 되돌리고 시도 횟수를 0으로 만든다
+        :param now: 지금 시각(unix time)
+        :return: 되돌린 작업의 수
+        """
+        self.create_job_table()
+        conn = self.conn if self.conn else self.create_db_connection()
+        try:
+            cursor = conn.execute(self.sql_commands['crawl_jobs_reset_failed'], (now,))
+            conn.commit()
+            return cursor.rowcount
+
+        # 예외처리: 갱신에 실패했을 경우
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+    # --- 장 해시 함수 --- #
+
+    def record_chapter_hashes(self, chapter_hashes, now):
+        """
+        장마다 본문 해시와 확인한 시각을 기록한다
+        :param chapter_hashes: (bible_pk, chapter_num, 해시) 튜플의 이터러블
+        :param now: 지금 시각(unix time)
+        :return: None, 실패하면 sqlite3.Error
+        """
+        conn = self.conn if self.conn else self.create_db_connection()
+        try:
+            conn.executemany(self.sql_commands['chapter_hashes_upsert'],
+                             ((*chapter_hash, now, now) for chapter_hash in chapter_hashes))
+            conn.commit()
+            return None
+
+        # 예외처리: 해시 테이블이 없을 경우
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+    def replace_chapter_in_db(self, bible_info, content_hash, now):
+        """
+        장 하나의 bible_info를 새로 크롤링한 것으로 바꾸고 해시를 기록하는 일을 트랜잭션 하나로 묶는다
+        새 본문에서 사라진 절은 지운다
+        :param bible_info: 크롤러가 생성한 bible_info 리스트
+        :param content_hash: 새 본문의 해시
+        :param now: 지금 시각(unix time)
+        :return: None, 실패하면 sqlite3.Error
+        """
+        bible_pk, chapter_num = bible_info[0].bible_pk, bible_info[0].chapter_num
+        info_comp = ((info.bible_pk, info.chapter_num, info.paragraph_num, info.texts) for info in bible_info)
+
+        conn = self.conn if self.conn else self.create_db_connection()
+        try:
+            conn.execute(self.sql_commands['bible_info_delete_chapter'], (bible_pk, chapter_num))
+            conn.executemany(self.sql_commands['bible_info_upsert'], info_comp)
+            conn.execute(self.sql_commands['chapter_hashes_upsert'], (bible_pk, chapter_num, content_hash, now, now))
+            conn.commit()
+            return None
+
+        # 예외처리: 바꾸기에 실패했을 경우 예전 본문을 그대로 둔다
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(e)
+            return e
+
+    def set_bulk_load_mode(self, enabled=True):
+        """
+        대량으로 데이터를 넣을 때 쓰는 pragma를 켜거나 끈다
+        켜면 WAL 저널과 synchronous=NORMAL을, 끄면 켜기 전의 저널 모드와 synchronous 값을 되돌린다
+        :param enabled: 대량 적재 모드 사용 여부
+        :return: None
+        """
+        conn = self.conn if self.conn else self.create_db_connection()
+        cursor = conn.cursor()
+        if enabled:
+            if self.__saved_pragmas is None:
+                self.__saved_pragmas = (cursor.execute(""" PRAGMA journal_mode; """).fetchone()[0],
+                                        cursor.execute(""" PRAGMA synchronous; """).fetchone()[0])
+            cursor.execute(""" PRAGMA journal_mode=WAL; """)
+            cursor.execute(""" PRAGMA synchronous=NORMAL; """)
+        elif self.__saved_pragmas is not None:
+            journal_mode, synchronous = self.__saved_pragmas
+            cursor.execute(f""" PRAGMA journal_mode={journal_mode}; """)
+            cursor.execute(f""" PRAGMA synchronous={int(synchronous)}; """)
+            self.__saved_pragmas = None
+        return None
+
     # --- 데이터 검색 함수 --- #
 
     def search_bible_data_from_db(self, primary_key):
@@ -159,14 +692,9 @@ class DB:
         :return: data가 있으면: primary Key에 해당하는 성경책의 chapter_count, 없으면: None
         """
         # sql 명령문: bible_data 테이블에서 입력한 primary_key 값에 해당하는 chapter_count를 출력하라
-        sql_command = """ SELECT chapter_count FROM bible_data WHERE bible_pk=%d """ % primary_key
-
-        # 커서를 꺼내 db를 검색한다
-        conn = self.conn if self.conn else self.create_db_connection()
-        cursor = conn.cursor()
         try:
             print('\nbible_data를 검색합니다...\n')
-            data = cursor.execute(sql_command)
+            data = self.query_from_db('bible_data_chapter_count', (primary_key,))
             result_comp = [count for count in data][0][0]
 
             # 값이 검색되면 성공 메시지를 출력하고 chapter_count를 리턴한다
@@ -188,20 +716,11 @@ class DB:
         db에서 name과 chapter_num을 이용해 이에 해당하는 paragraph row를 검색한다
         :return: 있다면: 조건에 해당하는 말씀 row 리스트, 없다면: None
         """
-        # sql 명령문: bible_info 테이블과 bible_data 테이블 중 name이 일치하는 row를 검색하고
-        # 그 중에서 primary_key와 chapter_num이 일치하는 row를 고른다
-        sql_command = """ SELECT bible_info.name, chapter_num, paragraph_num, texts 
-                          FROM bible_info
-                          INNER JOIN bible_data ON bible_data.name = bible_info.name
-                          WHERE bible_pk = {0} AND chapter_num = {1}; 
-                          """.format(primary_key, chapter_num)
-
-        # 커서를 꺼내 db를 검색한다
-        conn = self.conn if self.conn else self.create_db_connection()
-        cursor = conn.cursor()
+        # sql 명령문: bible_info 테이블에서 primary_key와 chapter_num이 일치하는 row를 고르고
+        # bible_data 테이블에서 bible_pk가 일치하는 성경책 이름을 붙인다
         try:
             print('bible_info를 검색합니다...\n')
-            info = cursor.execute(sql_command)
+            info = self.query_from_db('bible_info_chapter', (primary_key, chapter_num))
             result_comp = [logos for logos in info]
 
             # 값이 검색되면 성공 메시지를 출력하고 row 리스트를 리턴한다
@@ -218,6 +737,151 @@ class DB:
             print(e)
             return e
 
+    def search_verses_from_db(self, query, limit=10):
+        """
+        말씀 본문에서 검색어를 찾는다
+        세 글자 이상이면 전문 검색 색인에서 관련도 순으로, 더 짧으면 LIKE로 성경 순서대로 찾는다
+        :param query: 검색어
+        :param limit: 최대 결과 수
+        :return: (성경책 이름, 장, 절, 본문, 성경책 pk) row 리스트
+        """
+        try:
+            if len(query.strip()) >= SEARCH_MIN_LENGTH:
+                if not self.query_from_db('search_table_exists').fetchall():
+                    error = self.create_search_table()
+                    if error:
+                        return error
+
+                # 검색어 전체를 하나의 구절로 찾도록 큰따옴표로 감싼다
+                phrase = '"' + query.strip().replace('"', '""') + '"'
+                return self.query_from_db('search_verses_fts', (phrase, limit)).fetchall()
+
+            # LIKE의 와일드카드 문자는 글자 그대로 찾는다
+            pattern = query.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            return self.query_from_db('search_verses_like', (f'%{pattern}%', limit)).fetchall()
+
+        # 예외처리: data_table이 없거나 sqlite가 fts5를 지원하지 않을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
+    def search_stored_books_from_db(self):
+        """
+        db에 bible_data가 저장된 성경책의 pk를 모두 검색한다
+        :return: 성경책 pk의 집합
+        """
+        # sql 명령문: bible_data 테이블에 저장된 bible_pk를 모두 출력하라
+        try:
+            data = self.query_from_db('stored_books')
+            return {book[0] for book in data}
+
+        # 예외처리: data_table이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
+    def search_stored_chapters_from_db(self):
+        """
+        db에 bible_info가 저장된 장을 모두 검색한다
+        :return: (bible_pk, chapter_num) 튜플의 집합
+        """
+        # sql 명령문: bible_info 테이블에서 중복 없이 bible_pk와 chapter_num을 출력하라
+        try:
+            info = self.query_from_db('stored_chapters')
+            return {(chapter[0], chapter[1]) for chapter in info}
+
+        # 예외처리: data_table이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
+    def search_chapter_hashes_from_db(self):
+        """
+        기록된 장마다의 본문 해시를 모두 검색한다
+        :return: (bible_pk, chapter_num): 해시 딕셔너리
+        """
+        try:
+            return {(bible_pk, chapter_num): content_hash
+                    for bible_pk, chapter_num, content_hash in self.query_from_db('chapter_hashes_all')}
+
+        # 예외처리: 해시 테이블이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
+    def search_runnable_crawl_jobs_from_db(self, max_attempts, now):
+        """
+        장부에서 지금 실행할 작업을 검색한다
+        pending과 멈추기 전에 running이던 작업, 시도 횟수가 남았고 다시 시도할 시각이 지난 failed 작업
+        :param max_attempts: 작업 하나를 시도할 최대 횟수
+        :param now: 지금 시각(unix time)
+        :return: (bible_num, bible_pk, chapter_num) 튜플 리스트
+        """
+        try:
+            return self.query_from_db('crawl_jobs_runnable', (max_attempts, max_attempts, now)).fetchall()
+
+        # 예외처리: 장부 테이블이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
+    def search_next_crawl_retry_from_db(self, max_attempts):
+        """
+        시도 횟수가 남은 failed 작업 가운데 가장 먼저 다시 시도할 시각을 검색한다
+        :param max_attempts: 작업 하나를 시도할 최대 횟수
+        :return: 있다면: 시각(unix time), 없다면: None
+        """
+        try:
+            return self.query_from_db('crawl_jobs_next_retry', (max_attempts,)).fetchone()[0]
+
+        # 예외처리: 장부 테이블이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
+    def search_crawl_job_attempts_from_db(self, job):
+        """
+        작업을 지금까지 몇 번 시도했는지 검색한다
+        :param job: CrawlJob 네임드튜플
+        :return: 시도 횟수, 장부에 없다면 0
+        """
+        try:
+            row = self.query_from_db('crawl_jobs_attempts', (job.book_pk, job.chapter)).fetchone()
+            return row[0] if row else 0
+
+        # 예외처리: 장부 테이블이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
+    def search_failed_crawl_jobs_from_db(self):
+        """
+        장부에서 failed인 작업을 모두 검색한다
+        :return: (bible_num, bible_pk, chapter_num) 튜플 리스트
+        """
+        try:
+            return self.query_from_db('crawl_jobs_failed').fetchall()
+
+        # 예외처리: 장부 테이블이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
+    def search_crawl_job_counts_from_db(self):
+        """
+        장부의 상태마다 작업 수를 검색한다
+        :return: 상태: 작업 수 딕셔너리, 작업이 없는 상태는 0
+        """
+        try:
+            counts = dict.fromkeys(CRAWL_JOB_STATUSES, 0)
+            counts.update(self.query_from_db('crawl_jobs_counts'))
+            return counts
+
+        # 예외처리: 장부 테이블이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+            return e
+
 
 if __name__ == '__main__':
     pass
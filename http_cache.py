@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+
+
+class ResponseCache:
+    """
+    URL과 payload를 키로 응답을 디스크에 저장하고, TTL이 지나면 ETag/Last-Modified로 재검증하는 캐시
+    """
+
+    def __init__(self, directory='.http_cache', ttl=24 * 60 * 60, max_bytes=64 * 1024 * 1024):
+        """
+        인스턴스 속성 정의
+        :param directory: 응답을 저장할 디렉터리
+        :param ttl: 저장한 응답을 재검증 없이 쓸 시간(초)
+        :param max_bytes: 저장한 응답 본문의 최대 크기 합, 넘으면 가장 오래 쓰지 않은 응답부터 지운다
+        """
+        self.__directory = directory
+        self.__ttl = ttl
+        self.__max_bytes = max_bytes
+        self.__total_bytes = None  # 본문 크기의 합, 처음 저장할 때 디렉터리를 한 번 훑어 구한다
+        self.__lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    @property
+    def ttl(self):
+        return self.__ttl
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
+
+    # --- 캐시 파일 함수 --- #
+
+    def make_key(self, url, params=None):
+        """
+        URL과 payload로 캐시 키를 만든다
+        :return: sha256 16진수 문자열
+        """
+        query = urlencode(sorted((params if params else {}).items()))
+        return hashlib.sha256(f'{url}?{query}'.encode('utf-8')).hexdigest()
+
+    def paths_from_key(self, key):
+        """
+        캐시 키에 해당하는 본문 파일과 메타데이터 파일의 경로를 만든다
+        :return: (본문 경로, 메타데이터 경로) 튜플
+        """
+        base = os.path.join(self.directory, key)
+        return base + '.body', base + '.json'
+
+    def load(self, url, params=None):
+        """
+        저장한 응답을 꺼낸다
+        :return: 있다면: (메타데이터 딕셔너리, 본문 bytes) 튜플, 없다면: None
+        """
+        body_path, meta_path = self.paths_from_key(self.make_key(url, params))
+        try:
+            with open(meta_path, encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, 'rb') as body_file:
+                body = body_file.read()
+            return meta, body
+
+        # 예외처리: 저장한 응답이 없거나 다른 스레드가 지우는 중인 경우
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url, params, response):
+        """
+        응답 본문과 재검증에 필요한 헤더를 저장하고, 크기가 넘치면 오래된 응답을 지운다
+        저장할 때마다 디렉터리를 훑지 않도록 본문 크기의 합은 따로 세어 두고, 넘쳤을 때만 evict를 부른다
+        :param response: requests.Response 객체
+        :return: None
+        """
+        body_path, meta_path = self.paths_from_key(self.make_key(url, params))
+        try:
+            old_size = os.path.getsize(body_path)
+        except OSError:
+            old_size = 0
+        meta = {
+            'url': url,
+            'params': params,
+            'status_code': response.status_code,
+            'encoding': response.encoding,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'stored_at': time.time(),
+        }
+
+        # 다른 스레드가 반쯤 쓴 파일을 읽지 않도록 임시 파일에 쓰고 바꿔치기한다
+        self.write_atomic(body_path, response.content)
+        self.write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+        if self.add_bytes(len(response.content) - old_size) > self.max_bytes:
+            self.evict()
+        return None
+
+    def add_bytes(self, size):
+        """
+        본문 크기의 합에 size를 더한다: 아직 모른다면 방금 쓴 본문까지 포함해 디렉터리를 훑어 구한다
+        다른 프로세스가 같은 디렉터리를 쓰면 합이 어긋날 수 있지만, evict가 실제 크기로 다시 맞춘다
+        :param size: 새로 쓴 본문 크기에서 덮어쓴 본문 크기를 뺀 값
+        :return: 본문 크기의 합
+        """
+        with self.__lock:
+            if self.__total_bytes is None:
+                self.__total_bytes = sum(size for _, size, _ in self.body_entries())
+            else:
+                self.__total_bytes += size
+            return self.__total_bytes
+
+    def revalidated(self, url, params, meta):
+        """
+        304 응답으로 재검증된 응답의 저장 시각을 갱신한다
+        :return: None
+        """
+        _, meta_path = self.paths_from_key(self.make_key(url, params))
+        meta['stored_at'] = time.time()
+        self.write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        return None
+
+    def write_atomic(self, path, data):
+        """
+        파일을 임시 파일에 쓴 뒤 한 번에 바꿔치기한다
+        :return: None
+        """
+        temp_path = f'{path}.{os.getpid()}.{id(data)}.tmp'
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+        return None
+
+    def touch(self, url, params=None):
+        """
+        본문 파일의 수정 시각을 지금으로 바꿔 가장 최근에 쓴 응답으로 만든다 (LRU)
+        :return: None
+        """
+        body_path, _ = self.paths_from_key(self.make_key(url, params))
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        return None
+
+    def body_entries(self):
+        """
+        디렉터리에 저장된 본문 파일들을 훑는다
+        :return: (수정 시각, 크기, 캐시 키) 튜플 리스트
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.body'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-len('.body')]))
+        return entries
+
+    def evict(self):
+        """
+        본문 크기의 합이 max_bytes를 넘으면 가장 오래 쓰지 않은 응답부터 지운다
+        지운 뒤에 남은 실제 크기의 합으로 따로 세어 둔 합을 맞춘다
+        :return: 지운 응답의 수
+        """
+        entries = self.body_entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        evicted_count = 0
+        for _, size, key in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            for path in self.paths_from_key(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total_bytes -= size
+            evicted_count += 1
+
+        with self.__lock:
+            self.__total_bytes = total_bytes
+        return evicted_count
+
+    # --- 응답 함수 --- #
+
+    def is_fresh(self, meta):
+        """
+        저장한 응답이 TTL 안에 있는지 확인한다
+        :return: TTL 안이라면 True
+        """
+        return time.time() - meta['stored_at'] < self.ttl
+
+    def conditional_headers(self, meta):
+        """
+        저장한 응답의 ETag와 Last-Modified로 조건부 요청 헤더를 만든다
+        :return: 헤더 딕셔너리
+        """
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def response_from_cache(self, meta, body):
+        """
+        저장한 응답으로 requests.Response 객체를 만든다
+        :return: requests.Response 객체
+        """
+        response = requests.Response()
+        response.status_code = meta['status_code']
+        response.encoding = meta['encoding']
+        response.url = meta['url']
+        response._content = body
+        if meta.get('etag'):
+            response.headers['ETag'] = meta['etag']
+        if meta.get('last_modified'):
+            response.headers['Last-Modified'] = meta['last_modified']
+        return response
+
+    def fetch(self, session, url, params=None, revalidate=False, **kwargs):
+        """
+        TTL 안의 응답은 디스크에서 돌려주고, 지났다면 조건부 요청으로 재검증한다
+        :param session: get 메서드로 요청을 보낼 세션
+        :param revalidate: True라면 TTL 안이라도 재검증한다
+        :param kwargs: session.get에 넘길 나머지 인자
+        :return: requests.Response 객체
+        """
+        cached = self.load(url, params)
+        if cached and not revalidate and self.is_fresh(cached[0]):
+            self.touch(url, params)
+            return self.response_from_cache(*cached)
+
+        headers = self.conditional_headers(cached[0]) if cached else {}
+        response = session.get(url, params=params, headers=headers, **kwargs)
+
+        # 바뀌지 않았다면 저장한 응답을 그대로 쓴다
+        if response.status_code == 304 and cached:
+            self.revalidated(url, params, cached[0])
+            self.touch(url, params)
+            return self.response_from_cache(*cached)
+
+        if response.status_code == 200:
+            self.store(url, params, response)
+        return response
+
+
+if __name__ == '__main__':
+    pass
@@ -1,9 +1,26 @@
+import argparse
+import asyncio
+import json
+import math
 import random
+import sys
+import time
+from contextlib import redirect_stdout
 
 from colorama import Fore, Style
 
-from crawler import BibleCrawler
+from background import WARM_AHEAD_PRIORITY, BackgroundFetcher
+from catalog import SNAPSHOT_PATH, BookCatalog
+from crawl_engine import ConcurrentCrawler, CrawlJob, LedgerRunner
+from corpus import export_corpus
+from crawler import PARSERS, BibleCrawler, BibleInfo
 from database import DB
+from http_cache import ResponseCache
+from refresh import ChapterRefresher
+from transport import RecordTransport, ReplayTransport
+from sampling import SAMPLING_STRATEGIES, VerseSampler
+from service import VerseService
+from verse_index import REDRAW_LIMIT, VerseIndex
 
 
 class Main(DB, BibleCrawler):
@@ -11,42 +28,159 @@ class Main(DB, BibleCrawler):
     실행을 위한 메인 클래스
     """
 
+    def __init__(self):
+        """
+        DB와 BibleCrawler의 인스턴스 속성을 모두 정의한다
+        """
+        DB.__init__(self)
+        BibleCrawler.__init__(self)
+        self.__catalog = None
+        self.__verse_index = None
+        self.__sampling = 'legacy'
+        self.__book_weights = {}
+        self.__sampler = None
+        self.__background_fetcher = None
+        self.__stale_while_revalidate = False
+        self.__warm_ahead_count = 0
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def catalog(self):
+        return self.__catalog
+
+    @catalog.setter
+    def catalog(self, input_catalog):
+        self.__catalog = input_catalog
+
+    @property
+    def verse_index(self):
+        return self.__verse_index
+
+    @verse_index.setter
+    def verse_index(self, input_index):
+        self.__verse_index = input_index
+
+    @property
+    def sampling(self):
+        return self.__sampling
+
+    @sampling.setter
+    def sampling(self, input_sampling):
+        self.__sampling = input_sampling
+        self.__sampler = None
+
+    @property
+    def book_weights(self):
+        return self.__book_weights
+
+    @book_weights.setter
+    def book_weights(self, input_weights):
+        self.__book_weights = input_weights
+        self.__sampler = None
+
+    @property
+    def sampler(self):
+        return self.__sampler
+
+    @sampler.setter
+    def sampler(self, input_sampler):
+        self.__sampler = input_sampler
+
+    @property
+    def background_fetcher(self):
+        return self.__background_fetcher
+
+    @background_fetcher.setter
+    def background_fetcher(self, input_fetcher):
+        self.__background_fetcher = input_fetcher
+
+    @property
+    def stale_while_revalidate(self):
+        return self.__stale_while_revalidate
+
+    @stale_while_revalidate.setter
+    def stale_while_revalidate(self, input_flag):
+        self.__stale_while_revalidate = input_flag
+
+    @property
+    def warm_ahead_count(self):
+        return self.__warm_ahead_count
+
+    @warm_ahead_count.setter
+    def warm_ahead_count(self, input_count):
+        self.__warm_ahead_count = input_count
+
     # --- 크롤러 실행 함수 --- #
 
+    def load_catalog(self):
+        """
+        성경책 목록을 db에서 한 번 읽고, 없는 성경책이 있다면 두 목록 페이지를 한 번씩만 크롤링해 채운다
+        :return: BookCatalog 객체
+        """
+        self.catalog = BookCatalog().load(self, self)
+        return self.catalog
+
+    def catalog_command(self, action, path=SNAPSHOT_PATH):
+        """
+        목록 페이지를 크롤링해 성경책 목록 스냅숏을 다시 만들거나, 스냅숏이 사이트와 같은지 확인한다
+        :param action: 'build' 또는 'verify'
+        :param path: 스냅숏 파일 경로
+        :return: build: 저장한 성경책 수, verify: 다른 곳을 설명하는 문자열 리스트
+        """
+        crawled = BookCatalog().crawl(self)
+
+        if action == 'build':
+            books_count = crawled.save_snapshot(path)
+            print(f'성경책 {books_count}권을 {path}에 저장했습니다')
+            return books_count
+
+        differences = BookCatalog().load_snapshot(path).differences(crawled)
+        for message in differences:
+            print(message)
+        if not differences:
+            print(f'{path}가 목록 페이지와 같습니다')
+        return differences
+
+    def load_sampler(self):
+        """
+        sampling 방식에 맞는 샘플러를 만들고 성경책 목록의 장 수와 db의 절 수로 가중치를 채운다
+        :return: VerseSampler 객체
+        """
+        catalog = self.catalog if self.catalog else self.load_catalog()
+        self.sampler = VerseSampler(self.sampling, self.book_weights).load_from_catalog(catalog)
+        self.sampler.load_verse_counts_from_db(self)
+        return self.sampler
+
     def make_random_number(self):
         """
         성경 숫자를 랜덤으로 만들어낼 함수
         :return: 랜덤 chapter_num
         """
-        # 구약성경: 1, 신약성경: 2
-        self.bible_num = random.randint(1, 2)
-        # 성경책 pk: 구약성경일 경우 101~146 사이, 신약성경일 경우 147~173 사이
-        self.primary_key = random.randint(101, 146) if self.bible_num is 1 else random.randint(147, 173)
-
-        # db를 검색하여 만일 db에 값이 있다면 db의 chapter_count로 chapter_num을 계산한다
-        db_chapters_count = self.search_bible_data_from_db(self.primary_key)
+        # legacy가 아닌 방식은 샘플러의 누적 가중치 테이블에서 장을 뽑는다
+        if self.sampling != 'legacy':
+            sampler = self.sampler if self.sampler else self.load_sampler()
+            self.primary_key, self.chapter_num = sampler.draw()
+            self.bible_num = sampler.bible_num_of(self.primary_key)
+            return self.chapter_num
 
-        if db_chapters_count:
-            self.chapter_num = random.randint(1, db_chapters_count)
-
-        # 없다면 크롤링 데이터로 chapter_num을 계산한다
-        else:
-            # payload를 False로 세팅한다
-            self.commit = False
-            # 장 넘버: 성경책 pk를 통해 알게 된 성경책이 총 몇 개의 장을 가지고 있는지 알아내고,
-            # 그 숫자를 범위로 하는 랜덤 숫자를 가져온다
-            crawler_chapters_count = self.make_bible_data()[self.primary_key].chapters_count
-            self.chapter_num = random.randint(1, int(crawler_chapters_count))
+        # 성경책과 장 수는 프로세스에서 한 번만 읽어 둔 성경책 목록에서 찾는다
+        catalog = self.catalog if self.catalog else self.load_catalog()
 
-            # bible_data를 db에 저장한다
-            self.insert_bible_data_into_db(self.bible_data)
+        # 구약성경: 1, 신약성경: 2
+        self.bible_num = random.randint(1, 2)
+        # 성경책 pk: 고른 성경에 속한 성경책 가운데 하나
+        books = catalog.pks(self.bible_num)
+        self.primary_key = books[random.randint(0, len(books) - 1)]
 
+        # 장 넘버: 성경책의 장 수를 범위로 하는 랜덤 숫자를 가져온다
+        self.chapter_num = random.randint(1, catalog.chapters_count(self.primary_key))
         return self.chapter_num
 
-    def get_message(self):
+    def bible_info_for_chapter(self):
         """
-        크롤러에서 랜덤으로 말씀을 가져온다
-        :return: 말씀 객체
+        primary_key와 chapter_num에 해당하는 장의 말씀을 db에서 찾고, 없다면 크롤링해서 db에 넣는다
+        :return: 본문 정보 네임드튜플로 구성된 리스트
         """
         # db에서 검색을 시도한다
         db_bible_info = self.search_bible_info_from_db(
@@ -54,36 +188,393 @@ class Main(DB, BibleCrawler):
             self.chapter_num
         )
         if db_bible_info is not None:
-            result = random.choice(db_bible_info)
-            name, chapter_num, paragraph_num, texts = result
-            print(Fore.BLUE + f'\n\n{texts} ({name} {chapter_num}-{paragraph_num})\n\n')
-            print(Style.RESET_ALL)
-            return result
+            return [BibleInfo(*row, bible_pk=self.primary_key) for row in db_bible_info]
 
-        else:
-            # payload의 옵션을 바꾸기 위해 commit=True로 맞춘다
-            self.commit = True
-            # 크롤링 데이터에서 성경 구절을 가져온다
-            crawler_bible_info = self.make_bible_info(self.conn)
-            result = random.choice(crawler_bible_info)
-            print(Fore.BLUE + f'\n\n{result.texts} ({result.books_name} {result.chapter_num}-{result.paragraph_num})'
-                              f'\n\n')
-            print(Style.RESET_ALL)
-
-            # 크롤링 데이터를 db에 넣는다
-            self.insert_bible_info_into_db(crawler_bible_info)
-            return result
+        # 성경책 이름은 목록에서 찾고, 크롤링 데이터에서 성경 구절을 가져온다
+        catalog = self.catalog if self.catalog else self.load_catalog()
+        crawler_bible_info = self.fetch_bible_info(
+            catalog.bible_num_of(self.primary_key),
+            self.primary_key,
+            self.chapter_num,
+            catalog.name(self.primary_key),
+        )
+
+        # 크롤링 데이터를 db에 넣는다
+        self.insert_bible_info_into_db(crawler_bible_info)
+        return crawler_bible_info
+
+    def load_verse_index(self):
+        """
+        db의 말씀을 한 번 읽어 메모리 색인을 만든다
+        :return: VerseIndex 객체
+        """
+        self.verse_index = VerseIndex().load_from_db(self)
+        return self.verse_index
+
+    def start_background_fetcher(self, max_pending=8, rate=4):
+        """
+        색인에 없는 장을 백그라운드에서 가져오는 크롤러를 띄운다
+        :param max_pending: 대기열에 쌓아 둘 수 있는 최대 장의 수
+        :param rate: 사이트에 보낼 초당 최대 요청 수
+        :return: BackgroundFetcher 객체
+        """
+        self.background_fetcher = BackgroundFetcher(self, self.db_name, max_pending=max_pending, rate=rate).start()
+        return self.background_fetcher
+
+    def stop_background_fetcher(self):
+        """
+        처리 중인 장을 저장한 뒤 백그라운드 크롤러를 멈추고, 가져온 장을 색인에 더한다
+        :return: None
+        """
+        if self.background_fetcher:
+            self.background_fetcher.stop()
+            self.absorb_background_results()
+            self.background_fetcher = None
+        return None
+
+    def absorb_background_results(self):
+        """
+        백그라운드에서 가져온 장을 색인과 샘플러의 가중치에 더한다
+        :return: 색인에 더한 장의 수
+        """
+        verse_index = self.verse_index if self.verse_index else self.load_verse_index()
+
+        absorbed_count = 0
+        for result in self.background_fetcher.results():
+            job = result.job
+            if result.error or not result.bible_info or verse_index.has_chapter(job.book_pk, job.chapter):
+                continue
+            verse_index.add_chapter(result.bible_info)
+            if self.sampler:
+                self.sampler.add_chapter(job.book_pk, job.chapter, len(result.bible_info))
+            absorbed_count += 1
+        return absorbed_count
+
+    def wait_for_background_fetch(self):
+        """
+        primary_key와 chapter_num에 해당하는 장을 백그라운드 크롤러가 가져오는 중이라면 끝날 때까지 기다렸다가 색인에 더한다
+        :return: 기다렸다면 True, 가져오는 중인 장이 아니라면 False
+        """
+        catalog = self.catalog if self.catalog else self.load_catalog()
+        job = CrawlJob(catalog.bible_num_of(self.primary_key), self.primary_key, self.chapter_num)
+        if job not in self.background_fetcher.pending:
+            return False
+
+        self.background_fetcher.wait(job)
+        self.absorb_background_results()
+        return True
+
+    def warm_ahead_chapters(self, count, exclude=()):
+        """
+        sampling 방식의 가중치로 다음에 뽑힐 가능성이 높은데 아직 색인에 없는 장을 고른다
+        :param count: 고를 장의 수
+        :param exclude: 색인에 없어도 건너뛸 (성경책 pk, 장)의 컬렉션 ex: 가져오는 중이거나 실패한 장
+        :return: (성경책 pk, 장) 튜플 리스트
+        """
+        verse_index = self.verse_index if self.verse_index else self.load_verse_index()
+        sampler = self.sampler if self.sampler else self.load_sampler()
+        return sampler.top_chapters(count, exclude=set(verse_index.chapters) | set(exclude))
+
+    def warm_ahead(self):
+        """
+        사용자가 프롬프트에서 쉬는 동안 가져오도록 다음에 뽑힐 것 같은 장을 백그라운드 대기열에 채운다
+        뽑힌 장이 들어갈 자리는 항상 하나 이상 남겨 둔다
+        :return: 대기열에 넣은 장의 수
+        """
+        if not self.background_fetcher or not self.warm_ahead_count:
+            return 0
+
+        fetcher = self.background_fetcher
+        pending = fetcher.pending
+        room = min(self.warm_ahead_count, fetcher.max_pending - 1) - len(pending)
+        if room <= 0:
+            return 0
+
+        catalog = self.catalog if self.catalog else self.load_catalog()
+        skipped = {(job.book_pk, job.chapter) for job in pending | fetcher.failed}
+        submitted_count = 0
+        for primary_key, chapter_num in self.warm_ahead_chapters(room, exclude=skipped):
+            job = CrawlJob(catalog.bible_num_of(primary_key), primary_key, chapter_num)
+            if fetcher.submit(job, catalog.name(primary_key), priority=WARM_AHEAD_PRIORITY):
+                submitted_count += 1
+        return submitted_count
+
+    def verse_from_index(self):
+        """
+        primary_key와 chapter_num에 해당하는 장에서 말씀 하나를 색인으로 뽑는다
+        색인에 없는 장은 db나 크롤링으로 가져와 색인에 더한 뒤 뽑는다
+        백그라운드 크롤러가 있다면 없는 장은 대기열에 넣고, 이미 저장된 말씀 가운데 하나를 바로 뽑는다
+        가져온 장에 말씀이 없다면 REDRAW_LIMIT번까지 다른 장을 다시 뽑는다
+        :return: 본문 정보 네임드튜플, 말씀이 있는 장을 뽑지 못하면 LookupError
+        """
+        verse_index = self.verse_index if self.verse_index else self.load_verse_index()
+
+        if self.background_fetcher:
+            self.absorb_background_results()
+
+        if self.background_fetcher and self.stale_while_revalidate:
+            # 저장된 말씀이 하나도 없을 때만 사용자가 크롤링을 기다린다
+            if not verse_index.has_chapter(self.primary_key, self.chapter_num) and len(verse_index):
+                catalog = self.catalog if self.catalog else self.load_catalog()
+                self.background_fetcher.submit(
+                    CrawlJob(catalog.bible_num_of(self.primary_key), self.primary_key, self.chapter_num),
+                    catalog.name(self.primary_key),
+                )
+                return verse_index.random_verse()
+
+        for _ in range(REDRAW_LIMIT):
+            # 백그라운드 크롤러가 가져오는 중인 장은 다시 크롤링하지 않고 끝나기를 기다린다
+            if self.background_fetcher and not verse_index.has_chapter(self.primary_key, self.chapter_num):
+                self.wait_for_background_fetch()
+
+            if not verse_index.has_chapter(self.primary_key, self.chapter_num):
+                bible_info = self.bible_info_for_chapter()
+                verse_index.add_chapter(bible_info)
+
+                # 새로 알게 된 장의 절 수를 샘플러의 가중치에 반영한다
+                if self.sampler:
+                    self.sampler.add_chapter(self.primary_key, self.chapter_num, len(bible_info))
+
+            if verse_index.has_chapter(self.primary_key, self.chapter_num):
+                return verse_index.random_verse(self.primary_key, self.chapter_num)
+
+            # 예외처리: 가져온 장에 말씀이 없는 경우 다른 장을 다시 뽑는다
+            print(f'{self.primary_key} {self.chapter_num}장에 말씀이 없어 다른 장을 뽑습니다', file=sys.stderr)
+            self.make_random_number()
+
+        raise LookupError(f'말씀이 있는 장을 {REDRAW_LIMIT}번 안에 뽑지 못했습니다')
+
+    def get_message(self):
+        """
+        크롤러에서 랜덤으로 말씀을 가져온다
+        :return: 말씀 객체
+        """
+        result = self.verse_from_index()
+        print(Fore.BLUE + f'\n\n{self.format_message(result)}\n\n')
+        print(Style.RESET_ALL)
+        return result
+
+    def message_dict(self, bible_info):
+        """
+        말씀 하나를 JSON으로 바꿀 수 있는 딕셔너리로 만든다
+        :param bible_info: 본문 정보 네임드튜플
+        :return: 말씀 딕셔너리
+        """
+        return {
+            'book': bible_info.books_name,
+            'bible_pk': bible_info.bible_pk,
+            'chapter': bible_info.chapter_num,
+            'paragraph': str(bible_info.paragraph_num),
+            'text': bible_info.texts,
+        }
+
+    def format_message(self, bible_info, output_format='text'):
+        """
+        말씀 하나를 출력 형식에 맞는 문자열로 바꾼다
+        :param bible_info: 본문 정보 네임드튜플
+        :param output_format: 'text' 또는 'jsonl'
+        :return: 말씀 문자열
+        """
+        if output_format == 'jsonl':
+            return json.dumps(self.message_dict(bible_info), ensure_ascii=False)
+
+        return f'{bible_info.texts} ({bible_info.books_name} {bible_info.chapter_num}-{bible_info.paragraph_num})'
+
+    def draw_messages(self, count):
+        """
+        말씀을 count개 뽑는다
+        db 커넥션과 성경책의 장 수, 말씀 색인은 모든 말씀이 함께 쓴다
+        :param count: 뽑을 말씀의 수
+        :return: 본문 정보 네임드튜플을 만드는 제너레이터
+        """
+        for _ in range(count):
+            self.make_random_number()
+            yield self.verse_from_index()
+
+    def draw(self, count, output_format='text', stream=None):
+        """
+        프롬프트 없이 말씀을 count개 뽑아 한 줄에 하나씩 stream에 쓴다
+        진행 메시지는 stderr로 보내 stream에는 말씀만 남긴다
+        :param count: 뽑을 말씀의 수
+        :param output_format: 'text' 또는 'jsonl'
+        :param stream: 말씀을 쓸 파일 객체, 없다면 표준 출력
+        :return: 뽑은 말씀의 수
+        """
+        stream = stream if stream else sys.stdout
+
+        with redirect_stdout(sys.stderr):
+            # db 존재 여부 검사하고 데이터 테이블 생성
+            self.search_data_table()
+
+            drawn_count = 0
+            for bible_info in self.draw_messages(count):
+                stream.write(self.format_message(bible_info, output_format) + '\n')
+                stream.flush()
+                drawn_count += 1
+
+        return drawn_count
+
+    def search(self, query, limit=10, output_format='text', stream=None):
+        """
+        db에 저장된 말씀에서 검색어를 찾아 관련도 순으로 한 줄에 하나씩 stream에 쓴다
+        진행 메시지는 stderr로 보내 stream에는 말씀만 남긴다
+        :param query: 검색어
+        :param limit: 최대 결과 수
+        :param output_format: 'text' 또는 'jsonl'
+        :param stream: 말씀을 쓸 파일 객체, 없다면 표준 출력
+        :return: 찾은 말씀의 수
+        """
+        stream = stream if stream else sys.stdout
+
+        with redirect_stdout(sys.stderr):
+            # db 존재 여부 검사하고 데이터 테이블 생성
+            self.search_data_table()
+            rows = self.search_verses_from_db(query, limit)
+
+        # 예외처리: 검색에 실패한 경우
+        if isinstance(rows, Exception):
+            return 0
+
+        for books_name, chapter_num, paragraph_num, texts, bible_pk in rows:
+            bible_info = BibleInfo(books_name, chapter_num, paragraph_num, texts, bible_pk)
+            stream.write(self.format_message(bible_info, output_format) + '\n')
+
+        return len(rows)
+
+    def export(self, path):
+        """
+        db에 저장된 말씀 전체를 메모리 맵으로 읽을 수 있는 말씀 묶음 파일로 내보낸다
+        :param path: 저장할 파일 경로
+        :return: 내보낸 절의 수
+        """
+        # db 존재 여부 검사하고 데이터 테이블 생성
+        self.search_data_table()
+
+        verse_count = export_corpus(self, path)
+        print(f'말씀 {verse_count}절을 {path}에 내보냈습니다')
+        return verse_count
+
+    def prefetch(self, workers=4, rate=4, max_attempts=5, backoff=30, retry_failed=False):
+        """
+        구약성경과 신약성경의 모든 장을 크롤링해 db에 저장한다
+        작업마다 상태를 crawl_jobs 장부에 남기므로 중간에 멈췄더라도 다시 실행하면 끝나지 않은 장부터 이어서 받고,
+        실패한 장은 간격을 늘려 가며 max_attempts번까지 다시 시도한다
+        :param workers: 동시에 크롤링할 장의 수
+        :param rate: 사이트에 보낼 초당 최대 요청 수
+        :param max_attempts: 장 하나를 시도할 최대 횟수
+        :param backoff: 첫 번째 실패 뒤에 기다릴 시간(초)
+        :param retry_failed: 지난 실행에서 시도 횟수를 다 쓴 장도 처음부터 다시 시도할지 여부
+        :return: 새로 저장한 장의 수
+        """
+        # db 존재 여부 검사하고 데이터 테이블 생성
+        self.search_data_table()
+
+        # 동시에 실행하는 작업 수만큼 세션의 커넥션 풀을 넓힌다
+        self.pool_size = max(self.pool_size, workers)
+
+        # 성경책 목록은 db에 없는 성경책이 있을 때만 목록 페이지를 크롤링해 채운다
+        catalog = self.catalog if self.catalog else self.load_catalog()
+        stored_books = self.search_stored_books_from_db()
+        new_books = {pk: catalog.books[pk] for pk in catalog.books if pk not in stored_books}
+        if new_books:
+            self.insert_bible_data_into_db(new_books)
+
+        stored_chapters = self.search_stored_chapters_from_db()
+        books_names = {}
+        jobs = []
+
+        # 성경책마다 모든 장을 순회하며 db에 없는 장만 작업으로 만든다
+        for primary_key in sorted(catalog.books):
+            books_name, chapters_count = catalog.books[primary_key]
+            books_names[primary_key] = books_name
+            jobs.extend(CrawlJob(catalog.bible_num_of(primary_key), primary_key, chapter_num)
+                        for chapter_num in range(1, chapters_count + 1)
+                        if (primary_key, chapter_num) not in stored_chapters)
+
+        # db에 없는 장을 장부에 더한다: 이미 장부에 있는 장은 지난 실행의 상태를 그대로 이어받는다
+        # 장부에 쓰지 못했다면 할 일이 없다고 보고하지 않도록 예외를 일으킨다
+        LedgerRunner.checked(self.enqueue_crawl_jobs(jobs, time.time()))
+        if retry_failed:
+            LedgerRunner.checked(self.reset_failed_crawl_jobs(time.time()))
+
+        # 작업은 동시에 실행하고, db에는 이 스레드에서만 배치 단위로 쓴다
+        engine = ConcurrentCrawler(self, max_workers=workers, rate=rate)
+        runner = LedgerRunner(engine, self, max_attempts=max_attempts, backoff=backoff)
+        self.set_bulk_load_mode(True)
+        try:
+            stored_count, failed_jobs = runner.run(books_names)
+        finally:
+            self.set_bulk_load_mode(False)
+
+        # 이번 실행의 결과와 함께 장부 전체의 상태를 보여준다
+        counts = LedgerRunner.checked(self.search_crawl_job_counts_from_db())
+        print(f'\n새로 저장한 장: {stored_count}개, 실패한 장: {len(failed_jobs)}개\n'
+              f'장부: 완료 {counts["done"]}개, 대기 {counts["pending"]}개, 실패 {counts["failed"]}개\n')
+        return stored_count
+
+    def serve(self, host='127.0.0.1', port=8000, workers=4, rate=4):
+        """
+        말씀사탕을 HTTP로 나눠 주는 서비스를 멈출 때까지 실행한다
+        :param workers: 색인에 없는 장을 동시에 크롤링할 수
+        :param rate: 사이트에 보낼 초당 최대 요청 수
+        :return: None
+        """
+        # 동시에 실행하는 작업 수만큼 세션의 커넥션 풀을 넓힌다
+        self.pool_size = max(self.pool_size, workers)
+
+        service = VerseService(self, max_workers=workers, rate=rate, warm_ahead=self.warm_ahead_count)
+        try:
+            asyncio.run(service.serve(host, port))
+        except KeyboardInterrupt:
+            print('\n말씀사탕 서비스를 종료합니다')
+        return None
+
+    def refresh(self, workers=4, rate=4):
+        """
+        저장된 모든 장을 다시 크롤링해서 본문이 바뀐 장만 db에 다시 쓴다
+        응답 캐시가 있다면 TTL과 상관없이 조건부 요청으로 재검증한다
+        :param workers: 동시에 크롤링할 장의 수
+        :param rate: 사이트에 보낼 초당 최대 요청 수
+        :return: 'unchanged', 'changed', 'failed': 장의 수 딕셔너리
+        """
+        # db 존재 여부 검사하고 데이터 테이블 생성
+        self.search_data_table()
+
+        # 동시에 실행하는 작업 수만큼 세션의 커넥션 풀을 넓힌다
+        self.pool_size = max(self.pool_size, workers)
+
+        catalog = self.catalog if self.catalog else self.load_catalog()
+        books_names = {primary_key: catalog.name(primary_key) for primary_key in catalog.books}
+        jobs = [CrawlJob(catalog.bible_num_of(primary_key), primary_key, chapter_num)
+                for primary_key, chapter_num in sorted(self.search_stored_chapters_from_db())
+                if primary_key in catalog]
+
+        engine = ConcurrentCrawler(self, max_workers=workers, rate=rate)
+        self.revalidate = True
+        try:
+            counts = ChapterRefresher(engine, self).refresh(jobs, books_names)
+        finally:
+            self.revalidate = False
+
+        print(f'\n바뀐 장: {counts["changed"]}개, 그대로인 장: {counts["unchanged"]}개, '
+              f'실패한 장: {counts["failed"]}개\n')
+        return counts
 
     # --- 프로그램 실행 함수 --- #
 
-    def start_menu(self):
+    def start_menu(self, inputs=None):
         """
-        시작 메뉴
-        :return: 사용자가 입력한 값을 인자로 하는 validate 함수
+        시작 메뉴: 테이블 검사와 안내 문구 출력은 한 번만 하고,
+        'q'를 입력받을 때까지 반복문으로 입력을 처리한다
+        :param inputs: 입력값의 이터러블, 없다면 사용자에게 input으로 입력받는다
+        :return: 종료할 때의 validate 함수 결과
         """
         # db 존재 여부 검사하고 데이터 테이블 생성
         self.search_data_table()
 
+        # 안내 문구를 읽는 동안 다음에 뽑힐 것 같은 장을 미리 가져온다
+        self.warm_ahead()
+
         main_bar = '=' * 52
 
         print(main_bar)
@@ -92,32 +583,183 @@ class Main(DB, BibleCrawler):
         print('\n말씀사탕에 오신 것을 환영합니다.')
         print('사탕을 받으려면 "go"를 입력해주세요!\n나가시려면 "q"를 입력해주세요.')
 
-        user_input = input('[go/q]: ')
+        user_inputs = inputs if inputs is not None else self.inputs_from_prompt()
+        for user_input in user_inputs:
+            if self.validate(user_input.strip()) is False:
+                return False
 
-        return self.validate(user_input)
+        # 입력이 끝나면 'q'를 입력한 것처럼 종료한다
+        return self.validate('q')
+
+    def inputs_from_prompt(self):
+        """
+        사용자에게 반복해서 입력을 받는다
+        :return: 사용자가 입력한 값을 만드는 제너레이터
+        """
+        while True:
+            try:
+                yield input('[go/q]: ')
+            # 예외처리: 입력 스트림이 닫혔을 경우
+            except EOFError:
+                return
 
     def validate(self, input_data):
         """
-        사용자에게 입력받은 값이 유효한지 검증함
+        사용자에게 입력받은 값이 유효한지 검증하고 처리함
         :param input_data: 사용자에게 입력받은 값
-        :return:
-        """
-        while input_data != 'q':
-            # 'go'를 입력하면 말씀을 꺼내온다
-            if input_data == 'go':
-                # 랜덤 숫자를 구한다
-                self.make_random_number()
-                # db를 검색하거나 크롤링 데이터를 이용해 말씀을 꺼내온다
-                self.get_message()
-            else:
-                # 유효하지 않은 값이 들어오면 알려주고 메뉴로 돌려보낸다
-                print('\n올바른 값을 입력하세요!\n')
-            return self.start_menu()
-
+        :return: 계속 입력을 받으려면 True, 'q'를 입력했다면 False
+        """
         # 'q'를 입력하면 프로그램 종료
-        print('\n다음에 다시 만나요!\n')
-        return None
+        if input_data == 'q':
+            self.stop_background_fetcher()
+            print('\n다음에 다시 만나요!\n')
+            return False
+
+        # 'go'를 입력하면 말씀을 꺼내온다
+        if input_data == 'go':
+            # 랜덤 숫자를 구한다
+            self.make_random_number()
+            # db를 검색하거나 크롤링 데이터를 이용해 말씀을 꺼내온다
+            self.get_message()
+            # 사용자가 말씀을 읽는 동안 다음에 뽑힐 것 같은 장을 미리 가져온다
+            self.warm_ahead()
+        else:
+            # 유효하지 않은 값이 들어오면 알려주고 다시 입력받는다
+            print('\n올바른 값을 입력하세요!\n')
+        return True
+
+
+def book_weights_from_text(text):
+    """
+    '101=2,147=0.5' 형태의 문자열을 성경책 가중치 딕셔너리로 바꾼다
+    :param text: 성경책 pk와 가중치를 =로 잇고 쉼표로 구분한 문자열
+    :return: 성경책 pk: 가중치 딕셔너리, 형식이 잘못되었다면 argparse.ArgumentTypeError
+    """
+    book_weights = {}
+    for item in (item.strip() for item in text.split(',')):
+        if not item:
+            continue
+
+        # 예외처리: '성경책 pk=가중치' 형태가 아닌 경우
+        if item.count('=') != 1:
+            raise argparse.ArgumentTypeError(f'성경책 가중치는 pk=가중치 형태여야 합니다: {item}')
+        bible_pk, weight = item.split('=')
+        try:
+            bible_pk, weight = int(bible_pk), float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'성경책 pk는 정수, 가중치는 숫자여야 합니다: {item}')
+
+        # 예외처리: 음수나 무한대 가중치는 누적 가중치의 순서를 깨뜨린다
+        if not math.isfinite(weight) or weight < 0:
+            raise argparse.ArgumentTypeError(f'가중치는 0 이상의 유한한 숫자여야 합니다: {item}')
+        book_weights[bible_pk] = weight
+    return book_weights
+
+
+def run(argv=None):
+    """
+    명령행 인자에 따라 프로그램을 실행한다
+    :param argv: 명령행 인자 리스트, None이면 sys.argv를 사용한다
+    :return: 실행한 명령의 결과
+    """
+    parser = argparse.ArgumentParser(description='가톨릭 말씀사탕')
+    parser.add_argument('--non-interactive', action='store_true',
+                        help='프롬프트 없이 표준 입력에서 한 줄씩 go/q 명령을 읽습니다')
+    parser.add_argument('--sampling', choices=SAMPLING_STRATEGIES, default='legacy',
+                        help='legacy: 성경, 성경책, 장 순서로 균등하게, uniform: 모든 절을 균등하게, '
+                             'weighted: 절마다 --book-weights의 가중치를 곱해서 뽑습니다')
+    parser.add_argument('--book-weights', type=book_weights_from_text, default={},
+                        help='weighted 방식에서 쓸 성경책 가중치, 예: 101=2,147=0.5')
+    parser.add_argument('--parser', choices=PARSERS, default='soup',
+                        help='soup: BeautifulSoup으로 문서 전체를 렌더링합니다, lxml: 필요한 행만 XPath로 찾아 더 빠릅니다')
+    parser.add_argument('--cache-dir', default=None,
+                        help='받아 온 페이지를 저장해 다시 요청하지 않을 디렉터리, 없으면 캐시를 쓰지 않습니다')
+    parser.add_argument('--cache-ttl', type=float, default=24 * 60 * 60,
+                        help='저장한 페이지를 재검증 없이 쓸 시간(초)')
+    parser.add_argument('--stale-while-revalidate', action='store_true',
+                        help='db에 없는 장은 백그라운드에서 가져오고, 그동안 이미 저장된 말씀을 바로 보여 줍니다')
+    parser.add_argument('--max-pending', type=int, default=8,
+                        help='백그라운드에서 가져오려고 대기열에 쌓아 둘 수 있는 최대 장의 수')
+    parser.add_argument('--warm-ahead', type=int, default=0,
+                        help='프롬프트나 서비스가 쉬는 동안 다음에 뽑힐 것 같은 장을 이 수만큼씩 미리 가져옵니다')
+    transport_group = parser.add_mutually_exclusive_group()
+    transport_group.add_argument('--record', metavar='DIR', default=None,
+                                 help='사이트에서 받은 페이지를 DIR에 응답 파일로 저장합니다')
+    transport_group.add_argument('--replay', metavar='DIR', default=None,
+                                 help='사이트 대신 DIR에 저장된 응답 파일로 실행합니다')
+    subparsers = parser.add_subparsers(dest='command')
+    prefetch_parser = subparsers.add_parser('prefetch', help='성경 전체를 크롤링해 bible.db에 저장합니다')
+    prefetch_parser.add_argument('--workers', type=int, default=4, help='동시에 크롤링할 장의 수')
+    prefetch_parser.add_argument('--rate', type=float, default=4, help='사이트에 보낼 초당 최대 요청 수')
+    prefetch_parser.add_argument('--max-attempts', type=int, default=5, help='장 하나를 시도할 최대 횟수')
+    prefetch_parser.add_argument('--retry-backoff', type=float, default=30,
+                                 help='첫 번째 실패 뒤에 기다릴 시간(초), 실패할 때마다 두 배로 늘어난다')
+    prefetch_parser.add_argument('--retry-failed', action='store_true',
+                                 help='지난 실행에서 시도 횟수를 다 쓴 장도 처음부터 다시 시도합니다')
+    refresh_parser = subparsers.add_parser('refresh', help='저장된 장을 다시 크롤링해 바뀐 장만 bible.db에 다시 씁니다, '
+                                                           '--cache-dir와 함께 쓰면 조건부 요청을 보냅니다')
+    refresh_parser.add_argument('--workers', type=int, default=4, help='동시에 크롤링할 장의 수')
+    refresh_parser.add_argument('--rate', type=float, default=4, help='사이트에 보낼 초당 최대 요청 수')
+    draw_parser = subparsers.add_parser('draw', help='프롬프트 없이 말씀을 여러 개 뽑아 출력합니다')
+    draw_parser.add_argument('--count', type=int, default=1, help='뽑을 말씀의 수')
+    draw_parser.add_argument('--format', choices=('text', 'jsonl'), default='text', help='출력 형식')
+    search_parser = subparsers.add_parser('search', help='저장된 말씀에서 검색어를 찾습니다')
+    search_parser.add_argument('query', help='찾을 검색어, 세 글자 이상이면 관련도 순으로 보여 줍니다')
+    search_parser.add_argument('--limit', type=int, default=10, help='최대 결과 수')
+    search_parser.add_argument('--format', choices=('text', 'jsonl'), default='text', help='출력 형식')
+    export_parser = subparsers.add_parser('export', help='저장된 말씀 전체를 말씀 묶음 파일로 내보냅니다')
+    export_parser.add_argument('--output', default='bible.corpus', help='저장할 파일 경로')
+    catalog_parser = subparsers.add_parser('catalog', help='성경책 목록 스냅숏을 다시 만들거나 사이트와 비교합니다')
+    catalog_parser.add_argument('action', choices=('build', 'verify'), help='build: 다시 만들기, verify: 비교하기')
+    catalog_parser.add_argument('--path', default=SNAPSHOT_PATH, help='스냅숏 파일 경로')
+    serve_parser = subparsers.add_parser('serve', help='말씀사탕을 HTTP로 나눠 주는 서비스를 실행합니다')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='연결을 받을 주소')
+    serve_parser.add_argument('--port', type=int, default=8000, help='연결을 받을 포트')
+    serve_parser.add_argument('--workers', type=int, default=4, help='색인에 없는 장을 동시에 크롤링할 수')
+    serve_parser.add_argument('--rate', type=float, default=4, help='사이트에 보낼 초당 최대 요청 수')
+    args = parser.parse_args(argv)
+
+    main = Main()
+    main.sampling = args.sampling
+    main.book_weights = args.book_weights
+    main.parser = args.parser
+    main.warm_ahead_count = args.warm_ahead
+    if args.cache_dir:
+        main.response_cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl)
+    if args.record:
+        main.transport = RecordTransport(args.record, main.create_session())
+    if args.replay:
+        main.transport = ReplayTransport(args.replay)
+    if args.command == 'prefetch':
+        return main.prefetch(workers=args.workers, rate=args.rate, max_attempts=args.max_attempts,
+                             backoff=args.retry_backoff, retry_failed=args.retry_failed)
+    if args.command == 'refresh':
+        return main.refresh(workers=args.workers, rate=args.rate)
+    if args.command == 'search':
+        return main.search(args.query, limit=args.limit, output_format=args.format)
+    if args.command == 'export':
+        return main.export(args.output)
+    if args.command == 'catalog':
+        result = main.catalog_command(args.action, args.path)
+        if args.action == 'verify' and result:
+            parser.exit(1)
+        return result
+    if args.command == 'serve':
+        return main.serve(args.host, args.port, workers=args.workers, rate=args.rate)
+    main.stale_while_revalidate = args.stale_while_revalidate
+    if args.stale_while_revalidate or args.warm_ahead:
+        main.start_background_fetcher(max_pending=args.max_pending)
+    if args.command == 'draw':
+        try:
+            return main.draw(args.count, output_format=args.format)
+        finally:
+            # 멈추기 전에 끝나는 장의 진행 메시지도 말씀 출력에 섞이지 않도록 stderr로 보낸다
+            with redirect_stdout(sys.stderr):
+                main.stop_background_fetcher()
+    if args.non_interactive:
+        return main.start_menu(inputs=sys.stdin)
+    return main.start_menu()
 
 
 if __name__ == '__main__':
-    Main().start_menu()
+    run()
@@ -0,0 +1,125 @@
+import hashlib
+import time
+
+
+def chapter_hash(verses):
+    """
+    장 하나의 본문을 정규화해 sha256으로 요약한다
+    절 번호는 문자열로, 본문은 공백을 한 칸으로 줄여서 db에서 읽은 장과 크롤링한 장이 같은 해시를 갖게 한다
+    db는 절을 기본 키 순서로 돌려주므로 '1ㄱ'처럼 페이지 순서와 다른 절이 있어도 같도록 정규화한 절을 정렬해서 요약한다
+    :param verses: (절 번호, 본문) 튜플의 이터러블
+    :return: 16진수 해시 문자열
+    """
+    lines = sorted(f'{str(paragraph_num).strip()}\t{" ".join(str(texts).split())}\n'
+                   for paragraph_num, texts in verses)
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ChapterRefresher:
+    """
+    저장된 장을 다시 크롤링해서 본문 해시가 바뀐 장만 db에 다시 쓰는 크롤러
+    바뀌지 않은 장은 해시와 확인한 시각만 기록한다
+    """
+
+    def __init__(self, engine, db, batch_size=50):
+        """
+        인스턴스 속성 정의
+        :param engine: 작업을 동시에 실행할 ConcurrentCrawler
+        :param db: 장과 해시를 읽고 쓸 DB 인스턴스
+        :param batch_size: 바뀌지 않은 장의 해시를 트랜잭션 하나에 묶어 기록할 수
+        """
+        self.__engine = engine
+        self.__db = db
+        self.__batch_size = batch_size
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def engine(self):
+        return self.__engine
+
+    @property
+    def db(self):
+        return self.__db
+
+    # --- 해시 함수 --- #
+
+    def stored_hash(self, job):
+        """
+        해시가 기록되지 않은 장은 db의 본문으로 해시를 계산한다
+        :param job: CrawlJob 네임드튜플
+        :return: 16진수 해시 문자열
+        """
+        rows = self.db.query_from_db('bible_info_chapter', (job.book_pk, job.chapter))
+        return chapter_hash((paragraph_num, texts) for _, _, paragraph_num, texts in rows)
+
+    def record_unchanged(self, checked, counts):
+        """
+        바뀌지 않은 장들의 해시를 트랜잭션 하나로 기록하고, 기록하지 못한 장은 실패한 장으로 센다
+        :param checked: (성경책 pk, 장, 해시) 튜플 리스트
+        :param counts: refresh가 세는 장의 수 딕셔너리
+        :return: None
+        """
+        error = self.db.record_chapter_hashes(checked, time.time())
+        if error:
+            print(f'바뀌지 않은 장 {len(checked)}개의 해시를 기록하지 못했습니다: {error}')
+            counts['failed'] += len(checked)
+        else:
+            counts['unchanged'] += len(checked)
+        return None
+
+    # --- 실행 함수 --- #
+
+    def refresh(self, jobs, books_names):
+        """
+        작업들을 동시에 다시 크롤링하고, 해시가 바뀐 장만 호출한 스레드에서 db에 다시 쓴다
+        :param jobs: CrawlJob 네임드튜플의 이터러블
+        :param books_names: 성경책 pk를 성경책 이름에 대응시킨 딕셔너리
+        :return: 'unchanged', 'changed', 'failed': 장의 수 딕셔너리
+        """
+        self.db.create_hash_table()
+        stored_hashes = self.db.search_chapter_hashes_from_db()
+
+        counts = {'unchanged': 0, 'changed': 0, 'failed': 0}
+        checked = []
+
+        for result in self.engine.crawl(jobs, books_names):
+            job = result.job
+            name = f'{books_names[job.book_pk]} {job.chapter}장'
+
+            # 예외처리: 크롤링에 실패했거나 빈 장이 온 경우 저장된 본문을 지우지 않는다
+            if result.error is not None or not result.bible_info:
+                print(f'{name} 다시 크롤링 실패: {result.error}')
+                counts['failed'] += 1
+                continue
+
+            new_hash = chapter_hash((info.paragraph_num, info.texts) for info in result.bible_info)
+            old_hash = stored_hashes.get((job.book_pk, job.chapter))
+            if new_hash == (old_hash if old_hash else self.stored_hash(job)):
+                checked.append((job.book_pk, job.chapter, new_hash))
+                if len(checked) >= self.__batch_size:
+                    self.record_unchanged(checked, counts)
+                    checked = []
+                continue
+
+            # 예외처리: 다시 쓰기에 실패한 장은 예전 본문이 그대로 남는다
+            if self.db.replace_chapter_in_db(result.bible_info, new_hash, time.time()):
+                print(f'{name}이 바뀌었지만 다시 저장하지 못했습니다')
+                counts['failed'] += 1
+                continue
+
+            print(f'{name}이 바뀌어 다시 저장했습니다')
+            counts['changed'] += 1
+
+        # 마지막으로 남은 장들의 해시를 기록한다
+        if checked:
+            self.record_unchanged(checked, counts)
+
+        return counts
+
+
+if __name__ == '__main__':
+    pass
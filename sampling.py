@@ -0,0 +1,212 @@
+import heapq
+import random
+import sqlite3
+from bisect import bisect_right
+from itertools import accumulate
+
+from catalog import OLD_TESTAMENT_LAST_PK
+
+# 선택할 수 있는 샘플링 방식
+# legacy: 성경 50:50 -> 성경책 균등 -> 장 균등 (예전 방식)
+# uniform: 모든 절이 같은 확률
+# weighted: 절마다 성경책별 가중치를 곱한 확률
+SAMPLING_STRATEGIES = ('legacy', 'uniform', 'weighted')
+
+
+class VerseSampler:
+    """
+    장마다 가중치를 매기고 누적 가중치 테이블과 이분 탐색으로 장을 뽑는 샘플러
+    """
+
+    def __init__(self, strategy='uniform', book_weights=None, default_verse_count=25):
+        """
+        인스턴스 속성 정의
+        :param strategy: SAMPLING_STRATEGIES 중 하나
+        :param book_weights: weighted 방식에서 성경책 pk마다 절에 곱할 가중치, 없는 성경책은 1
+        :param default_verse_count: 절 수를 아는 장이 하나도 없을 때 쓸 장당 절 수 추정값
+        """
+        if strategy not in SAMPLING_STRATEGIES:
+            raise ValueError(f'알 수 없는 샘플링 방식입니다: {strategy}')
+
+        self.__strategy = strategy
+        self.__book_weights = book_weights if book_weights else {}
+        self.__default_verse_count = default_verse_count
+        self.__chapters_counts = {}  # 성경책 pk: 장 수
+        self.__books_counts = {1: 0, 2: 0}  # 구약성경과 신약성경의 성경책 수
+        self.__bible_nums = {}  # 성경책 pk: 구약성경 1, 신약성경 2
+        self.__verse_counts = {}  # (성경책 pk, 장): 절 수
+        self.__keys = []  # 누적 가중치 테이블의 (성경책 pk, 장)
+        self.__cumulative = []  # 누적 가중치 테이블
+        self.__dirty = True
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def strategy(self):
+        return self.__strategy
+
+    @property
+    def book_weights(self):
+        return self.__book_weights
+
+    @property
+    def chapters_counts(self):
+        return self.__chapters_counts
+
+    @property
+    def verse_counts(self):
+        return self.__verse_counts
+
+    # --- 가중치 정보 입력 함수 --- #
+
+    def add_book(self, bible_pk, chapters_count, bible_num=None):
+        """
+        성경책 하나의 장 수를 더한다
+        :param bible_num: 구약성경: 1, 신약성경: 2, 모른다면 pk로 짐작한다
+        :return: None
+        """
+        if bible_num and bible_pk not in self.chapters_counts:
+            self.__bible_nums[bible_pk] = bible_num
+        if bible_pk not in self.chapters_counts:
+            self.__books_counts[self.bible_num_of(bible_pk)] += 1
+        if self.chapters_counts.get(bible_pk) != int(chapters_count):
+            self.chapters_counts[bible_pk] = int(chapters_count)
+            self.__dirty = True
+        return None
+
+    def add_chapter(self, bible_pk, chapter_num, verse_count):
+        """
+        장 하나의 절 수를 더한다: 절 수를 모르던 장은 추정값 대신 실제 절 수를 쓰게 된다
+        :return: None
+        """
+        if verse_count and self.verse_counts.get((bible_pk, chapter_num)) != verse_count:
+            self.verse_counts[(bible_pk, chapter_num)] = verse_count
+            self.__dirty = True
+        return None
+
+    def load_from_catalog(self, catalog):
+        """
+        성경책 목록에서 장 수를 읽어 온다
+        :param catalog: BookCatalog 인스턴스
+        :return: 샘플러 자기 자신
+        """
+        for bible_pk, bible_data in catalog.books.items():
+            self.add_book(bible_pk, bible_data.chapters_count, catalog.bible_num_of(bible_pk))
+        return self
+
+    def load_verse_counts_from_db(self, db):
+        """
+        db의 bible_info에서 장마다 절 수를 읽어 온다
+        :param db: 읽을 DB 인스턴스
+        :return: 샘플러 자기 자신
+        """
+        try:
+            for bible_pk, chapter_num, verse_count in db.query_from_db('chapter_verse_counts'):
+                self.add_chapter(bible_pk, chapter_num, verse_count)
+
+        # 예외처리: data_table이 없을 경우
+        except sqlite3.Error as e:
+            print(e)
+
+        return self
+
+    # --- 가중치 계산 함수 --- #
+
+    def bible_num_of(self, bible_pk):
+        """
+        성경책 pk가 속한 성경을 알아낸다
+        :return: 구약성경: 1, 신약성경: 2
+        """
+        if bible_pk in self.__bible_nums:
+            return self.__bible_nums[bible_pk]
+        return 1 if bible_pk <= OLD_TESTAMENT_LAST_PK else 2
+
+    def estimated_verse_count(self):
+        """
+        절 수를 모르는 장에 쓸 추정값: 지금까지 알려진 장의 평균 절 수
+        :return: 장당 절 수 추정값
+        """
+        if not self.verse_counts:
+            return self.__default_verse_count
+        return sum(self.verse_counts.values()) / len(self.verse_counts)
+
+    def chapter_weight(self, bible_pk, chapter_num, estimate=None):
+        """
+        장 하나가 뽑힐 가중치를 계산한다
+        :param estimate: 절 수를 모르는 장에 쓸 추정값, 없다면 새로 계산한다
+        :return: 가중치
+        """
+        chapters_count = self.chapters_counts[bible_pk]
+
+        # legacy: 1/2 * 1/(성경의 성경책 수) * 1/(성경책의 장 수)
+        if self.strategy == 'legacy':
+            return 0.5 / self.__books_counts[self.bible_num_of(bible_pk)] / chapters_count
+
+        estimate = estimate if estimate is not None else self.estimated_verse_count()
+        verse_count = self.verse_counts.get((bible_pk, chapter_num), estimate)
+
+        # uniform: 절 수에 비례, weighted: 절 수에 성경책 가중치를 곱한 값에 비례
+        if self.strategy == 'weighted':
+            return verse_count * self.book_weights.get(bible_pk, 1)
+        return verse_count
+
+    def rebuild(self):
+        """
+        모든 장의 가중치로 누적 가중치 테이블을 다시 만든다
+        절 수를 모르는 장의 가중치는 알려진 장의 평균 절 수로 추정하므로, 장 하나의 절 수만 바뀌어도
+        모든 추정값이 함께 바뀌어 테이블 일부만 고칠 수 없다
+        성경 전체가 1,300여 장이고 가중치가 바뀐 뒤 처음 뽑을 때만 다시 만드므로 O(n)으로 충분하다
+        :return: None
+        """
+        estimate = self.estimated_verse_count()
+        self.__keys = [(bible_pk, chapter_num)
+                       for bible_pk in sorted(self.chapters_counts)
+                       for chapter_num in range(1, self.chapters_counts[bible_pk] + 1)]
+        self.__cumulative = list(accumulate(self.chapter_weight(bible_pk, chapter_num, estimate)
+                                            for bible_pk, chapter_num in self.__keys))
+        self.__dirty = False
+        return None
+
+    def weights(self):
+        """
+        모든 장의 가중치를 꺼낸다
+        :return: (성경책 pk, 장): 가중치 딕셔너리
+        """
+        if self.__dirty:
+            self.rebuild()
+        previous = [0] + self.__cumulative[:-1]
+        return {key: total - before for key, total, before in zip(self.__keys, self.__cumulative, previous)}
+
+    def top_chapters(self, count, exclude=()):
+        """
+        뽑힐 가능성이 가장 높은 장을 가중치 순서로 꺼낸다
+        :param count: 꺼낼 장의 수
+        :param exclude: 건너뛸 (성경책 pk, 장)의 컬렉션 ex: 이미 저장된 장
+        :return: (성경책 pk, 장) 튜플 리스트
+        """
+        weights = self.weights()
+        candidates = (key for key in weights if key not in exclude and weights[key] > 0)
+        return heapq.nlargest(count, candidates, key=weights.get)
+
+    # --- 장 뽑기 함수 --- #
+
+    def draw(self):
+        """
+        누적 가중치 테이블을 이분 탐색해 장 하나를 뽑는다: O(log n)
+        가중치가 바뀐 뒤 처음 뽑을 때만 테이블을 다시 만든다
+        :return: (성경책 pk, 장) 튜플
+        """
+        if self.__dirty:
+            self.rebuild()
+        if not self.__cumulative:
+            raise ValueError('샘플러에 성경책 정보가 없습니다')
+        if self.__cumulative[-1] <= 0:
+            raise ValueError('가중치가 0보다 큰 장이 없습니다')
+
+        point = random.random() * self.__cumulative[-1]
+        position = min(bisect_right(self.__cumulative, point), len(self.__keys) - 1)
+        return self.__keys[position]
+
+
+if __name__ == '__main__':
+    pass
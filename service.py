@@ -0,0 +1,339 @@
+import asyncio
+import json
+import sqlite3
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+
+import requests
+
+from crawl_engine import ConcurrentCrawler, CrawlJob
+from crawler import BibleInfo
+from verse_index import REDRAW_LIMIT
+
+
+# 사이트에서 장을 가져오지 못했을 때 나는 예외: 502로 답한다
+# 요청 실패(requests), 저장된 응답이 없는 경우(OSError), 페이지 구조가 바뀌어 파싱하지 못한 경우(ValueError)
+UPSTREAM_ERRORS = (requests.RequestException, OSError, ValueError)
+
+
+class VerseService:
+    """
+    db와 성경책 목록, 말씀 색인을 메모리에 올려 둔 채 말씀사탕을 HTTP로 나눠 주는 asyncio 서비스
+    색인에 없는 장은 스레드 풀에서 크롤링하고, db와 색인은 이벤트 루프 스레드에서만 쓴다
+    처리 중인 요청이 없을 때는 다음에 뽑힐 것 같은 장을 미리 가져온다
+    """
+
+    def __init__(self, main, max_workers=4, rate=None, warm_ahead=0, idle_seconds=1.0, keep_alive_timeout=5.0):
+        """
+        인스턴스 속성 정의
+        :param main: db와 크롤러, 성경책 목록, 말씀 색인을 가진 Main 인스턴스
+        :param max_workers: 동시에 크롤링할 장의 수
+        :param rate: 사이트에 보낼 초당 최대 요청 수, None이면 제한하지 않는다
+        :param warm_ahead: 쉬는 동안 한 번에 미리 가져올 장의 수, 0이면 미리 가져오지 않는다
+        :param idle_seconds: 처리 중인 요청이 없는지 확인하는 간격(초)
+        :param keep_alive_timeout: 연결 하나가 다음 요청 없이 기다릴 수 있는 시간(초)
+        """
+        self.__main = main
+        self.__engine = ConcurrentCrawler(main, max_workers=max_workers, rate=rate)
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.__pending = {}  # (성경책 pk, 장): 크롤링 중인 asyncio.Task
+        self.__book_pks = {}  # 성경책 이름: 성경책 pk
+        self.__warm_ahead = warm_ahead
+        self.__idle_seconds = idle_seconds
+        self.__keep_alive_timeout = keep_alive_timeout
+        self.__active_requests = 0
+        self.__failed = set()  # 미리 가져오지 못한 (성경책 pk, 장)
+        self.__warm_task = None
+        self.__server = None
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def main(self):
+        return self.__main
+
+    @property
+    def engine(self):
+        return self.__engine
+
+    @property
+    def server(self):
+        return self.__server
+
+    # --- 준비 함수 --- #
+
+    def warm(self):
+        """
+        db 테이블과 성경책 목록, 말씀 색인을 한 번 읽어 메모리에 올린다
+        :return: None
+        """
+        self.main.search_data_table()
+        catalog = self.main.catalog if self.main.catalog else self.main.load_catalog()
+        self.__book_pks = {catalog.name(bible_pk): bible_pk for bible_pk in catalog.books}
+        if self.main.verse_index is None:
+            self.main.load_verse_index()
+        if self.main.sampling != 'legacy' and self.main.sampler is None:
+            self.main.load_sampler()
+        return None
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """
+        캐시를 데운 뒤 연결을 받기 시작한다
+        :param port: 0이면 운영체제가 빈 포트를 고른다
+        :return: asyncio.Server 객체
+        """
+        self.warm()
+        self.__server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        if self.__warm_ahead:
+            self.__warm_task = asyncio.ensure_future(self.warm_ahead_loop())
+        return self.server
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        """
+        서비스를 시작하고 멈출 때까지 요청을 처리한다
+        :return: None
+        """
+        server = await self.start(host, port)
+        address = server.sockets[0].getsockname()
+        print(f'말씀사탕 서비스를 시작합니다: http://{address[0]}:{address[1]}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self.__warm_task:
+                self.__warm_task.cancel()
+            self.__executor.shutdown(wait=False)
+
+    async def warm_ahead_loop(self):
+        """
+        처리 중인 요청이 없을 때마다 다음에 뽑힐 것 같은 장을 warm_ahead개씩 가져와 db와 색인에 더한다
+        가져오지 못한 장은 다시 시도하지 않는다
+        :return: None, 미리 가져올 장이 더 없으면 끝난다
+        """
+        while True:
+            await asyncio.sleep(self.__idle_seconds)
+            if self.__active_requests or self.__pending:
+                continue
+
+            keys = self.main.warm_ahead_chapters(self.__warm_ahead, exclude=self.__failed)
+            if not keys:
+                return None
+
+            results = await asyncio.gather(*(self.load_chapter(*key) for key in keys), return_exceptions=True)
+            self.__failed.update(key for key, result in zip(keys, results)
+                                 if isinstance(result, Exception) or not result)
+
+    # --- HTTP 처리 함수 --- #
+
+    async def handle(self, reader, writer):
+        """
+        연결 하나에서 들어오는 요청을 차례로 처리한다: HTTP/1.1은 기본으로 연결을 재사용한다
+        keep_alive_timeout 안에 다음 요청을 다 보내지 않는 연결은 닫는다
+        :return: None
+        """
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), self.__keep_alive_timeout)
+
+                # 예외처리: 쉬고 있는 연결이 서버 자원을 붙잡고 있지 않도록 닫는다
+                except asyncio.TimeoutError:
+                    break
+
+                # 예외처리: 요청 줄이 잘못되었거나, 요청 줄이나 헤더가 StreamReader의 한도보다 긴 경우
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, {'error': '잘못된 요청입니다'}, False)
+                    break
+
+                if request is None:
+                    break
+                method, target, version, headers = request
+
+                # 본문은 쓰지 않지만 다음 요청을 읽을 수 있도록 비운다
+                if headers.get('content-length', '0').isdigit() and int(headers.get('content-length', '0')):
+                    await reader.readexactly(int(headers['content-length']))
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                self.__active_requests += 1
+                try:
+                    status, payload = await self.route(method, target)
+                finally:
+                    self.__active_requests -= 1
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+
+        # 예외처리: 클라이언트가 요청 도중에 연결을 끊은 경우
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_request(reader):
+        """
+        요청 줄과 헤더를 읽는다
+        :return: (메서드, 경로, HTTP 버전, 헤더 딕셔너리) 튜플, 연결이 닫혔다면 None
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, version = request_line.decode('latin-1').split()
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return method, target, version, headers
+
+    async def respond(self, writer, status, payload, keep_alive):
+        """
+        JSON 응답을 쓴다
+        :param status: HTTPStatus
+        :param payload: JSON으로 바꿀 객체
+        :param keep_alive: 연결을 유지할지 여부
+        :return: None
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                f'Content-Type: application/json; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+        return None
+
+    async def route(self, method, target):
+        """
+        요청 경로에 맞는 API를 실행한다
+        GET /candy: 말씀 하나를 무작위로 뽑는다
+        GET /verse/{성경책 pk 또는 이름}/{장}: 장 전체를 돌려준다
+        GET /health: 색인 상태를 돌려준다
+        :return: (HTTPStatus, JSON으로 바꿀 객체) 튜플
+        """
+        if method != 'GET':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'GET 요청만 받습니다'}
+
+        parts = [unquote(part) for part in urlsplit(target).path.strip('/').split('/')]
+        try:
+            if parts == ['candy']:
+                return HTTPStatus.OK, self.main.message_dict(await self.candy())
+            if len(parts) == 3 and parts[0] == 'verse':
+                return HTTPStatus.OK, await self.verse(parts[1], parts[2])
+            if parts == ['health']:
+                return HTTPStatus.OK, {'status': 'ok', 'verses': len(self.main.verse_index)}
+            return HTTPStatus.NOT_FOUND, {'error': '없는 경로입니다'}
+
+        # 예외처리: 없는 성경책이나 장, 또는 말씀이 없는 장을 요청한 경우
+        except LookupError as e:
+            return HTTPStatus.NOT_FOUND, {'error': str(e)}
+
+        # 예외처리: 사이트에서 장을 가져오지 못한 경우
+        except UPSTREAM_ERRORS as e:
+            return HTTPStatus.BAD_GATEWAY, {'error': f'말씀을 가져오지 못했습니다: {e}'}
+
+        # 예외처리: 그 밖의 예외는 서비스의 버그이므로 기록하고 500으로 답한다
+        except Exception:
+            traceback.print_exc()
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': '서버 오류입니다'}
+
+    # --- API 함수 --- #
+
+    async def candy(self):
+        """
+        sampling 방식에 따라 장을 뽑고 그 장에서 말씀 하나를 고른다
+        뽑은 장에 말씀이 없다면 REDRAW_LIMIT번까지 다른 장을 다시 뽑는다
+        :return: 본문 정보 네임드튜플, 말씀이 있는 장을 뽑지 못하면 LookupError
+        """
+        for _ in range(REDRAW_LIMIT):
+            self.main.make_random_number()
+            primary_key, chapter_num = self.main.primary_key, self.main.chapter_num
+            if await self.load_chapter(primary_key, chapter_num):
+                return self.main.verse_index.random_verse(primary_key, chapter_num)
+        raise LookupError(f'말씀이 있는 장을 {REDRAW_LIMIT}번 안에 뽑지 못했습니다')
+
+    async def verse(self, book, chapter):
+        """
+        성경책 pk나 이름과 장으로 장 전체를 찾는다
+        :return: 장 딕셔너리
+        """
+        catalog = self.main.catalog
+        primary_key = int(book) if book.isdigit() else self.__book_pks.get(book)
+        if primary_key not in catalog:
+            raise LookupError(f'없는 성경책입니다: {book}')
+        if not chapter.isdigit() or not 1 <= int(chapter) <= catalog.chapters_count(primary_key):
+            raise LookupError(f'{catalog.name(primary_key)}에는 {chapter}장이 없습니다')
+
+        bible_info = await self.load_chapter(primary_key, int(chapter))
+        if not bible_info:
+            raise LookupError(f'{catalog.name(primary_key)} {chapter}장에 말씀이 없습니다')
+        return {
+            'book': catalog.name(primary_key),
+            'bible_pk': primary_key,
+            'chapter': int(chapter),
+            'verses': [{'paragraph': str(info.paragraph_num), 'text': info.texts} for info in bible_info],
+        }
+
+    async def load_chapter(self, primary_key, chapter_num):
+        """
+        색인에서 장을 찾고, 없다면 db나 크롤링으로 가져와 색인에 더한다
+        같은 장을 동시에 요청하면 크롤링은 한 번만 한다
+        :return: 본문 정보 네임드튜플로 구성된 리스트, 말씀이 없는 장이면 빈 리스트
+        """
+        verse_index = self.main.verse_index
+        if verse_index.has_chapter(primary_key, chapter_num):
+            return verse_index.chapter(primary_key, chapter_num)
+
+        key = (primary_key, chapter_num)
+        if key not in self.__pending:
+            task = asyncio.ensure_future(self.fetch_chapter(primary_key, chapter_num))
+            task.add_done_callback(lambda _: self.__pending.pop(key, None))
+            self.__pending[key] = task
+
+        # 한 요청이 끊겨도 같은 장을 기다리는 다른 요청의 크롤링은 취소되지 않는다
+        return await asyncio.shield(self.__pending[key])
+
+    async def fetch_chapter(self, primary_key, chapter_num):
+        """
+        db에서 장을 찾고, 없다면 스레드 풀에서 크롤링한 뒤 db와 색인에 더한다
+        :return: 본문 정보 네임드튜플로 구성된 리스트, 말씀이 없는 장이면 빈 리스트
+        """
+        catalog = self.main.catalog
+        try:
+            rows = self.main.query_from_db('bible_info_chapter', (primary_key, chapter_num)).fetchall()
+        except sqlite3.Error as e:
+            print(e)
+            rows = []
+
+        if rows:
+            bible_info = [BibleInfo(*row, bible_pk=primary_key) for row in rows]
+        else:
+            job = CrawlJob(catalog.bible_num_of(primary_key), primary_key, chapter_num)
+            loop = asyncio.get_running_loop()
+            bible_info = await loop.run_in_executor(self.__executor, self.engine.fetch, job,
+                                                    catalog.name(primary_key))
+
+        # 새로 알게 된 장의 절 수를 샘플러의 가중치에 반영한다
+        if self.main.sampler:
+            self.main.sampler.add_chapter(primary_key, chapter_num, len(bible_info))
+
+        # 예외처리: 크롤링한 장에 말씀이 없는 경우 db와 색인에 더하지 않는다
+        if not bible_info:
+            return []
+
+        if not rows:
+            self.main.insert_bible_info_into_db(bible_info)
+        self.main.verse_index.add_chapter(bible_info)
+        return self.main.verse_index.chapter(primary_key, chapter_num)
+
+
+if __name__ == '__main__':
+    pass
@@ -1,11 +1,39 @@
+import argparse
+import asyncio
+import io
+import json
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from contextlib import redirect_stdout
 from unittest.mock import patch
+from urllib.parse import quote
+
+import requests
+from lxml import html as lxml_html
 
 import os
 
-from crawler import BibleCrawler
+from background import WARM_AHEAD_PRIORITY, BackgroundFetcher
+from benchmark import build_cases, run_benchmarks, speedups
+from catalog import BookCatalog
+from crawl_engine import ConcurrentCrawler, CrawlJob, LedgerRunner, RateLimiter
+from corpus import Corpus, export_corpus
+from crawler import BibleCrawler, BibleData, BibleInfo
 from database import DB
-from main import Main
+from http_cache import ResponseCache
+from main import Main, book_weights_from_text
+from refresh import chapter_hash
+from sampling import VerseSampler
+from service import VerseService
+from transport import RecordTransport, ReplayTransport, fixture_name
+from verse_index import VerseIndex
+
+
+# 사이트 대신 응답을 돌려줄 fixture 디렉터리
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
 
 
 class CrawlerTest(unittest.TestCase):
@@ -14,7 +42,7 @@ class CrawlerTest(unittest.TestCase):
         크롤러 테스트를 위한 전역변수 설정
         :return: None
         """
-        self.crawler = BibleCrawler()
+        self.crawler = BibleCrawler(transport=ReplayTransport(FIXTURES_DIR))
         self.crawler.bible_num = 1
         self.crawler.primary_key = 101
         self.crawler.chapter_num = 1
@@ -47,6 +75,50 @@ class CrawlerTest(unittest.TestCase):
         requests_item = self.crawler.requests_from_catholic_goodnews()
         self.assertEqual(requests_item.status_code, 200)
 
+    def test_session_is_reused(self):
+        """
+        목록 페이지와 본문 페이지 요청이 재시도 정책을 가진 세션 하나를 함께 쓰는지 테스트
+        :return: None
+        """
+        # transport 없이 세션을 쓰되, 세션의 요청은 fixture로 대신한다
+        self.crawler.transport = None
+        replay = ReplayTransport(FIXTURES_DIR)
+        patcher = patch.object(requests.Session, 'get', side_effect=lambda url, **kwargs: replay.get(url, **kwargs))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.crawler.commit = False
+        self.crawler.requests_from_catholic_goodnews()
+        session = self.crawler.session
+
+        self.crawler.commit = True
+        self.crawler.requests_from_catholic_goodnews()
+        self.assertIs(self.crawler.session, session)
+
+        adapter = session.get_adapter('http://maria.catholic.or.kr')
+        self.assertEqual(adapter.max_retries.total, self.crawler.retries)
+
+    def test_session_is_created_once_across_threads(self):
+        """
+        여러 스레드가 동시에 처음 요청해도 세션을 하나만 만드는지 테스트
+        :return: None
+        """
+        create_session = self.crawler.create_session
+
+        def slow_create_session():
+            time.sleep(0.05)
+            return create_session()
+
+        with patch.object(self.crawler, 'create_session', side_effect=slow_create_session) as create_mock:
+            threads = [threading.Thread(target=self.crawler.shared_session) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(create_mock.call_count, 1)
+        self.assertIsInstance(self.crawler.session, requests.Session)
+
     def test_soup_is_exist(self):
         """
         BeautifulSoup 객체가 정상적으로 생성되는지 테스트
@@ -156,6 +228,20 @@ class CrawlerTest(unittest.TestCase):
         bible_data_new = self.crawler.make_bible_data()
         self.assertEqual(len(bible_data_new), 27)
 
+    def test_make_bible_data_fetches_list_page_once(self):
+        """
+        make_bible_data가 목록 페이지를 한 번만 내려받아 파싱하는지 테스트
+        :return: None
+        """
+        self.crawler.commit = False
+        self.crawler.bible_num = 1
+
+        with patch.object(self.crawler, 'requests_from_catholic_goodnews',
+                          wraps=self.crawler.requests_from_catholic_goodnews) as requests_mock:
+            self.crawler.make_bible_data()
+            self.crawler.make_bible_data()
+        self.assertEqual(requests_mock.call_count, 1)
+
     # --- 성경 정보가 결정된 이후 본문 크롤링 --- #
 
     def test_read_contents_is_exist(self):
@@ -202,6 +288,69 @@ class CrawlerTest(unittest.TestCase):
         bible_info = self.crawler.make_bible_info(conn)
         self.assertEqual(len(bible_info), 31)
 
+    def test_make_bible_info_fetches_read_page_once(self):
+        """
+        make_bible_info가 본문 페이지를 한 번만 내려받는지, 절과 본문이 짝지어지는지 테스트
+        :return: None
+        """
+        self.crawler.commit = False
+        self.crawler.make_bible_data()
+
+        conn = DB().create_db_connection()
+
+        self.crawler.commit = True
+        with patch.object(self.crawler, 'requests_from_catholic_goodnews',
+                          wraps=self.crawler.requests_from_catholic_goodnews) as requests_mock:
+            bible_info = self.crawler.make_bible_info(conn)
+        self.assertEqual(requests_mock.call_count, 1)
+        self.assertEqual(bible_info[0].paragraph_num, '1')
+        self.assertEqual(bible_info[-1].paragraph_num, '31')
+
+    def test_lxml_parser_matches_soup_parser(self):
+        """
+        lxml 파서가 soup 파서와 같은 성경 데이터와 본문 정보를 만드는지 테스트
+        :return: None
+        """
+        lxml_crawler = BibleCrawler(transport=ReplayTransport(FIXTURES_DIR), parser='lxml')
+        for bible_num in (1, 2):
+            self.crawler.bible_num = bible_num
+            lxml_crawler.bible_num = bible_num
+            self.assertEqual(lxml_crawler.make_bible_data(), self.crawler.make_bible_data())
+
+        self.assertEqual(lxml_crawler.fetch_bible_info(1, 101, 1, '창세'),
+                         self.crawler.fetch_bible_info(1, 101, 1, '창세'))
+
+    def test_lxml_parser_follows_soup_selector(self):
+        """
+        lxml 파서가 soup 선택자처럼 #container와 .type3 없이도 목록을 찾고, 장 수가 없는 행은 ValueError를 내는지 테스트
+        :return: None
+        """
+        with open(os.path.join(FIXTURES_DIR, 'bible_list_m2.html'), encoding='utf-8') as f:
+            page = f.read().replace('<div id="container">', '<div>').replace('<div class="type3">', '<div>')
+
+        self.crawler.bible_num = 2
+        expected = self.crawler.make_bible_data()
+        lxml_crawler = BibleCrawler(transport=ReplayTransport(FIXTURES_DIR), parser='lxml')
+        lxml_crawler.bible_num = 2
+        with patch.object(lxml_crawler, 'tree_from_requests', return_value=lxml_html.document_fromstring(page)):
+            self.assertEqual(lxml_crawler.make_bible_data(), expected)
+
+        lxml_crawler.list_data.clear()
+        broken = lxml_html.document_fromstring(page.replace('총 ', '모두 '))
+        with patch.object(lxml_crawler, 'tree_from_requests', return_value=broken):
+            with self.assertRaises(ValueError):
+                lxml_crawler.make_bible_data()
+
+    def test_unknown_parser(self):
+        """
+        알 수 없는 파서를 고르면 ValueError가 나는지 테스트
+        :return: None
+        """
+        with self.assertRaises(ValueError):
+            BibleCrawler(parser='html5lib')
+        with self.assertRaises(ValueError):
+            self.crawler.parser = 'html5lib'
+
     def tearDown(self):
         """
         테스트 끝난 뒤 변수들 초기화
@@ -220,6 +369,7 @@ class MainTest(unittest.TestCase):
         :return:
         """
         self.main = Main()
+        self.main.transport = ReplayTransport(FIXTURES_DIR)
 
     def test_make_random_number(self):
         """
@@ -236,7 +386,9 @@ class MainTest(unittest.TestCase):
         랜덤 메시지 생성 함수가 잘 작동하는지 테스트
         :return:
         """
-        self.main.make_random_number()
+        # fixture에는 창세기 1장만 있으므로 항상 첫 번째 성경책의 첫 장을 뽑는다
+        with patch('main.random.randint', side_effect=lambda a, b: a):
+            self.main.make_random_number()
         self.main.commit = True
         message = self.main.get_message()
 
@@ -257,6 +409,163 @@ class MainTest(unittest.TestCase):
             stacks = self.main.start_menu()
         self.assertEqual(stacks, expected_stacks[0])
 
+    def test_start_menu_loops_without_recursion(self):
+        """
+        여러 번 사탕을 받아도 재귀 없이 반복문으로 처리하고, 테이블 검사는 한 번만 하는지 테스트
+        :return: None
+        """
+        user_input = ['go'] * 1500 + ['wrong', 'q']
+        with patch('builtins.input', side_effect=user_input), \
+                patch.object(self.main, 'make_random_number'), \
+                patch.object(self.main, 'get_message') as message_mock, \
+                patch.object(self.main, 'search_data_table') as table_mock:
+            stacks = self.main.start_menu()
+
+        self.assertFalse(stacks)
+        self.assertEqual(message_mock.call_count, 1500)
+        self.assertEqual(table_mock.call_count, 1)
+
+    def test_start_menu_reads_non_interactive_inputs(self):
+        """
+        입력값의 이터러블을 받으면 input 없이 처리하고, 입력이 끝나면 종료하는지 테스트
+        :return: None
+        """
+        with patch('builtins.input') as input_mock, \
+                patch.object(self.main, 'make_random_number'), \
+                patch.object(self.main, 'get_message') as message_mock, \
+                patch.object(self.main, 'search_data_table'):
+            stacks = self.main.start_menu(inputs=['go\n', 'go\n'])
+
+        self.assertFalse(stacks)
+        self.assertEqual(message_mock.call_count, 2)
+        input_mock.assert_not_called()
+
+    def test_draw_streams_jsonl(self):
+        """
+        draw가 말씀을 count개 뽑아 한 줄에 하나씩 jsonl로 쓰고, 성경책 목록은 한 번만 읽는지 테스트
+        :return: None
+        """
+        self.main.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.main.search_data_table()
+        self.main.insert_bible_data_into_db({101: BibleData(books_name='창세', chapters_count=1)})
+        self.main.insert_bible_info_into_db([BibleInfo('창세', 1, '1', '한처음에', 101)])
+
+        stream = io.StringIO()
+        with patch('main.random.randint', side_effect=lambda a, b: a), \
+                patch.object(self.main, 'load_catalog', wraps=self.main.load_catalog) as catalog_mock, \
+                patch.object(self.main, 'search_bible_data_from_db') as data_mock:
+            drawn_count = self.main.draw(3, output_format='jsonl', stream=stream)
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(drawn_count, 3)
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['text'], '한처음에')
+        self.assertEqual(catalog_mock.call_count, 1)
+        data_mock.assert_not_called()
+
+    def test_draw_uses_verse_index(self):
+        """
+        색인에 올라간 장은 db를 다시 검색하지 않고 뽑는지 테스트
+        :return: None
+        """
+        self.main.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.main.search_data_table()
+        self.main.insert_bible_data_into_db({101: BibleData(books_name='창세', chapters_count=1)})
+        self.main.insert_bible_info_into_db([BibleInfo('창세', 1, '1', '한처음에', 101)])
+
+        with patch('main.random.randint', side_effect=lambda a, b: a), \
+                patch.object(self.main, 'search_bible_info_from_db') as info_mock:
+            drawn = list(self.main.draw_messages(5))
+
+        self.assertEqual(len(drawn), 5)
+        self.assertEqual(drawn[0].texts, '한처음에')
+        info_mock.assert_not_called()
+
+    def test_verse_from_index_redraws_empty_chapter(self):
+        """
+        가져온 장에 말씀이 없다면 다른 장을 다시 뽑고, 끝내 뽑지 못하면 LookupError를 내는지 테스트
+        :return: None
+        """
+        self.main.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.main.search_data_table()
+        self.main.primary_key, self.main.chapter_num = 101, 2
+
+        def redraw():
+            self.main.primary_key, self.main.chapter_num = 147, 1
+
+        chapter = [BibleInfo('마태', 1, '1', '아브라함의 자손', 147)]
+        with patch.object(self.main, 'bible_info_for_chapter', side_effect=[[], chapter]), \
+                patch.object(self.main, 'make_random_number', side_effect=redraw) as redraw_mock:
+            verse = self.main.verse_from_index()
+        self.assertEqual((verse.bible_pk, verse.texts), (147, '아브라함의 자손'))
+        self.assertEqual(redraw_mock.call_count, 1)
+
+        self.main.primary_key, self.main.chapter_num = 101, 2
+        with patch.object(self.main, 'bible_info_for_chapter', return_value=[]), \
+                patch.object(self.main, 'make_random_number'):
+            with self.assertRaises(LookupError):
+                self.main.verse_from_index()
+
+    def test_make_random_number_with_sampler(self):
+        """
+        legacy가 아닌 방식은 db의 정보로 만든 샘플러에서 장을 뽑는지 테스트
+        :return: None
+        """
+        self.main.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.main.search_data_table()
+        bible_data = {pk: BibleData(books_name=str(pk), chapters_count=1) for pk in range(101, 174)}
+        self.main.insert_bible_data_into_db(bible_data)
+        self.main.insert_bible_info_into_db([BibleInfo('173', 1, str(paragraph), '본문', 173)
+                                             for paragraph in range(1, 1001)])
+
+        self.main.sampling = 'uniform'
+        with patch('sampling.random.random', return_value=0.99):
+            chapter_num = self.main.make_random_number()
+
+        self.assertEqual((self.main.bible_num, self.main.primary_key, chapter_num), (2, 173, 1))
+
+    def test_prefetch_skips_stored_chapters(self):
+        """
+        prefetch가 모든 장을 저장하고, 다시 실행하면 저장된 장을 건너뛰는지 테스트
+        :return: None
+        """
+        self.main.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+
+        def fetch_bible_info(bible_num, primary_key, chapter_num, books_name):
+            return [BibleInfo(books_name, chapter_num, '1', '본문', primary_key)]
+
+        self.main.catalog = BookCatalog()
+        self.main.catalog.add_book(101, '창세', 2, bible_num=1)
+        self.main.catalog.add_book(147, '마태', 1, bible_num=2)
+        with patch.object(self.main, 'fetch_bible_info', side_effect=fetch_bible_info) as info_mock:
+            self.assertEqual(self.main.prefetch(), 3)
+            with redirect_stdout(io.StringIO()) as stdout:
+                self.assertEqual(self.main.prefetch(), 0)
+        self.assertEqual(info_mock.call_count, 3)
+        self.assertIn('장부: 완료 3개, 대기 0개, 실패 0개', stdout.getvalue())
+        self.assertEqual(self.main.search_stored_books_from_db(), {101, 147})
+
+    def test_prefetch_raises_when_ledger_write_fails(self):
+        """
+        장부에 작업을 더하지 못하면 크롤링하지 않고 예외를 일으키는지 테스트
+        :return: None
+        """
+        self.main.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+
+        self.main.catalog = BookCatalog()
+        self.main.catalog.add_book(101, '창세', 2, bible_num=1)
+        with patch.object(self.main, 'enqueue_crawl_jobs', return_value=sqlite3.OperationalError('locked')), \
+                patch.object(self.main, 'fetch_bible_info') as info_mock:
+            with self.assertRaises(sqlite3.OperationalError):
+                self.main.prefetch()
+        info_mock.assert_not_called()
+
 
 class DBTest(unittest.TestCase):
     def setUp(self):
@@ -264,7 +573,7 @@ class DBTest(unittest.TestCase):
         self.database.db_name = 'test.db'
         self.conn = self.database.create_db_connection()
 
-        self.crawler = BibleCrawler()
+        self.crawler = BibleCrawler(transport=ReplayTransport(FIXTURES_DIR))
 
     # --- db 및 테이블 생성 함수 ---#
 
@@ -308,6 +617,67 @@ class DBTest(unittest.TestCase):
         self.assertEqual(table_list[0][0], 'bible_data')
         self.assertEqual(table_list[1][0], 'bible_info')
 
+    def test_migrate_data_table(self):
+        """
+        예전 스키마의 db가 중복 없이 새 스키마로 옮겨지는지 테스트
+        :return: None
+        """
+        # 예전 스키마: name으로 연결되고 중복 row가 쌓이던 테이블
+        cursor = self.conn.cursor()
+        cursor.executescript(""" CREATE TABLE bible_data (
+                                 id INTEGER PRIMARY KEY,
+                                 bible_pk INTEGER NOT NULL,
+                                 name TEXT NOT NULL,
+                                 chapter_count INTEGER NOT NULL);
+                                 CREATE TABLE bible_info (
+                                 id INTEGER PRIMARY KEY,
+                                 name TEXT NOT NULL,
+                                 chapter_num INTEGER NOT NULL,
+                                 paragraph_num INTEGER NOT NULL,
+                                 texts TEXT NOT NULL);
+                                 INSERT INTO bible_data(bible_pk, name, chapter_count)
+                                 VALUES (101, '창세', 50), (101, '창세', 50), (147, '마태', 28);
+                                 INSERT INTO bible_info(name, chapter_num, paragraph_num, texts)
+                                 VALUES ('창세', 1, 1, '본문'), ('창세', 1, 2, '본문'), ('창세', 1, 1, '본문'),
+                                 ('없는책', 1, 1, '본문'); """)
+
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.assertIsNone(self.database.search_data_table())
+        self.assertIn('bible_info 1개는 옮기지 않았습니다', stdout.getvalue())
+
+        self.assertEqual(cursor.execute(""" PRAGMA user_version; """).fetchone()[0], 1)
+        self.assertEqual(len(cursor.execute(""" SELECT * FROM bible_data; """).fetchall()), 2)
+        self.assertEqual(len(self.database.search_bible_info_from_db(101, 1)), 2)
+
+    def test_migrate_data_table_rolls_back(self):
+        """
+        이전이 중간에 실패하면 예전 테이블이 그대로 남는지 테스트
+        :return: None
+        """
+        # 예전 스키마지만 bible_info에 texts 열이 없어 본문을 옮기다 실패한다
+        cursor = self.conn.cursor()
+        cursor.executescript(""" CREATE TABLE bible_data (
+                                 id INTEGER PRIMARY KEY,
+                                 bible_pk INTEGER NOT NULL,
+                                 name TEXT NOT NULL,
+                                 chapter_count INTEGER NOT NULL);
+                                 CREATE TABLE bible_info (
+                                 id INTEGER PRIMARY KEY,
+                                 name TEXT NOT NULL,
+                                 chapter_num INTEGER NOT NULL,
+                                 paragraph_num INTEGER NOT NULL);
+                                 INSERT INTO bible_data(bible_pk, name, chapter_count) VALUES (101, '창세', 50); """)
+
+        error = self.database.search_data_table()
+
+        self.assertIsInstance(error, sqlite3.Error)
+        self.assertFalse(self.conn.in_transaction)
+        self.assertEqual(cursor.execute(""" PRAGMA user_version; """).fetchone()[0], 0)
+        tables = [row[0] for row in cursor.execute(""" SELECT name FROM sqlite_master WHERE type='table'
+                                                        ORDER BY name; """)]
+        self.assertEqual(tables, ['bible_data', 'bible_info'])
+        self.assertEqual(cursor.execute(""" SELECT id, bible_pk FROM bible_data; """).fetchall(), [(1, 101)])
+
     # --- 데이터 삽입 함수 --- #
 
     def test_insert_bible_data_into_db(self):
@@ -342,6 +712,12 @@ class DBTest(unittest.TestCase):
         row_list = [row for row in result]
         self.assertEqual(len(row_list), 73)  # 46 + 27 = 73 이므로
 
+        # 같은 bible_data를 다시 넣어도 row가 늘어나지 않는다
+        self.database.insert_bible_data_into_db(self.crawler.bible_data)
+        result = cursor.execute(""" SELECT * FROM bible_data; """)
+        row_list = [row for row in result]
+        self.assertEqual(len(row_list), 73)
+
     def test_insert_bible_info_into_db(self):
         """
         bible_info가 db에 잘 들어가는지 테스트
@@ -375,6 +751,53 @@ class DBTest(unittest.TestCase):
         # 결과값이 창세기 장 수 31개와 일치하는가
         self.assertEqual(len(row_list), 31)
 
+        # 같은 bible_info를 다시 넣어도 row가 늘어나지 않는다
+        self.database.insert_bible_info_into_db(bible_info)
+        result = cursor.execute(""" SELECT * FROM bible_info; """)
+        row_list = [row for row in result]
+        self.assertEqual(len(row_list), 31)
+
+    def test_insert_bible_info_batch_into_db(self):
+        """
+        여러 장의 bible_info가 트랜잭션 하나로 db에 잘 들어가는지 테스트
+        :return: None
+        """
+        bible_info_batch = (
+            [BibleInfo('창세', chapter, str(paragraph), '본문', 101) for paragraph in range(1, 4)]
+            for chapter in range(1, 3)
+        )
+
+        # sqlite error 테스트 (data_table이 없을 경우)
+        error = self.database.insert_bible_info_batch_into_db(bible_info_batch)
+        self.assertEqual(error.args[0], 'no such table: bible_info')
+
+        # 정상 테스트 시작: 테이블 생성
+        self.database.create_data_table()
+        self.database.set_bulk_load_mode(True)
+
+        bible_info_batch = (
+            [BibleInfo('창세', chapter, str(paragraph), '본문', 101) for paragraph in range(1, 4)]
+            for chapter in range(1, 3)
+        )
+        self.database.insert_bible_info_batch_into_db(bible_info_batch)
+        self.database.set_bulk_load_mode(False)
+
+        cursor = self.conn.cursor()
+        result = cursor.execute(""" SELECT * FROM bible_info; """)
+        row_list = [row for row in result]
+        self.assertEqual(len(row_list), 6)
+
+    def test_bulk_load_mode_restores_journal_mode(self):
+        """
+        대량 적재 모드를 끄면 켜기 전의 저널 모드로 돌아가는지 테스트
+        :return: None
+        """
+        self.conn.execute(""" PRAGMA journal_mode=TRUNCATE; """)
+        self.database.set_bulk_load_mode(True)
+        self.assertEqual(self.conn.execute(""" PRAGMA journal_mode; """).fetchone()[0], 'wal')
+        self.database.set_bulk_load_mode(False)
+        self.assertEqual(self.conn.execute(""" PRAGMA journal_mode; """).fetchone()[0], 'truncate')
+
     # --- 데이터 검색 함수 --- #
 
     def test_search_bible_data_from_db(self):
@@ -450,6 +873,63 @@ class DBTest(unittest.TestCase):
         # 결과값이 창세기 장 수 31개와 일치하는가
         self.assertEqual(len(result_item), 31)
 
+        # 값은 명령문에 끼워 넣지 않고 바인딩하므로 sql 구문으로 해석되지 않는다
+        result_injected = self.database.search_bible_info_from_db('101 OR 1=1', 1)
+        self.assertEqual(result_injected, None)
+
+    def test_search_verses_from_db(self):
+        """
+        전문 검색 색인이 처음 검색할 때 만들어지고, 이후 bible_info의 변경을 따라가는지 테스트
+        :return: None
+        """
+        self.database.search_data_table()
+        self.database.insert_bible_data_into_db({101: BibleData(books_name='창세', chapters_count=50)})
+        self.database.insert_bible_info_into_db([
+            BibleInfo('창세', 1, '1', '한처음에 하느님께서 하늘과 땅을 창조하셨다.', 101),
+            BibleInfo('창세', 1, '2', '땅은 아직 꼴을 갖추지 못하고 비어 있었다.', 101),
+        ])
+
+        # 이미 저장된 말씀도 색인된다
+        result = self.database.search_verses_from_db('하느님께서')
+        self.assertEqual(result, [('창세', 1, 1, '한처음에 하느님께서 하늘과 땅을 창조하셨다.', 101)])
+
+        # 색인을 만든 뒤에 바뀐 말씀도 트리거로 반영된다
+        self.database.insert_bible_info_into_db([
+            BibleInfo('창세', 1, '2', '땅은 아직 꼴을 갖추지 못하고 하느님께서 보셨다.', 101),
+            BibleInfo('창세', 1, '3', '하느님께서 말씀하시기를 "빛이 생겨라."', 101),
+        ])
+        self.assertEqual(len(self.database.search_verses_from_db('하느님께서')), 3)
+        self.assertEqual(self.database.search_verses_from_db('비어 있었다'), [])
+        self.assertEqual(len(self.database.search_verses_from_db('"빛이')), 1)
+
+        # 세 글자보다 짧은 검색어는 LIKE로 찾는다
+        self.assertEqual([row[2] for row in self.database.search_verses_from_db('땅')], [1, 2])
+        self.assertEqual(self.database.search_verses_from_db('%'), [])
+
+    def test_search_index_keeps_lettered_paragraphs(self):
+        """
+        숫자로 바꾸면 같아지는 '1'절과 '1ㄱ'절이 색인을 만든 뒤에도 함께 저장되고 검색되는지 테스트
+        :return: None
+        """
+        self.database.search_data_table()
+        self.database.insert_bible_data_into_db({101: BibleData(books_name='창세', chapters_count=50)})
+        self.database.insert_bible_info_into_db([BibleInfo('창세', 1, '2', '땅은 비어 있었다.', 101)])
+        self.assertEqual(self.database.search_verses_from_db('비어 있'), [('창세', 1, 2, '땅은 비어 있었다.', 101)])
+
+        self.database.insert_bible_info_into_db([
+            BibleInfo('창세', 1, '1', '한처음에 하느님께서 창조하셨다.', 101),
+            BibleInfo('창세', 1, '1ㄱ', '하느님께서 보시니 좋았다.', 101),
+        ])
+        self.assertEqual(sorted(str(row[2]) for row in self.database.search_verses_from_db('하느님께서')),
+                         ['1', '1ㄱ'])
+
+        # 장을 지우면 색인과 대응표에서도 빠진다
+        self.database.create_hash_table()
+        self.database.replace_chapter_in_db([BibleInfo('창세', 1, '1ㄱ', '빛이 생겼다.', 101)], 'hash', 0)
+        self.assertEqual(self.database.search_verses_from_db('하느님께서'), [])
+        self.assertEqual(self.database.search_verses_from_db('빛이 생'), [('창세', 1, '1ㄱ', '빛이 생겼다.', 101)])
+        self.assertEqual(self.database.query_from_db('search_table_exists').fetchall(), [('bible_fts_rows',)])
+
     def tearDown(self):
         """
         테스트가 끝나면 test.db를 삭제한다
@@ -458,5 +938,1108 @@ class DBTest(unittest.TestCase):
         os.remove('test.db')
 
 
+class BookCatalogTest(unittest.TestCase):
+    def setUp(self):
+        """
+        목록 페이지를 fixture로 재생하는 크롤러와 test.db 준비
+        :return: None
+        """
+        self.database = DB()
+        self.database.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.database.search_data_table()
+        self.crawler = BibleCrawler(transport=ReplayTransport(FIXTURES_DIR))
+
+    def test_load_crawls_each_list_page_once(self):
+        """
+        db가 비어 있으면 두 목록 페이지를 한 번씩만 크롤링해 73권을 채우고 db에도 저장하는지 테스트
+        :return: None
+        """
+        with patch.object(self.crawler, 'requests_from_catholic_goodnews',
+                          wraps=self.crawler.requests_from_catholic_goodnews) as requests_mock:
+            catalog = BookCatalog().load(self.database, self.crawler, snapshot_path=None)
+
+        self.assertEqual(requests_mock.call_count, 2)
+        self.assertEqual(len(catalog), 73)
+        self.assertEqual(catalog.name(101), '창세')
+        self.assertEqual(catalog.chapters_count(173), 22)
+        self.assertEqual(len(self.database.search_stored_books_from_db()), 73)
+
+    def test_load_from_db_without_crawling(self):
+        """
+        db에 73권이 모두 있으면 크롤링하지 않는지 테스트
+        :return: None
+        """
+        BookCatalog().load(self.database, self.crawler, snapshot_path=None)
+
+        with patch.object(self.crawler, 'make_bible_data') as crawl_mock:
+            catalog = BookCatalog().load(self.database, self.crawler, snapshot_path=None)
+
+        crawl_mock.assert_not_called()
+        self.assertEqual(len(catalog), 73)
+        self.assertEqual(catalog.bible_num_of(147), 2)
+
+    def test_load_from_bundled_snapshot(self):
+        """
+        db가 비어 있어도 함께 배포한 스냅숏으로 크롤링 없이 73권을 채우는지 테스트
+        :return: None
+        """
+        with patch.object(self.crawler, 'make_bible_data') as crawl_mock:
+            catalog = BookCatalog().load(self.database, self.crawler)
+
+        crawl_mock.assert_not_called()
+        self.assertEqual(len(catalog), 73)
+        self.assertEqual(len(catalog.pks(1)), 46)
+        self.assertEqual(len(catalog.pks(2)), 27)
+        self.assertEqual(len(self.database.search_stored_books_from_db()), 73)
+
+    def test_snapshot_matches_list_pages(self):
+        """
+        스냅숏이 목록 페이지와 같은지, 장 수가 바뀌면 다른 곳을 찾아내는지 테스트
+        :return: None
+        """
+        crawled = BookCatalog().crawl(self.crawler)
+        self.assertEqual(BookCatalog().load_snapshot().differences(crawled), [])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bible_catalog.json')
+            crawled.add_book(173, '묵시', 23, bible_num=2)
+            crawled.save_snapshot(path)
+            self.assertEqual(len(BookCatalog().load_snapshot(path).differences(BookCatalog().crawl(self.crawler))), 1)
+
+
+class VerseIndexTest(unittest.TestCase):
+    def setUp(self):
+        """
+        색인 테스트를 위해 두 장이 담긴 test.db 설정
+        :return: None
+        """
+        self.database = DB()
+        self.database.db_name = 'test.db'
+        self.database.search_data_table()
+        self.database.insert_bible_data_into_db({
+            101: BibleData(books_name='창세', chapters_count=50),
+            147: BibleData(books_name='마태', chapters_count=28),
+        })
+        self.database.insert_bible_info_batch_into_db([
+            [BibleInfo('창세', 1, str(paragraph), f'창세 1-{paragraph}', 101) for paragraph in range(1, 4)],
+            [BibleInfo('마태', 2, str(paragraph), f'마태 2-{paragraph}', 147) for paragraph in range(1, 3)],
+        ])
+        self.verse_index = VerseIndex().load_from_db(self.database)
+
+    def test_load_from_db(self):
+        """
+        db의 모든 절이 장 단위 구간으로 색인되는지 테스트
+        :return: None
+        """
+        self.assertEqual(len(self.verse_index), 5)
+        self.assertEqual(self.verse_index.chapters, {(101, 1): (0, 3), (147, 2): (3, 5)})
+        self.assertEqual([info.texts for info in self.verse_index.chapter(147, 2)], ['마태 2-1', '마태 2-2'])
+
+    def test_random_verse(self):
+        """
+        장이 주어지면 그 장에서만, 없다면 전체에서 절을 뽑는지 테스트
+        :return: None
+        """
+        for _ in range(20):
+            verse = self.verse_index.random_verse(147, 2)
+            self.assertEqual((verse.books_name, verse.chapter_num), ('마태', 2))
+        self.assertIsNotNone(self.verse_index.random_verse())
+
+    def test_random_verse_without_verses(self):
+        """
+        색인에 없는 장이나 빈 색인에서 뽑으면 LookupError를 내는지 테스트
+        :return: None
+        """
+        with self.assertRaises(LookupError):
+            self.verse_index.random_verse(101, 9)
+        with self.assertRaises(LookupError):
+            VerseIndex().random_verse()
+
+    def test_add_chapter(self):
+        """
+        새로 가져온 장이 색인 끝에 더해지는지 테스트
+        :return: None
+        """
+        self.verse_index.add_chapter([BibleInfo('창세', 2, '1', '창세 2-1', 101)])
+        self.assertTrue(self.verse_index.has_chapter(101, 2))
+        self.assertEqual(self.verse_index.random_verse(101, 2).texts, '창세 2-1')
+        self.assertEqual(len(self.verse_index), 6)
+
+    def tearDown(self):
+        """
+        테스트가 끝나면 test.db를 삭제한다
+        :return: None
+        """
+        self.database.conn.close()
+        os.remove('test.db')
+
+
+class CorpusTest(unittest.TestCase):
+    def setUp(self):
+        """
+        test.db에 성경책 두 권의 말씀을 넣고 말씀 묶음 파일로 내보낸다
+        :return: None
+        """
+        self.database = DB()
+        self.database.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.database.search_data_table()
+        self.database.insert_bible_data_into_db({
+            101: BibleData(books_name='창세', chapters_count=50),
+            147: BibleData(books_name='마태', chapters_count=28),
+        })
+        self.database.insert_bible_info_into_db(
+            [BibleInfo('창세', 1, str(paragraph), f'창세 1-{paragraph}', 101) for paragraph in range(1, 4)]
+            + [BibleInfo('창세', 2, '1', '창세 2-1', 101), BibleInfo('마태', 1, '1', '마태 1-1', 147)]
+        )
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, 'bible.corpus')
+        self.verse_count = export_corpus(self.database, self.path)
+
+    def test_corpus_matches_db(self):
+        """
+        메모리 맵으로 읽은 절이 db의 말씀과 같은지 테스트
+        :return: None
+        """
+        with Corpus(self.path) as corpus:
+            self.assertEqual(self.verse_count, 5)
+            self.assertEqual(len(corpus), 5)
+            self.assertEqual(corpus.names, {101: '창세', 147: '마태'})
+            self.assertEqual(corpus.verse(0), BibleInfo('창세', 1, '1', '창세 1-1', 101))
+            self.assertEqual([info.texts for info in corpus.chapter(101, 1)], ['창세 1-1', '창세 1-2', '창세 1-3'])
+            self.assertEqual(corpus.random_verse(147, 1).texts, '마태 1-1')
+            self.assertTrue(corpus.has_chapter(101, 2))
+            self.assertFalse(corpus.has_chapter(101, 3))
+            with self.assertRaises(IndexError):
+                corpus.verse(5)
+
+    def test_corpus_rejects_other_files(self):
+        """
+        말씀 묶음 파일이 아니면 ValueError가 나는지 테스트
+        :return: None
+        """
+        with open(self.path, 'r+b') as corpus_file:
+            corpus_file.write(b'NOTACORP')
+        with self.assertRaises(ValueError):
+            Corpus(self.path)
+
+
+class VerseSamplerTest(unittest.TestCase):
+    def setUp(self):
+        """
+        샘플러 테스트를 위한 성경책 설정: 창세 2장, 마태 1장
+        :return: None
+        """
+        self.books = {101: 2, 147: 1}
+
+    def make_sampler(self, strategy, book_weights=None):
+        sampler = VerseSampler(strategy, book_weights)
+        for bible_pk, chapters_count in self.books.items():
+            sampler.add_book(bible_pk, chapters_count)
+        return sampler
+
+    def test_legacy_weights(self):
+        """
+        legacy 방식이 성경 50:50, 성경책 균등, 장 균등의 확률을 재현하는지 테스트
+        :return: None
+        """
+        weights = self.make_sampler('legacy').weights()
+        self.assertEqual(weights, {(101, 1): 0.25, (101, 2): 0.25, (147, 1): 0.5})
+
+    def test_uniform_weights_follow_verse_counts(self):
+        """
+        uniform 방식이 절 수에 비례하고, 절 수를 모르는 장은 알려진 장의 평균을 쓰는지 테스트
+        :return: None
+        """
+        sampler = self.make_sampler('uniform')
+        sampler.add_chapter(101, 1, 10)
+        sampler.add_chapter(101, 2, 30)
+        self.assertEqual(sampler.weights(), {(101, 1): 10, (101, 2): 30, (147, 1): 20})
+
+        # 절 수를 새로 알게 되면 가중치 테이블이 갱신된다
+        sampler.add_chapter(147, 1, 50)
+        self.assertEqual(sampler.weights()[(147, 1)], 50)
+
+    def test_weighted_weights(self):
+        """
+        weighted 방식이 절 수에 성경책 가중치를 곱하는지 테스트
+        :return: None
+        """
+        sampler = self.make_sampler('weighted', book_weights_from_text('147=3'))
+        for key in ((101, 1), (101, 2), (147, 1)):
+            sampler.add_chapter(*key, 10)
+        self.assertEqual(sampler.weights(), {(101, 1): 10, (101, 2): 10, (147, 1): 30})
+
+    def test_draw_bisects_cumulative_weights(self):
+        """
+        draw가 누적 가중치 테이블을 이분 탐색해 장을 고르는지 테스트
+        :return: None
+        """
+        sampler = self.make_sampler('uniform')
+        for key, verse_count in (((101, 1), 1), ((101, 2), 1), ((147, 1), 98)):
+            sampler.add_chapter(*key, verse_count)
+
+        with patch('sampling.random.random', side_effect=[0.005, 0.015, 0.5, 0.999]):
+            drawn = [sampler.draw() for _ in range(4)]
+        self.assertEqual(drawn, [(101, 1), (101, 2), (147, 1), (147, 1)])
+
+    def test_draw_without_weight(self):
+        """
+        모든 장의 가중치가 0이면 draw가 ValueError를 내는지 테스트
+        :return: None
+        """
+        sampler = self.make_sampler('weighted', book_weights_from_text('101=0,147=0'))
+        with self.assertRaises(ValueError):
+            sampler.draw()
+
+    def test_book_weights_from_text_rejects_bad_pairs(self):
+        """
+        음수 가중치와 잘못된 형식의 쌍은 argparse.ArgumentTypeError를 내는지 테스트
+        :return: None
+        """
+        self.assertEqual(book_weights_from_text(' 101=2, 147=0.5,'), {101: 2.0, 147: 0.5})
+        for text in ('101=-3', '101', '101=2=3', 'a=1', '101=x', '101=inf', '101=nan'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                book_weights_from_text(text)
+
+    def test_top_chapters(self):
+        """
+        가중치가 큰 장부터 꺼내고, 건너뛸 장은 빼는지 테스트
+        :return: None
+        """
+        sampler = self.make_sampler('uniform')
+        for key, verse_count in (((101, 1), 5), ((101, 2), 30), ((147, 1), 20)):
+            sampler.add_chapter(*key, verse_count)
+
+        self.assertEqual(sampler.top_chapters(2), [(101, 2), (147, 1)])
+        self.assertEqual(sampler.top_chapters(2, exclude={(101, 2)}), [(147, 1), (101, 1)])
+
+
+class ConcurrentCrawlerTest(unittest.TestCase):
+    def setUp(self):
+        """
+        동시 크롤러 테스트를 위해 네트워크 대신 쓸 가짜 크롤러 설정
+        :return: None
+        """
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+        def fetch_bible_info(bible_num, primary_key, chapter_num, books_name):
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            time.sleep(0.01)
+            with self.lock:
+                self.running -= 1
+            if chapter_num == 3:
+                raise ValueError('fetch failed')
+            return [BibleInfo(books_name, chapter_num, '1', '본문', primary_key)]
+
+        self.crawler = BibleCrawler()
+        patcher = patch.object(self.crawler, 'fetch_bible_info', side_effect=fetch_bible_info)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.jobs = [CrawlJob(1, 101, chapter) for chapter in range(1, 9)]
+        self.books_names = {101: '창세'}
+
+    def test_crawl_respects_max_workers(self):
+        """
+        동시에 실행되는 작업 수가 max_workers를 넘지 않고, 실패한 작업은 error에 담기는지 테스트
+        :return: None
+        """
+        engine = ConcurrentCrawler(self.crawler, max_workers=3)
+        results = list(engine.crawl(self.jobs, self.books_names))
+
+        self.assertEqual(len(results), 8)
+        self.assertLessEqual(self.max_running, 3)
+        failed = [result.job.chapter for result in results if result.error is not None]
+        self.assertEqual(failed, [3])
+
+    def test_crawl_cancels_queued_jobs_when_closed(self):
+        """
+        결과를 다 받기 전에 제너레이터를 닫으면 아직 시작하지 않은 작업은 실행하지 않는지 테스트
+        :return: None
+        """
+        jobs = [CrawlJob(1, 101, chapter) for chapter in range(10, 50)]
+        engine = ConcurrentCrawler(self.crawler, max_workers=2)
+        results = engine.crawl(jobs, self.books_names)
+        next(results)
+        results.close()
+
+        self.assertLess(self.crawler.fetch_bible_info.call_count, len(jobs))
+
+    def test_ledger_runner_writes_from_one_thread(self):
+        """
+        결과가 호출한 스레드에서만 batch_size개씩 db에 쓰이는지 테스트
+        :return: None
+        """
+        database = DB()
+        database.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.addCleanup(lambda: database.conn.close())
+        database.search_data_table()
+        database.enqueue_crawl_jobs(self.jobs, 0)
+
+        writer_threads = set()
+        batch_sizes = []
+        checkpoint_crawl_jobs = database.checkpoint_crawl_jobs
+
+        def checkpoint(bible_info_batch, jobs, now):
+            writer_threads.add(threading.get_ident())
+            batch_sizes.append(len(bible_info_batch))
+            return checkpoint_crawl_jobs(bible_info_batch, jobs, now)
+
+        runner = LedgerRunner(ConcurrentCrawler(self.crawler, max_workers=4), database,
+                              max_attempts=1, backoff=0, batch_size=3)
+        with patch.object(database, 'checkpoint_crawl_jobs', side_effect=checkpoint):
+            stored_count, failed_jobs = runner.run(self.books_names)
+
+        self.assertEqual(stored_count, 7)
+        self.assertEqual(failed_jobs, [CrawlJob(1, 101, 3)])
+        self.assertEqual(writer_threads, {threading.get_ident()})
+        self.assertEqual(batch_sizes, [3, 3, 1])
+
+    def test_ledger_runner_resumes_and_retries(self):
+        """
+        장부에서 끝나지 않은 작업만 이어서 실행하고, 실패한 작업은 max_attempts번까지 다시 시도하는지 테스트
+        :return: None
+        """
+        database = DB()
+        database.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.addCleanup(lambda: database.conn.close())
+        database.search_data_table()
+
+        # 1장은 저장을 마쳤고 2장은 실행 중에 멈춘 장부
+        self.assertEqual(database.enqueue_crawl_jobs(self.jobs, 0), 8)
+        database.mark_crawl_jobs_running(self.jobs[:2], 0)
+        database.checkpoint_crawl_jobs([[BibleInfo('창세', 1, '1', '본문', 101)]], self.jobs[:1], 0)
+
+        runner = LedgerRunner(ConcurrentCrawler(self.crawler, max_workers=4), database, max_attempts=3, backoff=0.01)
+        stored_count, failed_jobs = runner.run(self.books_names)
+
+        self.assertEqual(stored_count, 6)
+        self.assertEqual(failed_jobs, [CrawlJob(1, 101, 3)])
+        self.assertEqual(self.crawler.fetch_bible_info.call_count, 6 + 3)
+        self.assertEqual(database.search_crawl_job_attempts_from_db(CrawlJob(1, 101, 3)), 3)
+        self.assertEqual(database.search_crawl_job_counts_from_db(),
+                         {'pending': 0, 'running': 0, 'done': 7, 'failed': 1})
+
+        # 이미 장부에 있는 작업은 다시 더하지 않고, 실패한 작업은 되돌릴 수 있다
+        self.assertEqual(database.enqueue_crawl_jobs(self.jobs, 0), 0)
+        self.assertEqual(database.reset_failed_crawl_jobs(0), 1)
+        self.assertEqual(database.search_crawl_job_attempts_from_db(CrawlJob(1, 101, 3)), 0)
+
+    def test_ledger_runner_stops_retrying_failed_checkpoints(self):
+        """
+        저장에 실패한 장은 실패로 기록되어 max_attempts번까지만 다시 시도되는지 테스트
+        :return: None
+        """
+        database = DB()
+        database.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.addCleanup(lambda: database.conn.close())
+        database.search_data_table()
+        database.enqueue_crawl_jobs(self.jobs, 0)
+
+        runner = LedgerRunner(ConcurrentCrawler(self.crawler, max_workers=4), database, max_attempts=2, backoff=0)
+        with patch.object(database, 'checkpoint_crawl_jobs', return_value=sqlite3.IntegrityError('constraint failed')):
+            stored_count, failed_jobs = runner.run(self.books_names)
+
+        self.assertEqual(stored_count, 0)
+        self.assertEqual(failed_jobs, self.jobs)
+        self.assertEqual(self.crawler.fetch_bible_info.call_count, 8 * 2)
+        self.assertEqual(database.search_crawl_job_counts_from_db()['failed'], 8)
+
+    def test_ledger_runner_raises_when_running_mark_fails(self):
+        """
+        작업을 running으로 기록하지 못했다면 크롤링하기 전에 예외를 일으키는지 테스트
+        :return: None
+        """
+        database = DB()
+        database.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.addCleanup(lambda: database.conn.close())
+        database.search_data_table()
+        database.enqueue_crawl_jobs(self.jobs, 0)
+
+        runner = LedgerRunner(ConcurrentCrawler(self.crawler, max_workers=4), database)
+        with patch.object(database, 'mark_crawl_jobs_running', return_value=sqlite3.OperationalError('locked')):
+            with self.assertRaises(sqlite3.OperationalError):
+                runner.run(self.books_names)
+
+        self.crawler.fetch_bible_info.assert_not_called()
+
+    def test_ledger_runner_fails_empty_chapters(self):
+        """
+        본문이 비어 있는 장은 done이 아니라 실패로 기록되고,
+        done인데 bible_info에 없는 장은 다시 장부에 더해지는지 테스트
+        :return: None
+        """
+        database = DB()
+        database.db_name = 'test.db'
+        self.addCleanup(os.remove, 'test.db')
+        self.addCleanup(lambda: database.conn.close())
+        database.search_data_table()
+        database.enqueue_crawl_jobs(self.jobs[:2], 0)
+
+        self.crawler.fetch_bible_info.side_effect = lambda *args: []
+        runner = LedgerRunner(ConcurrentCrawler(self.crawler, max_workers=2), database, max_attempts=1, backoff=0)
+        stored_count, failed_jobs = runner.run(self.books_names)
+
+        self.assertEqual(stored_count, 0)
+        self.assertEqual(failed_jobs, self.jobs[:2])
+
+        # 예전 실행이 빈 장을 done으로 남겼다면 다시 실행할 작업으로 되돌린다
+        database.enqueue_crawl_jobs(self.jobs[2:3], 0)
+        database.checkpoint_crawl_jobs([], self.jobs[2:3], 0)
+        self.assertEqual(database.search_crawl_job_counts_from_db()['done'], 1)
+        self.assertEqual(database.enqueue_crawl_jobs(self.jobs[2:3], 0), 1)
+        self.assertEqual(database.search_crawl_job_counts_from_db()['pending'], 1)
+
+    def test_rate_limiter_spaces_requests(self):
+        """
+        rate limiter가 같은 host로 가는 요청 사이의 간격을 지키는지 테스트
+        :return: None
+        """
+        limiter = RateLimiter(rate=50)
+        start_time = time.monotonic()
+        for _ in range(5):
+            limiter.wait('maria.catholic.or.kr')
+        self.assertGreaterEqual(time.monotonic() - start_time, 4 / 50)
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """
+    응답 캐시 테스트: 가짜 세션으로 실제 요청 없이 테스트한다
+    """
+
+    def setUp(self):
+        """
+        임시 디렉터리와 보낸 요청을 기록하는 가짜 세션 준비
+        :return: None
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = temp_dir.name
+        self.url = 'http://maria.catholic.or.kr/bible/read/bible_list.asp'
+        self.sent_headers = []
+        self.status_code = 200
+
+        test = self
+
+        class FakeSession:
+            def get(self, url, params=None, headers=None, **kwargs):
+                test.sent_headers.append(headers)
+                response = requests.Response()
+                response.status_code = test.status_code
+                response.encoding = 'utf-8'
+                response.url = url
+                response._content = f'<html>{params}</html>'.encode('utf-8') if test.status_code == 200 else b''
+                response.headers['ETag'] = '"v1"'
+                return response
+
+        self.session = FakeSession()
+
+    def test_fresh_response_is_served_from_disk(self):
+        """
+        TTL 안에서는 같은 URL과 payload로 다시 요청하지 않는지 테스트
+        :return: None
+        """
+        cache = ResponseCache(self.directory, ttl=60)
+        first = cache.fetch(self.session, self.url, params={'m': 1})
+        second = cache.fetch(self.session, self.url, params={'m': 1})
+        cache.fetch(self.session, self.url, params={'m': 2})
+
+        self.assertEqual(len(self.sent_headers), 2)
+        self.assertEqual(first.text, second.text)
+        self.assertEqual(second.headers['ETag'], '"v1"')
+
+    def test_stale_response_is_revalidated(self):
+        """
+        TTL이 지난 응답은 If-None-Match로 재검증하고, 304라면 저장한 본문을 돌려주는지 테스트
+        :return: None
+        """
+        cache = ResponseCache(self.directory, ttl=0)
+        first = cache.fetch(self.session, self.url, params={'m': 1})
+        self.status_code = 304
+        second = cache.fetch(self.session, self.url, params={'m': 1})
+
+        self.assertEqual(self.sent_headers, [{}, {'If-None-Match': '"v1"'}])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.text, second.text)
+
+    def test_crawler_revalidates_fresh_response(self):
+        """
+        크롤러의 revalidate가 켜져 있으면 TTL 안의 응답도 조건부 요청으로 재검증하는지 테스트
+        :return: None
+        """
+        crawler = BibleCrawler(response_cache=ResponseCache(self.directory, ttl=60), transport=self.session)
+        crawler.requests_from_catholic_goodnews({'m': 1})
+        crawler.revalidate = True
+        crawler.requests_from_catholic_goodnews({'m': 1})
+
+        self.assertEqual(self.sent_headers, [{}, {'If-None-Match': '"v1"'}])
+
+    def test_least_recently_used_response_is_evicted(self):
+        """
+        크기 제한을 넘으면 가장 오래 쓰지 않은 응답부터 지우는지 테스트
+        :return: None
+        """
+        cache = ResponseCache(self.directory, ttl=60, max_bytes=50)
+        cache.fetch(self.session, self.url, params={'m': 1})
+        cache.fetch(self.session, self.url, params={'m': 2})
+
+        # m=1의 본문을 더 최근에 쓴 것으로 만든다
+        body_path, _ = cache.paths_from_key(cache.make_key(self.url, {'m': 2}))
+        os.utime(body_path, (0, 0))
+        cache.fetch(self.session, self.url, params={'m': 1})
+        cache.fetch(self.session, self.url, params={'m': 3})
+
+        self.assertIsNotNone(cache.load(self.url, {'m': 1}))
+        self.assertIsNone(cache.load(self.url, {'m': 2}))
+        self.assertIsNotNone(cache.load(self.url, {'m': 3}))
+
+    def test_store_scans_directory_only_when_full(self):
+        """
+        크기 제한 안에서는 저장할 때마다 디렉터리를 훑지 않고, 넘쳤을 때만 evict하는지 테스트
+        :return: None
+        """
+        cache = ResponseCache(self.directory, ttl=60, max_bytes=200)
+        with patch('http_cache.os.listdir', wraps=os.listdir) as listdir, \
+                patch.object(cache, 'evict', wraps=cache.evict) as evict:
+            for m in range(5):
+                cache.fetch(self.session, self.url, params={'m': m})
+            self.assertEqual((listdir.call_count, evict.call_count), (1, 0))
+
+            # 같은 응답을 덮어쓰면 합이 늘지 않는다
+            cache.fetch(self.session, self.url, params={'m': 0}, revalidate=True)
+            self.assertEqual(evict.call_count, 0)
+
+            for m in range(5, 20):
+                cache.fetch(self.session, self.url, params={'m': m})
+            self.assertGreater(evict.call_count, 0)
+
+        total_bytes = sum(os.path.getsize(os.path.join(self.directory, name))
+                          for name in os.listdir(self.directory) if name.endswith('.body'))
+        self.assertLessEqual(total_bytes, 200)
+
+
+class TransportTest(unittest.TestCase):
+    """
+    fixture를 재생하고 기록하는 transport 테스트
+    """
+
+    def test_fixture_name(self):
+        """
+        URL과 payload로 응답 파일 이름이 만들어지는지 테스트
+        :return: None
+        """
+        url = 'http://maria.catholic.or.kr/bible/read/bible_read.asp'
+        self.assertEqual(fixture_name(url, {'p': 1, 'm': 1, 'n': 101}), 'bible_read_m1_n101_p1.html')
+
+    def test_replay_transport(self):
+        """
+        저장된 응답은 그대로 돌려주고, 없는 응답은 FileNotFoundError를 내는지 테스트
+        :return: None
+        """
+        replay = ReplayTransport(FIXTURES_DIR)
+        url = 'http://maria.catholic.or.kr/bible/read/bible_list.asp'
+        response = replay.get(url, params={'m': 1}, timeout=10)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('창세', response.text)
+        with self.assertRaises(FileNotFoundError):
+            replay.get(url, params={'m': 3})
+
+    def test_record_transport(self):
+        """
+        기록한 응답이 UTF-8로 저장되어 ReplayTransport로 다시 읽히는지 테스트
+        :return: None
+        """
+        class FakeSession:
+            def get(self, url, params=None, **kwargs):
+                response = requests.Response()
+                response.status_code = 200
+                response.encoding = 'euc-kr'
+                response._content = '<html>말씀</html>'.encode('euc-kr')
+                return response
+
+        with tempfile.TemporaryDirectory() as directory:
+            url = 'http://maria.catholic.or.kr/bible/read/bible_list.asp'
+            RecordTransport(directory, FakeSession()).get(url, params={'m': 1})
+            self.assertEqual(ReplayTransport(directory).get(url, params={'m': 1}).text, '<html>말씀</html>')
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_run_benchmarks(self):
+        """
+        두 파서의 추출 함수들이 fixture로 측정되고, 같은 함수끼리 배속이 계산되는지 테스트
+        :return: None
+        """
+        results = run_benchmarks(build_cases(FIXTURES_DIR), number=1, repeat=1)
+        names = {(result.name, result.parser) for result in results}
+
+        self.assertIn(('chapters_from_list_contents[m=2]', 'soup'), names)
+        self.assertIn(('fetch_bible_info[m=2]', 'lxml'), names)
+        self.assertTrue(all(result.seconds > 0 for result in results))
+        self.assertIn(('make_bible_data[m=1]', 'lxml'), speedups(results))
+
+
+class BackgroundFetcherTest(unittest.TestCase):
+    def setUp(self):
+        """
+        백그라운드 갱신 테스트를 위해 마태 2장만 저장된 test.db와 fixture를 재생하는 Main 설정
+        :return: None
+        """
+        self.main = Main()
+        self.main.db_name = 'test.db'
+        self.main.transport = ReplayTransport(FIXTURES_DIR)
+        self.main.catalog = BookCatalog()
+        self.main.catalog.add_book(101, '창세', 50, bible_num=1)
+        self.main.catalog.add_book(147, '마태', 28, bible_num=2)
+        self.main.search_data_table()
+        self.main.insert_bible_data_into_db(self.main.catalog.books)
+        self.main.insert_bible_info_batch_into_db([
+            [BibleInfo('마태', 2, str(paragraph), f'마태 2-{paragraph}', 147) for paragraph in range(1, 3)],
+        ])
+
+    def test_stale_while_revalidate(self):
+        """
+        db에 없는 장을 뽑으면 저장된 말씀을 바로 돌려주고, 그 장은 백그라운드에서 저장되는지 테스트
+        :return: None
+        """
+        self.main.background_fetcher = BackgroundFetcher(self.main, 'test.db').start()
+        self.main.stale_while_revalidate = True
+        self.main.primary_key, self.main.chapter_num = 101, 1
+
+        stale = self.main.verse_from_index()
+        self.assertEqual((stale.bible_pk, stale.chapter_num), (147, 2))
+
+        self.main.background_fetcher.join()
+        fresh = self.main.verse_from_index()
+        self.assertEqual((fresh.bible_pk, fresh.chapter_num), (101, 1))
+        self.assertEqual(len(self.main.search_bible_info_from_db(101, 1)), 31)
+        self.main.stop_background_fetcher()
+
+    def test_warm_ahead(self):
+        """
+        가중치가 가장 큰 미저장 장을 미리 가져오고, 가져오지 못한 장은 다시 넣지 않는지 테스트
+        :return: None
+        """
+        self.main.sampling = 'weighted'
+        self.main.book_weights = {147: 10}
+        self.main.warm_ahead_count = 2
+        self.main.background_fetcher = BackgroundFetcher(self.main, 'test.db').start()
+
+        # fixture에는 마태 1장만 있으므로 마태 3장은 실패한다
+        self.assertEqual(self.main.warm_ahead(), 2)
+        self.main.background_fetcher.join()
+        self.assertEqual(self.main.absorb_background_results(), 1)
+        self.assertTrue(self.main.verse_index.has_chapter(147, 1))
+        self.assertEqual(self.main.background_fetcher.failed, {CrawlJob(2, 147, 3)})
+
+        self.assertEqual(self.main.warm_ahead_chapters(1, exclude={(147, 3)}), [(147, 4)])
+        self.main.stop_background_fetcher()
+
+    def test_pending_chapter_is_not_crawled_twice(self):
+        """
+        백그라운드에서 가져오는 중인 장을 뽑으면 다시 크롤링하지 않고 끝나기를 기다리는지 테스트
+        :return: None
+        """
+        fetcher = BackgroundFetcher(self.main, 'test.db')
+        fetch = fetcher.engine.fetch
+        self.main.background_fetcher = fetcher
+        self.main.primary_key, self.main.chapter_num = 101, 1
+
+        with patch.object(fetcher.engine, 'fetch', side_effect=lambda job, name: time.sleep(0.2) or fetch(job, name)), \
+                patch.object(self.main, 'bible_info_for_chapter') as crawl_mock:
+            fetcher.submit(CrawlJob(1, 101, 1), '창세')
+            fetcher.start()
+            verse = self.main.verse_from_index()
+
+        self.assertEqual((verse.bible_pk, verse.chapter_num), (101, 1))
+        crawl_mock.assert_not_called()
+        self.main.stop_background_fetcher()
+
+    def test_failed_insert_is_reported(self):
+        """
+        가져온 장을 db에 저장하지 못하면 실패한 작업으로 남는지 테스트
+        :return: None
+        """
+        fetcher = BackgroundFetcher(self.main, 'test.db')
+        with patch('background.DB.insert_bible_info_batch_into_db',
+                   return_value=sqlite3.OperationalError('database is locked')):
+            fetcher.submit(CrawlJob(1, 101, 1), '창세')
+            fetcher.start()
+            fetcher.join()
+        fetcher.stop()
+
+        result, = fetcher.results()
+        self.assertIsInstance(result.error, sqlite3.OperationalError)
+        self.assertEqual(fetcher.failed, {CrawlJob(1, 101, 1)})
+        self.assertIsNone(self.main.search_bible_info_from_db(101, 1))
+
+    def test_fetcher_writes_nothing_to_stdout(self):
+        """
+        백그라운드 크롤러가 장을 저장해도 표준 출력에는 아무것도 쓰지 않는지 테스트
+        :return: None
+        """
+        stdout = io.StringIO()
+        fetcher = BackgroundFetcher(self.main, 'test.db')
+        with redirect_stdout(stdout):
+            fetcher.submit(CrawlJob(1, 101, 1), '창세')
+            fetcher.start()
+            fetcher.join()
+            fetcher.stop()
+
+        result, = fetcher.results()
+        self.assertIsNone(result.error)
+        self.assertEqual(stdout.getvalue(), '')
+
+    def test_misses_before_warm_ahead(self):
+        """
+        대기열에서 뽑힌 장이 미리 가져올 장보다 먼저 처리되는지 테스트
+        :return: None
+        """
+        fetcher = BackgroundFetcher(self.main, 'test.db')
+        fetcher.submit(CrawlJob(2, 147, 1), '마태', priority=WARM_AHEAD_PRIORITY)
+        fetcher.submit(CrawlJob(1, 101, 1), '창세')
+        fetcher.start()
+        fetcher.join()
+        fetcher.stop()
+
+        self.assertEqual([result.job for result in fetcher.results()], [CrawlJob(1, 101, 1), CrawlJob(2, 147, 1)])
+
+    def test_bounded_queue(self):
+        """
+        대기열이 가득 차면 새 장을 버리고, 이미 대기 중인 장은 다시 넣지 않는지 테스트
+        :return: None
+        """
+        fetcher = BackgroundFetcher(self.main, 'test.db', max_pending=2)
+
+        self.assertTrue(fetcher.submit(CrawlJob(1, 101, 1), '창세'))
+        self.assertTrue(fetcher.submit(CrawlJob(1, 101, 2), '창세'))
+        self.assertTrue(fetcher.submit(CrawlJob(1, 101, 1), '창세'))
+        self.assertFalse(fetcher.submit(CrawlJob(1, 101, 3), '창세'))
+        self.assertEqual(fetcher.pending, {CrawlJob(1, 101, 1), CrawlJob(1, 101, 2)})
+
+        fetcher.stop()
+        self.assertEqual(fetcher.pending, set())
+
+    def tearDown(self):
+        """
+        테스트가 끝나면 test.db를 삭제한다
+        :return: None
+        """
+        self.main.conn.close()
+        os.remove('test.db')
+
+
+class ChapterRefreshTest(unittest.TestCase):
+    def setUp(self):
+        """
+        refresh 테스트를 위해 창세 1장은 그대로, 마태 1장은 본문 하나가 틀리고 없는 절이 더 들어간 test.db 설정
+        :return: None
+        """
+        self.main = Main()
+        self.main.db_name = 'test.db'
+        self.main.transport = ReplayTransport(FIXTURES_DIR)
+        self.main.catalog = BookCatalog()
+        self.main.catalog.add_book(101, '창세', 50, bible_num=1)
+        self.main.catalog.add_book(147, '마태', 28, bible_num=2)
+        self.main.search_data_table()
+        self.main.insert_bible_data_into_db(self.main.catalog.books)
+
+        self.genesis = self.main.fetch_bible_info(1, 101, 1, '창세')
+        self.matthew = self.main.fetch_bible_info(2, 147, 1, '마태')
+        stale_matthew = [self.matthew[0]._replace(texts='옛 본문')] + self.matthew[1:] + \
+                        [self.matthew[0]._replace(paragraph_num='99')]
+        self.main.insert_bible_info_batch_into_db([self.genesis, stale_matthew])
+
+    def test_chapter_hash_normalizes_whitespace(self):
+        """
+        절 번호의 형식과 본문의 공백이 달라도 같은 해시가 나오는지 테스트
+        :return: None
+        """
+        self.assertEqual(chapter_hash([(1, '태초에  하느님께서\n')]), chapter_hash([('1', ' 태초에 하느님께서')]))
+        self.assertNotEqual(chapter_hash([(1, '태초에')]), chapter_hash([(2, '태초에')]))
+
+    def test_refresh_keeps_lettered_verses_unchanged(self):
+        """
+        db가 페이지와 다른 순서로 돌려주는 절('1ㄱ', '10')이 있어도 바뀌지 않은 장으로 세는지 테스트
+        :return: None
+        """
+        page = [BibleInfo('창세', 2, paragraph_num, f'{paragraph_num}절', 101)
+                for paragraph_num in ('1', '1ㄱ', '2', '10')]
+        self.main.insert_bible_info_batch_into_db([page])
+        fetch = self.main.fetch_bible_info
+
+        with patch.object(self.main, 'fetch_bible_info',
+                          side_effect=lambda m, n, p, name: page if (n, p) == (101, 2) else fetch(m, n, p, name)), \
+                patch.object(self.main, 'replace_chapter_in_db', wraps=self.main.replace_chapter_in_db) as replace:
+            self.main.refresh()
+
+        self.assertNotIn((101, 2), [(call.args[0][0].bible_pk, call.args[0][0].chapter_num)
+                                    for call in replace.call_args_list])
+
+    def test_refresh_rewrites_only_changed_chapters(self):
+        """
+        해시가 바뀐 장만 다시 쓰고, 다시 refresh하면 모든 장이 그대로인지 테스트
+        :return: None
+        """
+        with patch.object(self.main, 'replace_chapter_in_db', wraps=self.main.replace_chapter_in_db) as replace:
+            self.assertEqual(self.main.refresh(), {'unchanged': 1, 'changed': 1, 'failed': 0})
+            self.assertEqual([call.args[0][0].bible_pk for call in replace.call_args_list], [147])
+
+            self.assertEqual(self.main.refresh(), {'unchanged': 2, 'changed': 0, 'failed': 0})
+            self.assertEqual(replace.call_count, 1)
+
+        rows = self.main.search_bible_info_from_db(147, 1)
+        self.assertEqual([row[3] for row in rows], [info.texts for info in self.matthew])
+        self.assertEqual(self.main.search_chapter_hashes_from_db(), {
+            (101, 1): chapter_hash((info.paragraph_num, info.texts) for info in self.genesis),
+            (147, 1): chapter_hash((info.paragraph_num, info.texts) for info in self.matthew),
+        })
+        self.assertFalse(self.main.revalidate)
+
+    def test_refresh_counts_failed_writes(self):
+        """
+        다시 쓰기나 해시 기록에 실패한 장은 changed나 unchanged가 아니라 failed로 세는지 테스트
+        :return: None
+        """
+        error = sqlite3.OperationalError('database is locked')
+        with patch.object(self.main, 'replace_chapter_in_db', return_value=error), \
+                patch.object(self.main, 'record_chapter_hashes', return_value=error):
+            self.assertEqual(self.main.refresh(), {'unchanged': 0, 'changed': 0, 'failed': 2})
+
+    def tearDown(self):
+        """
+        테스트가 끝나면 test.db를 삭제한다
+        :return: None
+        """
+        self.main.conn.close()
+        os.remove('test.db')
+
+
+class ServiceTest(unittest.TestCase):
+    def setUp(self):
+        """
+        서비스 테스트를 위해 fixture를 재생하는 Main과 두 권짜리 성경책 목록 설정
+        :return: None
+        """
+        self.main = Main()
+        self.main.db_name = 'test.db'
+        self.main.transport = ReplayTransport(FIXTURES_DIR)
+        self.main.catalog = BookCatalog()
+        self.main.catalog.add_book(101, '창세', 50, bible_num=1)
+        self.main.catalog.add_book(147, '마태', 28, bible_num=2)
+        self.main.search_data_table()
+        self.main.insert_bible_data_into_db(self.main.catalog.books)
+        self.service = VerseService(self.main, max_workers=4)
+
+    @staticmethod
+    async def request(reader, writer, path, method='GET'):
+        """
+        연결 하나로 요청을 보내고 응답을 읽는다
+        :return: (상태 코드, JSON 본문, 헤더 딕셔너리) 튜플
+        """
+        writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode('latin-1'))
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers['content-length']))
+        return status, json.loads(body), headers
+
+    def run_with_server(self, client):
+        """
+        포트 0으로 서비스를 띄우고 client 코루틴에 포트를 넘겨 실행한다
+        :return: client 코루틴의 결과
+        """
+        async def scenario():
+            server = await self.service.start(port=0)
+            try:
+                return await client(server.sockets[0].getsockname()[1])
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        return asyncio.run(scenario())
+
+    def test_keep_alive(self):
+        """
+        연결 하나로 여러 요청을 처리하고, 성경책 이름으로도 장을 찾는지 테스트
+        :return: None
+        """
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            genesis = await self.request(reader, writer, '/verse/101/1')
+            matthew = await self.request(reader, writer, '/verse/%EB%A7%88%ED%83%9C/1')
+            with patch('main.random.randint', side_effect=lambda a, b: a):
+                candy = await self.request(reader, writer, '/candy')
+            writer.close()
+            return genesis, matthew, candy
+
+        genesis, matthew, candy = self.run_with_server(client)
+
+        self.assertEqual(genesis[0], 200)
+        self.assertEqual(genesis[2]['connection'], 'keep-alive')
+        self.assertEqual(len(genesis[1]['verses']), 31)
+        self.assertEqual((matthew[0], matthew[1]['bible_pk'], len(matthew[1]['verses'])), (200, 147, 25))
+        self.assertEqual((candy[0], candy[1]['bible_pk'], candy[1]['chapter']), (200, 101, 1))
+        self.assertEqual(len(self.main.search_bible_info_from_db(147, 1)), 25)
+
+    def test_concurrent_misses_crawl_once(self):
+        """
+        색인에 없는 장을 동시에 요청해도 크롤링은 한 번만 하는지 테스트
+        :return: None
+        """
+        async def client(port):
+            async def one_request():
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                response = await self.request(reader, writer, '/verse/101/1')
+                writer.close()
+                return response
+
+            return await asyncio.gather(*(one_request() for _ in range(50)))
+
+        with patch.object(self.service.engine, 'fetch', wraps=self.service.engine.fetch) as fetch:
+            responses = self.run_with_server(client)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertTrue(all(status == 200 and len(body['verses']) == 31 for status, body, _ in responses))
+
+    def test_errors(self):
+        """
+        없는 경로, 성경책, 장과 GET이 아닌 요청에 알맞은 상태 코드를 돌려주는지 테스트
+        :return: None
+        """
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            statuses = [(await self.request(reader, writer, path))[0]
+                        for path in ('/verse/101/51', '/verse/' + quote('없는책') + '/1', '/verse/999/1', '/nothing')]
+            statuses.append((await self.request(reader, writer, '/candy', method='POST'))[0])
+            writer.close()
+            return statuses
+
+        self.assertEqual(self.run_with_server(client), [404, 404, 404, 404, 405])
+
+    def test_unexpected_and_upstream_errors(self):
+        """
+        사이트에서 가져오지 못한 장은 502로, 그 밖의 예외는 기록한 뒤 500으로 답하는지 테스트
+        :return: None
+        """
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            with patch.object(self.service.engine, 'fetch', side_effect=requests.ConnectionError('연결 실패')):
+                upstream = await self.request(reader, writer, '/verse/101/1')
+            with patch.object(self.main.verse_index, 'chapter', side_effect=TypeError('버그')):
+                self.main.verse_index.add_chapter([BibleInfo('마태', 2, '1', '마태 2-1', 147)])
+                unexpected = await self.request(reader, writer, '/verse/147/2')
+            writer.close()
+            return upstream, unexpected
+
+        with patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            upstream, unexpected = self.run_with_server(client)
+
+        self.assertEqual(upstream[0], 502)
+        self.assertEqual(unexpected, (500, {'error': '서버 오류입니다'}, unexpected[2]))
+        self.assertIn('TypeError: 버그', stderr.getvalue())
+
+    def test_oversized_request_line(self):
+        """
+        StreamReader의 한도보다 긴 요청 줄에 400으로 답하는지 테스트
+        :return: None
+        """
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'a' * (2 ** 16 + 1))
+            await writer.drain()
+            status_line = await reader.readline()
+            writer.close()
+            return status_line
+
+        self.assertTrue(self.run_with_server(client).startswith(b'HTTP/1.1 400'))
+
+    def test_idle_connection_is_closed(self):
+        """
+        keep_alive_timeout 동안 다음 요청을 보내지 않는 연결은 서버가 닫는지 테스트
+        :return: None
+        """
+        self.service = VerseService(self.main, max_workers=4, keep_alive_timeout=0.05)
+
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            status = (await self.request(reader, writer, '/health'))[0]
+            closed = await asyncio.wait_for(reader.read(), 1)
+            writer.close()
+            return status, closed
+
+        self.assertEqual(self.run_with_server(client), (200, b''))
+
+    def test_empty_chapter(self):
+        """
+        말씀이 없는 장은 /verse에서 404로 답하고, /candy에서는 다른 장을 다시 뽑는지 테스트
+        :return: None
+        """
+        fetch = self.service.engine.fetch
+        draws = iter([(147, 1), (101, 1)])
+
+        def draw():
+            self.main.primary_key, self.main.chapter_num = next(draws)
+
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            verse = await self.request(reader, writer, '/verse/147/1')
+            candy = await self.request(reader, writer, '/candy')
+            writer.close()
+            return verse, candy
+
+        with patch.object(self.service.engine, 'fetch', side_effect=lambda job, name: [] if job.book_pk == 147
+                          else fetch(job, name)), \
+                patch.object(self.main, 'make_random_number', side_effect=draw):
+            verse, candy = self.run_with_server(client)
+
+        self.assertEqual(verse[0], 404)
+        self.assertEqual((candy[0], candy[1]['bible_pk'], candy[1]['chapter']), (200, 101, 1))
+
+    def test_warm_ahead(self):
+        """
+        처리 중인 요청이 없을 때 다음에 뽑힐 것 같은 장을 미리 가져오는지 테스트
+        :return: None
+        """
+        self.service = VerseService(self.main, max_workers=4, warm_ahead=2, idle_seconds=0.01)
+
+        async def client(port):
+            for _ in range(500):
+                if self.main.verse_index.has_chapter(101, 1) and self.main.verse_index.has_chapter(147, 1):
+                    break
+                await asyncio.sleep(0.01)
+
+        self.run_with_server(client)
+        self.assertTrue(self.main.verse_index.has_chapter(101, 1))
+        self.assertTrue(self.main.verse_index.has_chapter(147, 1))
+        self.assertEqual(len(self.main.search_bible_info_from_db(147, 1)), 25)
+
+    def tearDown(self):
+        """
+        테스트가 끝나면 test.db를 삭제한다
+        :return: None
+        """
+        self.main.conn.close()
+        os.remove('test.db')
+
+
 if __name__ == '__main__':
     unittest.main()
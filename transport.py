@@ -0,0 +1,105 @@
+import os
+from urllib.parse import urlencode, urlparse
+
+import requests
+
+
+def fixture_name(url, params=None):
+    """
+    URL과 payload로 응답 파일 이름을 만든다
+    ex: bible_read.asp?m=1&n=101&p=1 -> bible_read_m1_n101_p1.html
+    :return: 파일 이름
+    """
+    stem = os.path.splitext(os.path.basename(urlparse(url).path))[0]
+    items = sorted((params if params else {}).items())
+    return stem + ''.join(f'_{key}{value}' for key, value in items) + '.html'
+
+
+class ReplayTransport:
+    """
+    저장해 둔 응답 파일로 session.get을 대신하는 transport: 네트워크 없이 크롤러를 실행한다
+    """
+
+    def __init__(self, directory):
+        """
+        인스턴스 속성 정의
+        :param directory: 응답 파일이 담긴 디렉터리
+        """
+        self.__directory = directory
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    # --- 요청 함수 --- #
+
+    def get(self, url, params=None, **kwargs):
+        """
+        URL과 payload에 해당하는 응답 파일을 requests.Response 객체로 만든다
+        :param kwargs: session.get과 같은 모양을 맞추기 위한 나머지 인자, 사용하지 않는다
+        :return: requests.Response 객체
+        """
+        path = os.path.join(self.directory, fixture_name(url, params))
+
+        # 예외처리: 저장해 둔 응답이 없는 경우 조용히 빈 페이지를 돌려주지 않는다
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'재생할 응답 파일이 없습니다: {path}')
+
+        with open(path, 'rb') as fixture_file:
+            content = fixture_file.read()
+
+        response = requests.Response()
+        response.status_code = 200
+        response.encoding = 'utf-8'
+        response.url = f'{url}?{urlencode(params)}' if params else url
+        response._content = content
+        return response
+
+
+class RecordTransport:
+    """
+    실제 요청을 보내고 받은 응답을 ReplayTransport가 읽을 수 있는 파일로 저장하는 transport
+    """
+
+    def __init__(self, directory, session=None):
+        """
+        인스턴스 속성 정의
+        :param directory: 응답 파일을 저장할 디렉터리
+        :param session: 실제 요청을 보낼 세션, 없다면 새로 만든다
+        """
+        self.__directory = directory
+        self.__session = session if session else requests.Session()
+        os.makedirs(directory, exist_ok=True)
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    @property
+    def session(self):
+        return self.__session
+
+    # --- 요청 함수 --- #
+
+    def get(self, url, params=None, **kwargs):
+        """
+        세션으로 요청을 보내고, 200 응답이라면 본문을 UTF-8로 저장한다
+        :return: requests.Response 객체
+        """
+        response = self.session.get(url, params=params, **kwargs)
+
+        # 사이트의 인코딩과 상관없이 ReplayTransport는 UTF-8로 읽으므로 다시 인코딩해서 저장한다
+        if response.status_code == 200:
+            path = os.path.join(self.directory, fixture_name(url, params))
+            with open(path, 'wb') as fixture_file:
+                fixture_file.write(response.text.encode('utf-8'))
+
+        return response
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,160 @@
+import random
+import sqlite3
+from array import array
+
+from crawler import BibleInfo
+
+
+# 말씀이 없는 장을 뽑았을 때 다른 장을 다시 뽑는 최대 횟수
+REDRAW_LIMIT = 5
+
+
+class VerseIndex:
+    """
+    bible.db의 말씀을 한 번 읽어 메모리에 올려 두고 db 검색 없이 말씀을 뽑는 색인
+    """
+
+    def __init__(self):
+        """
+        인스턴스 속성 정의
+        모든 절은 같은 위치(verse id)를 공유하는 평평한 배열에 담기고,
+        각 장은 그 배열의 [start, stop) 구간으로 표현된다
+        """
+        self.__book_pks = array('H')  # 절마다 성경책 pk
+        self.__chapter_nums = array('H')  # 절마다 장
+        self.__paragraphs = []  # 절마다 절 번호
+        self.__texts = []  # 절마다 본문
+        self.__names = {}  # 성경책 pk: 성경책 이름
+        self.__chapters = {}  # (성경책 pk, 장): (start, stop)
+
+    # --- 네임 맹글링 --- #
+
+    @property
+    def names(self):
+        return self.__names
+
+    @property
+    def chapters(self):
+        return self.__chapters
+
+    def __len__(self):
+        return len(self.__texts)
+
+    # --- 색인 생성 함수 --- #
+
+    def load_from_db(self, db):
+        """
+        db의 bible_data와 bible_info를 한 번에 읽어 색인을 만든다
+        :param db: 말씀을 읽을 DB 인스턴스
+        :return: 색인 자기 자신
+        """
+        try:
+            self.names.update({pk: name for pk, name, _ in db.query_from_db('bible_data_all')})
+            rows = db.query_from_db('bible_info_all')
+
+        # 예외처리: data_table이 없을 경우 빈 색인을 그대로 쓴다
+        except sqlite3.Error as e:
+            print(e)
+            return self
+
+        # bible_info는 (bible_pk, chapter_num, paragraph_num) 순서로 읽히므로 장 단위로 끊어서 담는다
+        key = None
+        for bible_pk, chapter_num, paragraph_num, texts in rows:
+            if (bible_pk, chapter_num) != key:
+                self.close_chapter(key)
+                key = (bible_pk, chapter_num)
+                self.chapters[key] = (len(self), len(self))
+            self.append_verse(bible_pk, chapter_num, paragraph_num, texts)
+        self.close_chapter(key)
+
+        return self
+
+    def add_chapter(self, bible_info):
+        """
+        새로 가져온 장 하나를 색인 끝에 더한다
+        :param bible_info: 본문 정보 네임드튜플로 구성된 리스트
+        :return: None
+        """
+        if not bible_info:
+            return None
+
+        key = (bible_info[0].bible_pk, bible_info[0].chapter_num)
+        if key in self.chapters:
+            return None
+
+        self.names[key[0]] = bible_info[0].books_name
+        self.chapters[key] = (len(self), len(self))
+        for info in bible_info:
+            self.append_verse(info.bible_pk, info.chapter_num, info.paragraph_num, info.texts)
+        self.close_chapter(key)
+        return None
+
+    def append_verse(self, bible_pk, chapter_num, paragraph_num, texts):
+        """
+        절 하나를 평평한 배열 끝에 더한다
+        :return: None
+        """
+        self.__book_pks.append(bible_pk)
+        self.__chapter_nums.append(chapter_num)
+        self.__paragraphs.append(str(paragraph_num))
+        self.__texts.append(texts)
+        return None
+
+    def close_chapter(self, key):
+        """
+        장의 구간 끝을 지금까지 담긴 절의 수로 맞춘다
+        :param key: (성경책 pk, 장) 튜플, None이면 아무 일도 하지 않는다
+        :return: None
+        """
+        if key is not None:
+            self.chapters[key] = (self.chapters[key][0], len(self))
+        return None
+
+    # --- 말씀 검색 함수 --- #
+
+    def has_chapter(self, bible_pk, chapter_num):
+        """
+        장이 색인에 있는지 확인한다
+        :return: 있다면 True, 없다면 False
+        """
+        return (bible_pk, chapter_num) in self.chapters
+
+    def verse(self, verse_id):
+        """
+        verse id에 해당하는 절을 꺼낸다
+        :param verse_id: 평평한 배열에서의 위치
+        :return: 본문 정보 네임드튜플
+        """
+        bible_pk = self.__book_pks[verse_id]
+        return BibleInfo(
+            books_name=self.names.get(bible_pk),
+            chapter_num=self.__chapter_nums[verse_id],
+            paragraph_num=self.__paragraphs[verse_id],
+            texts=self.__texts[verse_id],
+            bible_pk=bible_pk,
+        )
+
+    def chapter(self, bible_pk, chapter_num):
+        """
+        장에 속한 절을 모두 꺼낸다
+        :return: 본문 정보 네임드튜플로 구성된 리스트
+        """
+        start, stop = self.chapters[(bible_pk, chapter_num)]
+        return [self.verse(verse_id) for verse_id in range(start, stop)]
+
+    def random_verse(self, bible_pk=None, chapter_num=None):
+        """
+        장이 주어지면 그 장에서, 없다면 색인 전체에서 절 하나를 무작위로 뽑는다
+        :return: 본문 정보 네임드튜플, 뽑을 절이 없다면 LookupError
+        """
+        start, stop = self.chapters.get((bible_pk, chapter_num), (0, 0)) if bible_pk else (0, len(self))
+
+        # 예외처리: 색인에 없거나 말씀이 없는 장, 또는 빈 색인에서 뽑으려는 경우
+        if start == stop:
+            raise LookupError(f'{bible_pk} {chapter_num}장에 뽑을 말씀이 없습니다' if bible_pk
+                              else '색인에 뽑을 말씀이 없습니다')
+        return self.verse(random.randrange(start, stop))
+
+
+if __name__ == '__main__':
+    pass